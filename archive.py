@@ -0,0 +1,296 @@
+# archive.py - Archiv der Original-Sprachnachrichten (inhaltsadressiert) und inkrementelle Backups
+#
+#   python archive.py backup [--dest backups/store]   # Snapshot von Erinnerungen und Audio
+#   python archive.py snapshots [--dest ...]          # vorhandene Snapshots
+#   python archive.py get <Eintrag-ID> <Datei>        # archivierte Sprachnachricht auslesen
+
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import sqlite3
+import asyncio
+import argparse
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache import sha256_file
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'true').lower() == 'true'
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+BACKUP_STORE_DIR = os.getenv('BACKUP_STORE_DIR', os.path.join(BASE_DIR, 'backups', 'store'))
+# Komprimiert wird nur, wenn es mindestens so viel spart (Opus ist meist schon kompakt)
+ARCHIVE_MIN_SAVING = float(os.getenv('ARCHIVE_MIN_SAVING', '0.05'))
+
+
+def _blob_path(root: str, digest: str, compressed: bool) -> str:
+    # Zwei Zeichen als Unterverzeichnis, damit kein Verzeichnis zehntausende Dateien enthält
+    return os.path.join(root, digest[:2], digest + (".z" if compressed else ""))
+
+
+def _write_atomic(path: str, data: bytes):
+    """Erst in eine temporäre Datei schreiben, dann umbenennen: mehrere Prozesse, kein halber Blob."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _copy_atomic(source: str, path: str):
+    """Wie _write_atomic, aber die Datei wird blockweise kopiert statt ganz in den Speicher gelesen."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(source, "rb") as src, open(tmp_path, "wb") as f:
+        shutil.copyfileobj(src, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class VoiceArchive:
+    """
+    Inhaltsadressierter Blob-Speicher für Sprachnachrichten.
+
+    Jede Datei liegt genau einmal unter ihrem SHA-256 in `blobs/` (zlib-komprimiert, sofern das
+    lohnt). Die Tabelle `entry_audio` in `archive.db` ordnet jeder Erinnerung (Eintrag-ID) ihren
+    Blob zu; weitergeleitete Sprachnachrichten verweisen auf denselben Blob.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'archive.db'), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                compressed INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entry_audio (
+                entry_id TEXT PRIMARY KEY,
+                hash TEXT NOT NULL REFERENCES blobs(hash),
+                file_unique_id TEXT,
+                archived_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entry_audio_file ON entry_audio (file_unique_id)")
+
+    def put_file(self, path: str, digest: Optional[str] = None) -> str:
+        """Legt die Datei ab (falls noch nicht vorhanden) und gibt ihren Hash zurück."""
+        digest = digest or sha256_file(path)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+                return digest
+        with open(path, "rb") as f:
+            data = f.read()
+        packed = zlib.compress(data, 6)
+        compressed = len(packed) <= len(data) * (1 - ARCHIVE_MIN_SAVING)
+        stored = packed if compressed else data
+        _write_atomic(_blob_path(self.blob_dir, digest, compressed), stored)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, size, stored_size, compressed, created_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, len(data), len(stored), int(compressed), time.time()))
+        return digest
+
+    def link(self, entry_id: str, file_unique_id: str, digest: Optional[str] = None) -> bool:
+        """
+        Ordnet einer Erinnerung ihren Blob zu. Ohne `digest` (Transkript kam aus dem Cache, es gab
+        keinen Download) wird der Blob einer früheren Erinnerung mit derselben file_unique_id genommen.
+        """
+        with self._lock:
+            if digest is None:
+                row = self._conn.execute(
+                    "SELECT hash FROM entry_audio WHERE file_unique_id = ? LIMIT 1", (file_unique_id,)).fetchone()
+                if row is None:
+                    return False
+                digest = row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entry_audio (entry_id, hash, file_unique_id, archived_at) VALUES (?, ?, ?, ?)",
+                (entry_id, digest, file_unique_id, time.time()))
+        return True
+
+    async def alink(self, *args):
+        return await asyncio.to_thread(self.link, *args)
+
+    def read(self, digest: str) -> bytes:
+        with self._lock:
+            row = self._conn.execute("SELECT compressed FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        with open(_blob_path(self.blob_dir, digest, bool(row[0])), "rb") as f:
+            data = f.read()
+        return zlib.decompress(data) if row[0] else data
+
+    def hash_for_entry(self, entry_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM entry_audio WHERE entry_id = ?", (entry_id,)).fetchone()
+        return row[0] if row else None
+
+    def blobs(self) -> List[Tuple[str, bool]]:
+        with self._lock:
+            return [(h, bool(c)) for h, c in self._conn.execute("SELECT hash, compressed FROM blobs ORDER BY hash")]
+
+    def entries(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT entry_id, hash FROM entry_audio ORDER BY entry_id"))
+
+    def blob_file(self, digest: str, compressed: bool) -> str:
+        return _blob_path(self.blob_dir, digest, compressed)
+
+
+class BackupStore:
+    """
+    Inkrementelle, deduplizierte Backups.
+
+    Der Speicher enthält nur inhaltsadressierte Chunks (`chunks/`) und Snapshot-Manifeste
+    (`snapshots/`). Erinnerungen werden pro Monat zu einem Chunk zusammengefasst: Unveränderte
+    Monate ergeben denselben Hash und werden nicht erneut geschrieben. Audio-Blobs werden
+    1:1 übernommen, sofern sie im Speicher noch fehlen. Ein Backup kostet damit Zeit und Platz
+    proportional zu den Änderungen seit dem letzten Snapshot, nicht zur ganzen Historie.
+    """
+
+    def __init__(self, root: str = BACKUP_STORE_DIR):
+        self.root = root
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.snapshot_dir = os.path.join(root, 'snapshots')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def snapshots(self) -> List[str]:
+        return sorted(name[:-5] for name in os.listdir(self.snapshot_dir) if name.endswith('.json'))
+
+    def load_manifest(self, name: str) -> dict:
+        with open(os.path.join(self.snapshot_dir, f"{name}.json"), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _known_chunks(self) -> set:
+        """Chunks des letzten Snapshots: alles darin muss nicht mehr geprüft oder kopiert werden."""
+        names = self.snapshots()
+        if not names:
+            return set()
+        manifest = self.load_manifest(names[-1])
+        return set(manifest['memories'].values()) | set(manifest['blobs'])
+
+    def backup(self, memory_months: Iterable[Tuple[str, bytes]], archive: Optional[VoiceArchive]) -> dict:
+        """Schreibt einen Snapshot; gibt Statistiken zurück (neue/übernommene Chunks, geschriebene Bytes)."""
+        started = time.perf_counter()
+        known = self._known_chunks()
+        stats = {'new_chunks': 0, 'reused_chunks': 0, 'bytes_written': 0}
+
+        memories = {}
+        for month, content in memory_months:
+            digest = hashlib.sha256(content).hexdigest()
+            memories[month] = digest
+            self._store(digest, known, stats, lambda: zlib.compress(content, 9))
+
+        blobs = {}
+        audio = {}
+        if archive is not None:
+            for digest, compressed in archive.blobs():
+                blobs[digest] = compressed
+                self._store(digest, known, stats, None, source=archive.blob_file(digest, compressed),
+                            compressed=compressed)
+            audio = archive.entries()
+
+        name = base = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        suffix = 1
+        while os.path.exists(os.path.join(self.snapshot_dir, f"{name}.json")):
+            suffix += 1
+            name = f"{base}-{suffix}"
+        manifest = {'created_at': datetime.now().isoformat(timespec='seconds'), 'memories': memories,
+                    'blobs': blobs, 'entry_audio': audio, 'stats': stats}
+        _write_atomic(os.path.join(self.snapshot_dir, f"{name}.json"),
+                      json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+        stats['snapshot'] = name
+        return stats
+
+    def _store(self, digest: str, known: set, stats: dict, produce, source: Optional[str] = None,
+               compressed: bool = True):
+        path = _blob_path(self.chunk_dir, digest, compressed)
+        if digest in known or os.path.exists(path):
+            stats['reused_chunks'] += 1
+            return
+        if source is not None:
+            # Auch hier erst fsync, dann umbenennen: das Manifest danach darf nie auf einen halben Blob zeigen
+            _copy_atomic(source, path)
+        else:
+            _write_atomic(path, produce())
+        stats['new_chunks'] += 1
+        stats['bytes_written'] += os.path.getsize(path)
+
+
+def memory_months(store) -> Iterable[Tuple[str, bytes]]:
+    """Alle Erinnerungen als JSON-Zeilen, ein Block pro Monat (stabil sortiert, damit gleiche Inhalte gleiche Hashes ergeben)."""
+    from models import Memory
+
+    with store.app.app_context():
+        current, lines = None, []
+        for memory in Memory.query.order_by(Memory.month, Memory.id).yield_per(500):
+            if memory.month != current and lines:
+                yield current, "\n".join(lines).encode('utf-8')
+                lines = []
+            current = memory.month
+            row = memory.to_dict()
+            # Der Replikationsstatus ändert sich ohne inhaltliche Änderung und gehört nicht ins Backup
+            row.pop('sheets_synced', None)
+            lines.append(json.dumps(row, ensure_ascii=False, sort_keys=True))
+        if lines:
+            yield current, "\n".join(lines).encode('utf-8')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Archiv der Sprachnachrichten und inkrementelle Backups.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backup_parser = sub.add_parser("backup", help="Snapshot von Erinnerungen und Audio anlegen")
+    backup_parser.add_argument("--dest", default=BACKUP_STORE_DIR)
+    list_parser = sub.add_parser("snapshots", help="Vorhandene Snapshots auflisten")
+    list_parser.add_argument("--dest", default=BACKUP_STORE_DIR)
+    get_parser = sub.add_parser("get", help="Archivierte Sprachnachricht einer Erinnerung auslesen")
+    get_parser.add_argument("entry_id")
+    get_parser.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        from memory_store import MemoryStore
+        result = BackupStore(args.dest).backup(memory_months(MemoryStore()),
+                                               VoiceArchive() if os.path.isdir(ARCHIVE_DIR) else None)
+        print(f"✅ Snapshot {result['snapshot']}: {result['new_chunks']} neue Chunks "
+              f"({result['bytes_written'] / 1024:.1f} KB), {result['reused_chunks']} übernommen, "
+              f"{result['seconds']}s.")
+    elif args.command == "snapshots":
+        backup_store = BackupStore(args.dest)
+        for name in backup_store.snapshots():
+            manifest = backup_store.load_manifest(name)
+            print(f"{name}: {len(manifest['memories'])} Monate, {len(manifest['entry_audio'])} Sprachnachrichten, "
+                  f"{manifest['stats']['new_chunks']} neue Chunks")
+    elif args.command == "get":
+        archive = VoiceArchive()
+        digest = archive.hash_for_entry(args.entry_id)
+        if digest is None:
+            print(f"❌ Keine archivierte Sprachnachricht für {args.entry_id}.")
+            sys.exit(1)
+        with open(args.output, "wb") as f:
+            f.write(archive.read(digest))
+        print(f"✅ Sprachnachricht gespeichert: {args.output}")
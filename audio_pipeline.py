@@ -0,0 +1,185 @@
+# audio_pipeline.py - Download, Normalisierung und Aufteilung von Sprachnachrichten
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cache import TwoTierCache, sha256_file
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+AUDIO_TARGET_RATE = int(os.getenv('AUDIO_TARGET_RATE', '16000'))
+AUDIO_EXPORT_FORMAT = os.getenv('AUDIO_EXPORT_FORMAT', 'ogg')  # 'ogg' (Opus) oder 'flac'
+AUDIO_OPUS_BITRATE = os.getenv('AUDIO_OPUS_BITRATE', '24k')
+# Kleine Dateien werden unverändert hochgeladen, das erneute Kodieren lohnt sich dort nicht
+AUDIO_NORMALIZE_MIN_BYTES = int(os.getenv('AUDIO_NORMALIZE_MIN_BYTES', str(1024 * 1024)))
+# Ab dieser Länge wird an Pausen in Abschnitte aufgeteilt, die parallel transkribiert werden
+AUDIO_SPLIT_MIN_SECONDS = float(os.getenv('AUDIO_SPLIT_MIN_SECONDS', '120'))
+AUDIO_CHUNK_SECONDS = float(os.getenv('AUDIO_CHUNK_SECONDS', '60'))
+AUDIO_SILENCE_MIN_MS = int(os.getenv('AUDIO_SILENCE_MIN_MS', '500'))
+AUDIO_SILENCE_THRESH_DB = int(os.getenv('AUDIO_SILENCE_THRESH_DB', '-40'))
+
+
+@dataclass
+class AudioChunk:
+    path: str
+    start_ms: int
+    size_bytes: int
+
+
+@dataclass
+class PipelineStats:
+    """Messwerte einer Sprachnachricht: Dauer je Stufe und übertragene Bytes."""
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    downloaded_bytes: int = 0
+    uploaded_bytes: int = 0
+    chunks: int = 0
+    audio_sha256: Optional[str] = None
+
+    def record(self, stage: str, seconds: float):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stage_seconds.items())
+        return (f"{stages} | heruntergeladen {self.downloaded_bytes / 1024:.1f} KB, "
+                f"hochgeladen {self.uploaded_bytes / 1024:.1f} KB in {self.chunks} Abschnitt(en)")
+
+
+class AudioPipeline:
+    """
+    Verarbeitet eine Sprachnachricht über temporäre Dateien statt über Kopien im Speicher:
+
+    1. Download direkt auf die Festplatte
+    2. Normalisierung (Mono, 16 kHz, Opus/FLAC) mit pydub/ffmpeg, nur wenn es sich lohnt
+    3. Aufteilung langer Aufnahmen an Pausen
+    4. Parallele Transkription der Abschnitte, Zusammenfügen in der richtigen Reihenfolge
+    """
+
+    def __init__(self, transcribe_chunk: Callable[[str], Awaitable[Optional[str]]], archive=None):
+        self.transcribe_chunk = transcribe_chunk
+        self.archive = archive
+
+    async def download(self, voice_file, path: str, stats: PipelineStats):
+        """Lädt `voice_file` (telegram.File) direkt nach `path` herunter."""
+        started = time.perf_counter()
+        with metrics.stage("download"):
+            await voice_file.download_to_drive(path)
+        stats.downloaded_bytes = os.path.getsize(path)
+        stats.record("download", time.perf_counter() - started)
+        metrics.observe_payload("download", stats.downloaded_bytes)
+
+    async def process(self, voice_file, stats: Optional[PipelineStats] = None,
+                      cache: Optional[TwoTierCache] = None, source_path: Optional[str] = None) -> Optional[str]:
+        """
+        Lädt `voice_file` (telegram.File) herunter und gibt das vollständige Transkript zurück.
+        Liegt die Datei schon vor (`source_path`, z.B. aus dem Journal), entfällt der Download.
+        Mit `cache` wird vor der Transkription nach dem Hash des Audio-Inhalts gesucht.
+        Mit `archive` wird die Originaldatei abgelegt; ihr Hash steht danach in `stats.audio_sha256`.
+        """
+        stats = stats or PipelineStats()
+        work_dir = tempfile.mkdtemp(prefix="voice_")
+        try:
+            if source_path is None:
+                source_path = os.path.join(work_dir, "voice_message.ogg")
+                await self.download(voice_file, source_path, stats)
+            else:
+                stats.downloaded_bytes = os.path.getsize(source_path)
+
+            cache_key = None
+            if cache is not None or self.archive is not None:
+                stats.audio_sha256 = await asyncio.to_thread(sha256_file, source_path)
+            if self.archive is not None:
+                # Original vor jeder Verarbeitung sichern (inhaltsadressiert, doppelte Dateien nur einmal)
+                try:
+                    with metrics.stage("archive"):
+                        await asyncio.to_thread(self.archive.put_file, source_path, stats.audio_sha256)
+                except Exception as e:
+                    logger.error(f"FEHLER beim Archivieren der Sprachnachricht: {e}", exc_info=True)
+                    stats.audio_sha256 = None
+            if cache is not None:
+                cache_key = f"sha256:{stats.audio_sha256}"
+                cached = await cache.aget(cache_key)
+                if cached:
+                    logger.info("Transkript für identischen Audio-Inhalt aus dem Cache übernommen.")
+                    return cached
+
+            started = time.perf_counter()
+            with metrics.stage("normalize"):
+                chunks = await asyncio.to_thread(self.prepare, source_path, work_dir)
+            stats.record("normalisieren", time.perf_counter() - started)
+            stats.chunks = len(chunks)
+            stats.uploaded_bytes = sum(chunk.size_bytes for chunk in chunks)
+            metrics.observe_payload("upload", stats.uploaded_bytes)
+
+            started = time.perf_counter()
+            with metrics.stage("transcribe"):
+                transcript = await self.transcribe_chunks(chunks)
+            stats.record("transkribieren", time.perf_counter() - started)
+            if cache_key and transcript:
+                await cache.aset(cache_key, transcript)
+
+            logger.info(f"Audio-Pipeline: {stats.summary()}")
+            return transcript
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def transcribe_chunks(self, chunks: List[AudioChunk]) -> Optional[str]:
+        """Transkribiert alle Abschnitte parallel und fügt sie in zeitlicher Reihenfolge zusammen."""
+        results = await asyncio.gather(*(self.transcribe_chunk(chunk.path) for chunk in chunks))
+        parts = [text for text in results if text]
+        if not parts:
+            return None
+        if len(parts) < len(results):
+            logger.warning(f"{len(results) - len(parts)} von {len(results)} Abschnitt(en) ohne Transkript.")
+        return " ".join(parts)
+
+    def prepare(self, source_path: str, work_dir: str) -> List[AudioChunk]:
+        """Entscheidet anhand der Dateigröße und Länge, ob normalisiert bzw. aufgeteilt wird (synchron)."""
+        size = os.path.getsize(source_path)
+        if size < AUDIO_NORMALIZE_MIN_BYTES:
+            # Telegram-Sprachnachrichten sind bereits kompaktes Opus; ffmpeg-Start wäre teurer als der Upload
+            return [AudioChunk(source_path, 0, size)]
+
+        from pydub import AudioSegment
+
+        audio = AudioSegment.from_file(source_path)
+        audio = audio.set_channels(1).set_frame_rate(AUDIO_TARGET_RATE)
+
+        if len(audio) / 1000 < AUDIO_SPLIT_MIN_SECONDS:
+            return [self._export(audio, 0, work_dir, 0)]
+        return [self._export(audio[start:end], start, work_dir, index)
+                for index, (start, end) in enumerate(self._split_points(audio))]
+
+    def _split_points(self, audio) -> List[tuple]:
+        """Schneidet in Abschnitte von etwa AUDIO_CHUNK_SECONDS, bevorzugt in der Mitte einer Pause."""
+        from pydub.silence import detect_silence
+
+        silences = detect_silence(audio, min_silence_len=AUDIO_SILENCE_MIN_MS, silence_thresh=AUDIO_SILENCE_THRESH_DB)
+        cut_candidates = [(start + end) // 2 for start, end in silences]
+        target = int(AUDIO_CHUNK_SECONDS * 1000)
+
+        ranges, start = [], 0
+        while len(audio) - start > target * 1.5:
+            ideal = start + target
+            window = [c for c in cut_candidates if start + target // 2 <= c <= start + target * 3 // 2]
+            cut = min(window, key=lambda c: abs(c - ideal)) if window else ideal
+            ranges.append((start, cut))
+            start = cut
+        ranges.append((start, len(audio)))
+        return ranges
+
+    def _export(self, segment, start_ms: int, work_dir: str, index: int) -> AudioChunk:
+        if AUDIO_EXPORT_FORMAT == 'flac':
+            path = os.path.join(work_dir, f"chunk_{index:03d}.flac")
+            segment.export(path, format="flac")
+        else:
+            path = os.path.join(work_dir, f"chunk_{index:03d}.ogg")
+            segment.export(path, format="ogg", codec="libopus", bitrate=AUDIO_OPUS_BITRATE)
+        return AudioChunk(path, start_ms, os.path.getsize(path))
@@ -0,0 +1,1112 @@
+# benchmark.py - Reproduzierbarer End-to-End-Benchmark mit lokalen Attrappen für Telegram, Groq und Google Sheets
+
+"""
+Schickt synthetische Sprachnachrichten (OGG/Opus) durch `TochterErinnerungenBot.handle_voice_message`.
+Telegram-Bot-API, Groq (Whisper + Chat) und die Sheets-API werden dabei von lokalen HTTP-Attrappen
+mit einstellbarer Latenz und Fehlerrate beantwortet; es wird kein echter Dienst angesprochen.
+
+Verwendung:
+    python benchmark.py run [--notes 40] [--chats 8] [--rate 2] [--durations 5,20,60,180] ...
+    python benchmark.py compare benchmark_results/alt.json benchmark_results/neu.json
+    python benchmark.py check-concurrency [--notes 8] [--groq-latency 0.5]   # Exit-Code 1 bei Verstoß
+    python benchmark.py check-resilience                                      # Retry-After, Circuit Breaker, Frist
+
+Die Attrappen laufen in einem eigenen Prozess, damit die gemessene Speicherspitze (RSS) nur den Bot enthält.
+Ergebnisse werden als JSON gespeichert (inkl. Git-Commit), um Läufe verschiedener Stände zu vergleichen.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import struct
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import urllib.error
+import urllib.request
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Ohne gspread importierbar (wird dort erst beim Verbinden geladen)
+from google_sheets_manager import EXPECTED_HEADERS as SHEET_HEADERS
+
+logger = logging.getLogger("benchmark")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+
+BENCH_TOKEN = "123456:BENCHMARK"
+BENCH_SHEET_ID = "benchmark-sheet"
+# Telegram-Sprachnachrichten sind Opus mit ca. 32 kbit/s
+OPUS_BYTES_PER_SECOND = 4000
+FINAL_PREFIXES = ("✅", "❌", "⚠️", "⏸️")
+WORDS = ("heute", "waren", "wir", "im", "Garten", "und", "du", "hast", "gelacht", "Oma", "Schwimmbad",
+         "Kindergarten", "gebaut", "Sandburg", "Fahrrad", "gefahren", "ganz", "stolz", "Abend", "Buch",
+         "gelesen", "Papa", "Mama", "Regen", "Pfütze", "gesprungen", "Geburtstag", "Kuchen", "Freunde")
+
+
+# ---------------------------------------------------------------------------
+# Synthetische Sprachnachrichten
+# ---------------------------------------------------------------------------
+
+def _build_crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _build_crc_table()
+
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[((crc >> 24) ^ byte) & 0xFF]
+    return crc
+
+
+def _ogg_page(serial: int, sequence: int, granule: int, packets: List[bytes], header_type: int = 0) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing.extend([255] * (len(packet) // 255) + [len(packet) % 255])
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + bytes(lacing) + b"".join(packets))
+    struct.pack_into("<I", page, 22, _ogg_crc(page))
+    return bytes(page)
+
+
+def synthetic_ogg(path: str, seconds: int, seed: int):
+    """Gültiger Ogg/Opus-Container mit zufälligen 20-ms-Paketen (ca. 32 kbit/s); nicht dekodierbar."""
+    rng = random.Random(seed)
+    serial = rng.getrandbits(32)
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, 312, 48000, 0, 0)
+    vendor = b"benchmark"
+    tags = b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+    with open(path, "wb") as f:
+        f.write(_ogg_page(serial, 0, 0, [head], header_type=0x02))
+        f.write(_ogg_page(serial, 1, 0, [tags]))
+        packets_total = max(1, seconds * 50)
+        granule, sequence = 0, 2
+        for start in range(0, packets_total, 50):
+            count = min(50, packets_total - start)
+            granule += count * 960
+            last = start + count >= packets_total
+            packets = [b"\x78" + rng.randbytes(79) for _ in range(count)]
+            f.write(_ogg_page(serial, sequence, granule, packets, header_type=0x04 if last else 0))
+            sequence += 1
+
+
+def ffmpeg_ogg(path: str, seconds: int, seed: int) -> bool:
+    """Echte Opus-Aufnahme (Rauschen mit einer Pause je 7 s, damit die Aufteilung an Pausen greift)."""
+    command = ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi",
+               "-i", f"anoisesrc=d={seconds}:c=pink:r=48000:a=0.1:s={seed}",
+               "-af", "volume='if(lt(mod(t,7),6),1,0)':eval=frame",
+               "-ac", "1", "-c:a", "libopus", "-b:a", "32k", "-application", "voip", path]
+    return subprocess.run(command, capture_output=True).returncode == 0
+
+
+# ---------------------------------------------------------------------------
+# Attrappen (laufen in einem eigenen Prozess)
+# ---------------------------------------------------------------------------
+
+class _FakeState:
+    def __init__(self, config: dict, voice_dir: str, events):
+        self.config = config
+        self.voice_dir = voice_dir
+        self.events = events
+        self.rng = random.Random(config["seed"])
+        self.lock = threading.Lock()
+        self.next_message_id = 1
+        # Arbeitsblätter nach Titel (Jahresblätter werden vom Bot angelegt)
+        self.sheets: Dict[str, List[List[str]]] = {"Sheet1": [list(SHEET_HEADERS)]}
+        self.sheet_ids: Dict[str, int] = {"Sheet1": 0}
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.injected_errors: Dict[str, int] = defaultdict(int)
+
+    def delay(self, service: str, extra: float = 0.0):
+        with self.lock:
+            factor = self.rng.uniform(0.5, 1.5)
+        time.sleep(self.config[f"{service}_latency"] * factor + extra)
+
+    def inject_error(self, service: str, name: str) -> bool:
+        with self.lock:
+            self.requests[f"{service}.{name}"] += 1
+            failed = self.rng.random() < self.config[f"{service}_error_rate"]
+            if failed:
+                self.injected_errors[f"{service}.{name}"] += 1
+        return failed
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _dispatch(self, verb: str):
+        state: _FakeState = self.server.state
+        body = self._read_body()
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            self._send_json(200, {"requests": state.requests, "injected_errors": state.injected_errors,
+                                  "sheet_rows": sum(max(len(rows) - 1, 0) for rows in state.sheets.values())})
+            return
+        handler = {"telegram": _telegram, "groq": _groq, "sheets": _sheets}[self.server.service]
+        handler(self, state, verb, url.path, params, body)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, payload, headers: Optional[dict] = None):
+        self._send_bytes(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def form(self, body: bytes) -> dict:
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or b"{}")
+        return {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+
+def _telegram(handler: _FakeHandler, state: _FakeState, verb: str, path: str, params: dict, body: bytes):
+    if path.startswith("/file/"):
+        name = os.path.basename(path)
+        with open(os.path.join(state.voice_dir, name), "rb") as f:
+            data = f.read()
+        state.delay("telegram", extra=len(data) / (state.config["telegram_download_mbps"] * 1024 * 1024))
+        handler._send_bytes(200, data, "audio/ogg")
+        return
+
+    method = path.rsplit("/", 1)[-1]
+    data = handler.form(body)
+    if method == "getMe":
+        handler._send_json(200, {"ok": True, "result": {
+            "id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}})
+        return
+
+    state.delay("telegram")
+    if state.inject_error("telegram", method):
+        handler._send_json(429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                                 "parameters": {"retry_after": 1}})
+        return
+
+    chat_id = int(data.get("chat_id") or 0)
+    text = data.get("text", "")
+    if method == "sendMessage":
+        with state.lock:
+            message_id = state.next_message_id
+            state.next_message_id += 1
+        state.events.put((time.time(), "send", chat_id, message_id, text[:8]))
+    elif method == "editMessageText":
+        message_id = int(data.get("message_id") or 0)
+        state.events.put((time.time(), "edit", chat_id, message_id, text[:8]))
+    elif method == "getFile":
+        file_id = data.get("file_id", "")
+        size = os.path.getsize(os.path.join(state.voice_dir, f"{file_id}.oga"))
+        handler._send_json(200, {"ok": True, "result": {
+            "file_id": file_id, "file_unique_id": file_id, "file_size": size, "file_path": f"voice/{file_id}.oga"}})
+        return
+    else:
+        handler._send_json(200, {"ok": True, "result": True})
+        return
+
+    handler._send_json(200, {"ok": True, "result": {
+        "message_id": message_id, "date": int(time.time()), "text": text,
+        "chat": {"id": chat_id, "type": "group", "title": "Benchmark"}}})
+
+
+def _fake_text(seed: bytes, words: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(max(3, words)))
+
+
+def _groq(handler: _FakeHandler, state: _FakeState, verb: str, path: str, params: dict, body: bytes):
+    method = path.rsplit("/", 1)[-1]
+    if method == "models":
+        handler._send_json(200, {"object": "list", "data": []})
+        return
+    if method == "transcriptions":
+        audio_seconds = len(body) / OPUS_BYTES_PER_SECOND
+        state.delay("groq", extra=audio_seconds * state.config["transcribe_rtf"])
+    else:
+        state.delay("groq")
+    if state.inject_error("groq", method):
+        if state.rng.random() < 0.5:
+            handler._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                               {"Retry-After": "1"})
+        else:
+            handler._send_json(503, {"error": {"message": "Service Unavailable", "type": "internal_server_error"}})
+        return
+
+    if method == "transcriptions":
+        # Ca. 2,2 gesprochene Wörter pro Sekunde
+        handler._send_json(200, {"text": _fake_text(body[-64:], int(audio_seconds * 2.2)),
+                                 "x_groq": {"id": "req_benchmark"}})
+        return
+
+    prompt = json.loads(body)["messages"][-1]["content"]
+    match = re.search(r'Original-Transkript:\*\*"(.*)"', prompt, re.DOTALL)
+    source = match.group(1) if match else prompt[-2000:]
+    content = source.strip().capitalize() + "."
+    # Generierung dauert proportional zur Länge der Antwort (ca. 4 Zeichen pro Token)
+    time.sleep(len(content) / 4 / state.config["llm_tokens_per_second"])
+    handler._send_json(200, {
+        "id": "chatcmpl-benchmark", "object": "chat.completion", "created": int(time.time()),
+        "model": json.loads(body).get("model", "benchmark"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": (len(prompt) + len(content)) // 4}})
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1
+
+
+def _sheet_properties(state: _FakeState, title: str) -> dict:
+    return {"sheetId": state.sheet_ids[title], "title": title, "index": list(state.sheet_ids).index(title),
+            "sheetType": "GRID", "gridProperties": {"rowCount": 100000, "columnCount": len(SHEET_HEADERS)}}
+
+
+def _sheets_batch_update(state: _FakeState, requests: list) -> list:
+    """Anlegen und Umbenennen von Arbeitsblättern; alles andere wird nur bestätigt."""
+    replies = []
+    with state.lock:
+        for request in requests:
+            if "addSheet" in request:
+                title = request["addSheet"]["properties"]["title"]
+                state.sheet_ids[title] = max(state.sheet_ids.values()) + 1
+                state.sheets[title] = []
+                replies.append({"addSheet": {"properties": _sheet_properties(state, title)}})
+                continue
+            properties = request.get("updateSheetProperties", {}).get("properties", {})
+            if "title" in properties:
+                old = next(t for t, sheet_id in state.sheet_ids.items() if sheet_id == properties["sheetId"])
+                state.sheet_ids[properties["title"]] = state.sheet_ids.pop(old)
+                state.sheets[properties["title"]] = state.sheets.pop(old)
+            replies.append({})
+    return replies
+
+
+def _sheets(handler: _FakeHandler, state: _FakeState, verb: str, path: str, params: dict, body: bytes):
+    state.delay("sheets")
+    if path.startswith("/drive/"):
+        handler._send_json(200, {"id": BENCH_SHEET_ID, "name": "Benchmark", "createdTime": "2025-01-01T00:00:00.000Z",
+                                 "modifiedTime": "2025-01-01T00:00:00.000Z"})
+        return
+    if "/values" not in path:
+        if verb == "POST":  # :batchUpdate (Blätter anlegen/umbenennen, Zeilen einfügen)
+            requests = json.loads(body or b"{}").get("requests", [])
+            handler._send_json(200, {"spreadsheetId": BENCH_SHEET_ID, "replies": _sheets_batch_update(state, requests)})
+            return
+        with state.lock:
+            sheets = [{"properties": _sheet_properties(state, title)} for title in state.sheet_ids]
+        handler._send_json(200, {
+            "spreadsheetId": BENCH_SHEET_ID, "spreadsheetUrl": f"https://example.invalid/{BENCH_SHEET_ID}",
+            "properties": {"title": "Benchmark", "locale": "de_DE", "timeZone": "Europe/Berlin"},
+            "sheets": sheets})
+        return
+
+    a1_range = unquote(path.split("/values/", 1)[-1]) if "/values/" in path else ""
+    title, _, cells = a1_range.rpartition("!")
+    title = title.strip("'").replace("''", "'") or "Sheet1"
+    last_column = chr(ord("A") + len(SHEET_HEADERS) - 1)
+    if cells.endswith(":append"):
+        if state.inject_error("sheets", "append"):
+            handler._send_json(429, {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}},
+                               {"Retry-After": "1"})
+            return
+        values = json.loads(body)["values"]
+        with state.lock:
+            rows = state.sheets.setdefault(title, [])
+            first = len(rows) + 1
+            rows.extend(values)
+        quoted = "'" + title.replace("'", "''") + "'"
+        handler._send_json(200, {"spreadsheetId": BENCH_SHEET_ID, "tableRange": f"{quoted}!A1:{last_column}1", "updates": {
+            "spreadsheetId": BENCH_SHEET_ID,
+            "updatedRange": f"{quoted}!A{first}:{last_column}{first + len(values) - 1}",
+            "updatedRows": len(values), "updatedColumns": len(SHEET_HEADERS),
+            "updatedCells": len(values) * len(SHEET_HEADERS)}})
+        return
+    match = re.match(r"[A-Z]*(\d+)(?::[A-Z]*(\d+))?", cells)
+    if verb != "GET":
+        values = json.loads(body or b"{}").get("values", [])
+        if match and values:
+            with state.lock:
+                rows = state.sheets.setdefault(title, [])
+                start = int(match.group(1)) - 1
+                rows.extend([] for _ in range(start + len(values) - len(rows)))
+                rows[start:start + len(values)] = values
+        handler._send_json(200, {"spreadsheetId": BENCH_SHEET_ID, "updatedRange": a1_range, "responses": []})
+        return
+
+    with state.lock:
+        rows = [list(row) for row in state.sheets.get(title, [])]
+        state.requests["sheets.values_get"] += 1
+    if params.get("majorDimension") == "COLUMNS":
+        column = _column_index(re.match(r"[A-Z]*", cells).group(0) or "A")
+        handler._send_json(200, {"range": a1_range, "majorDimension": "COLUMNS",
+                                 "values": [[row[column] if len(row) > column else "" for row in rows]]})
+        return
+    if match:
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        rows = rows[start - 1:end]
+    handler._send_json(200, {"range": a1_range, "majorDimension": "ROWS", "values": rows})
+
+
+def serve_fakes(config: dict, voice_dir: str, events, ready):
+    """Einstiegspunkt des Attrappen-Prozesses: startet je einen HTTP-Server für Telegram, Groq und Sheets."""
+    state = _FakeState(config, voice_dir, events)
+    ports = {}
+    for service in ("telegram", "groq", "sheets"):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeHandler)
+        server.daemon_threads = True
+        server.service = service
+        server.state = state
+        ports[service] = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put(ports)
+    threading.Event().wait()
+
+
+def _fake_sheets_client(base_url: str):
+    """gspread-Client, dessen Anfragen an sheets.googleapis.com bei der lokalen Attrappe landen."""
+    import gspread
+    from google.auth.credentials import AnonymousCredentials
+    from requests.adapters import HTTPAdapter
+
+    class RedirectAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            parts = urlsplit(request.url)
+            request.url = base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+            return super().send(request, **kwargs)
+
+    client = gspread.Client(auth=AnonymousCredentials())
+    adapter = RedirectAdapter()
+    for prefix in ("https://sheets.googleapis.com/", "https://www.googleapis.com/"):
+        client.http_client.session.mount(prefix, adapter)
+    return client
+
+
+# ---------------------------------------------------------------------------
+# Messung
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _NoteRun:
+    index: int
+    chat_id: int
+    seconds: int
+    size_bytes: int
+    file_id: str
+    dispatched_at: float = 0.0
+    status_message_id: Optional[int] = None
+    finished_at: Optional[float] = None
+    outcome: Optional[str] = None
+
+
+class _Tracker:
+    """
+    Ordnet die Nachrichten an die Telegram-Attrappe den Sprachnachrichten zu. Pro Chat ist die
+    Verarbeitung strikt sequenziell (ChatScheduler), daher reicht eine FIFO-Zuordnung je Chat.
+    Fertig ist eine Sprachnachricht, sobald ihre Endnachricht bei "Telegram" angekommen ist.
+    """
+
+    def __init__(self):
+        self._open: Dict[int, deque] = defaultdict(deque)
+        self._by_message: Dict[int, _NoteRun] = {}
+        self._pending = 0
+        self._all_done = asyncio.Event()
+
+    def dispatched(self, run: _NoteRun):
+        run.dispatched_at = time.time()
+        self._open[run.chat_id].append(run)
+        self._pending += 1
+        self._all_done.clear()
+
+    def on_event(self, timestamp: float, kind: str, chat_id: int, message_id: int, text: str):
+        queue = self._open[chat_id]
+        if kind == "send" and text.startswith("🎤"):
+            for run in queue:
+                if run.status_message_id is None:
+                    run.status_message_id = message_id
+                    self._by_message[message_id] = run
+                    return
+        elif kind == "edit" and text.startswith(FINAL_PREFIXES) and message_id in self._by_message:
+            outcome = "ok" if text.startswith("✅") else "parked" if text.startswith("⏸️") else "failed"
+            self._finish(self._by_message.pop(message_id), timestamp, outcome)
+        elif kind == "send" and text.startswith("❌") and queue:
+            self._finish(queue[0], timestamp, "failed")
+
+    def _finish(self, run: _NoteRun, timestamp: float, outcome: str):
+        if run.finished_at is not None:
+            return
+        run.finished_at = timestamp
+        run.outcome = outcome
+        self._open[run.chat_id].remove(run)
+        self._pending -= 1
+        if self._pending == 0:
+            self._all_done.set()
+
+    async def wait(self, timeout: float) -> bool:
+        if self._pending == 0:
+            return True
+        try:
+            await asyncio.wait_for(self._all_done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Perzentil mit linearer Interpolation (q zwischen 0 und 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _latency_summary(values: List[float]) -> dict:
+    return {"count": len(values), "mean": sum(values) / len(values) if values else None,
+            "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "max": max(values) if values else None}
+
+
+def _bucket_quantile(buckets, counts: List[int], total: int, q: float) -> Optional[float]:
+    """Näherungsweises Quantil aus kumulativen Histogramm-Buckets (wie histogram_quantile in Prometheus)."""
+    if not total:
+        return None
+    rank = total * q
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in zip(buckets, counts):
+        if count >= rank:
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return buckets[-1]
+
+
+def _stage_breakdown(before: dict, after: dict, buckets) -> dict:
+    stages = {}
+    for key, series in after.items():
+        previous = before.get(key, [0] * len(series))
+        delta = [a - b for a, b in zip(series, previous)]
+        count = delta[-1]
+        if not count:
+            continue
+        stages[dict(key).get("stage", "?")] = {
+            "count": count, "total_seconds": delta[-2], "mean_seconds": delta[-2] / count,
+            "p50_approx": _bucket_quantile(buckets, delta[:-2], count, 0.50),
+            "p95_approx": _bucket_quantile(buckets, delta[:-2], count, 0.95)}
+    return dict(sorted(stages.items(), key=lambda item: -item[1]["total_seconds"]))
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet Kilobyte, macOS Bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "-uno"], cwd=BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def _prepare_notes(args, voice_dir: str, use_ffmpeg: bool) -> List[_NoteRun]:
+    rng = random.Random(args.seed)
+    durations = [int(d) for d in args.durations.split(",")]
+    runs = []
+    for index in range(args.warmup + args.notes):
+        seconds = rng.choice(durations)
+        file_id = f"bench{args.seed}n{index:05d}"
+        path = os.path.join(voice_dir, f"{file_id}.oga")
+        if not (use_ffmpeg and ffmpeg_ogg(path, seconds, args.seed * 100000 + index)):
+            synthetic_ogg(path, seconds, args.seed * 100000 + index)
+        runs.append(_NoteRun(index, -1000 - index % args.chats, seconds, os.path.getsize(path), file_id))
+    return runs
+
+
+def _voice_update(run: _NoteRun) -> dict:
+    chat_number = -1000 - run.chat_id
+    return {"update_id": 100000 + run.index, "message": {
+        "message_id": 100000 + run.index, "date": int(time.time()),
+        "chat": {"id": run.chat_id, "type": "group", "title": f"Benchmark {chat_number}"},
+        "from": {"id": 5000 + chat_number, "is_bot": False, "first_name": f"Elternteil {chat_number}"},
+        "voice": {"file_id": run.file_id, "file_unique_id": run.file_id, "duration": run.seconds,
+                  "mime_type": "audio/ogg", "file_size": run.size_bytes}}}
+
+
+async def _drive(bot, tracker: _Tracker, runs: List[_NoteRun], rate: float, timeout: float) -> bool:
+    from telegram import Update
+
+    started = time.monotonic()
+    tasks = []
+    for i, run in enumerate(runs):
+        if rate > 0:
+            await asyncio.sleep(max(0.0, started + i / rate - time.monotonic()))
+        tracker.dispatched(run)
+        update = Update.de_json(_voice_update(run), bot.application.bot)
+        tasks.append(asyncio.create_task(bot.application.process_update(update)))
+    finished = await tracker.wait(timeout)
+    await asyncio.wait(tasks, timeout=5)
+    return finished
+
+
+async def _run(args, workdir: str, fake_urls: Dict[str, str], events, runs: List[_NoteRun], audio_mode: str) -> dict:
+    # Die Bot-Module lesen ihre Konfiguration beim Import, daher erst hier importieren
+    from telegram_bot import TochterErinnerungenBot
+    from metrics import metrics, LATENCY_BUCKETS
+    import startup
+
+    rss_start = _rss_mb()
+    bot = TochterErinnerungenBot()
+
+    bot.sheets_manager._authenticate = lambda: _fake_sheets_client(fake_urls["sheets"])
+
+    await bot.application.initialize()
+    await bot.post_init_async(bot.application)
+
+    loop = asyncio.get_running_loop()
+    tracker = _Tracker()
+
+    def pump():
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            loop.call_soon_threadsafe(tracker.on_event, *item)
+    pump_thread = threading.Thread(target=pump, daemon=True)
+    pump_thread.start()
+
+    warmup, measured = runs[:args.warmup], runs[args.warmup:]
+    if warmup:
+        logger.info(f"Aufwärmen mit {len(warmup)} Sprachnachricht(en)...")
+        await _drive(bot, tracker, warmup, rate=0, timeout=args.timeout)
+
+    stages_before = metrics.histogram_snapshot("bot_stage_duration_seconds")
+    logger.info(f"Starte Messung: {len(measured)} Sprachnachrichten in {args.chats} Chats...")
+    started = time.time()
+    completed = await _drive(bot, tracker, measured, rate=args.rate, timeout=args.timeout)
+    finished_at = max((run.finished_at for run in measured if run.finished_at), default=time.time())
+    stages_after = metrics.histogram_snapshot("bot_stage_duration_seconds")
+
+    # Wie lange braucht die Replikation nach Google Sheets, bis alles abgeglichen ist?
+    sheets_started = time.time()
+    while await asyncio.to_thread(bot.memory_store.size) > 0 and time.time() - sheets_started < args.timeout:
+        await asyncio.sleep(0.1)
+    sheets_drain = time.time() - sheets_started
+    rss_peak = _peak_rss_mb()
+
+    await bot.post_shutdown_async(bot.application)
+    await bot.application.shutdown()
+    events.put(None)
+    pump_thread.join(timeout=5)
+
+    with urllib.request.urlopen(f"{fake_urls['telegram']}/_stats", timeout=5) as response:
+        fake_stats = json.load(response)
+
+    latencies = [run.finished_at - run.dispatched_at for run in measured if run.finished_at]
+    wall = max(finished_at - started, 1e-9)
+    outcomes = defaultdict(int)
+    by_duration = defaultdict(list)
+    for run in measured:
+        outcomes[run.outcome or "unfinished"] += 1
+        if run.finished_at:
+            by_duration[str(run.seconds)].append(run.finished_at - run.dispatched_at)
+
+    return {
+        "benchmark": "voice_end_to_end",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**{k: v for k, v in vars(args).items() if k not in ("command", "output")}, "audio": audio_mode},
+        "notes": {"total": len(measured), "all_finished": completed, **outcomes},
+        "wall_seconds": wall,
+        "throughput": {"notes_per_second": len(latencies) / wall,
+                       "audio_seconds_per_second": sum(r.seconds for r in measured if r.finished_at) / wall},
+        "latency_seconds": _latency_summary(latencies),
+        "latency_by_duration": {d: _latency_summary(v) for d, v in sorted(by_duration.items(), key=lambda i: int(i[0]))},
+        "stages": _stage_breakdown(stages_before, stages_after, LATENCY_BUCKETS),
+        "sheets_drain_seconds": sheets_drain,
+        "memory_mb": {"rss_start": rss_start, "rss_peak": rss_peak},
+        "startup_seconds": startup.phases(),
+        "fake_services": fake_stats,
+    }
+
+
+def run_benchmark(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    voice_dir = os.path.join(workdir, "voice")
+    os.makedirs(voice_dir)
+    use_ffmpeg = bool(shutil.which("ffmpeg")) and not args.synthetic_audio
+    try:
+        import pydub  # noqa: F401
+    except ImportError:
+        use_ffmpeg = False
+    logger.info("Erzeuge synthetische Sprachnachrichten...")
+    runs = _prepare_notes(args, voice_dir, use_ffmpeg)
+
+    context = multiprocessing.get_context("spawn")
+    events, ready = context.Queue(), context.Queue()
+    config = {"seed": args.seed, "telegram_latency": args.telegram_latency, "telegram_error_rate": args.telegram_error_rate,
+              "telegram_download_mbps": args.telegram_download_mbps, "groq_latency": args.groq_latency,
+              "groq_error_rate": args.groq_error_rate, "transcribe_rtf": args.transcribe_rtf,
+              "llm_tokens_per_second": args.llm_tokens_per_second, "sheets_latency": args.sheets_latency,
+              "sheets_error_rate": args.sheets_error_rate}
+    fakes = context.Process(target=serve_fakes, args=(config, voice_dir, events, ready), daemon=True)
+    fakes.start()
+    try:
+        ports = ready.get(timeout=30)
+        fake_urls = {service: f"http://127.0.0.1:{port}" for service, port in ports.items()}
+        # Alles, was der Bot speichert, landet im Arbeitsverzeichnis; Caches sind leer
+        os.environ.update({
+            "TELEGRAM_BOT_TOKEN": BENCH_TOKEN,
+            "TELEGRAM_API_BASE_URL": f"{fake_urls['telegram']}/bot",
+            "TELEGRAM_FILE_BASE_URL": f"{fake_urls['telegram']}/file/bot",
+            "GROQ_API_KEY": "benchmark",
+            "GROQ_BASE_URL": fake_urls["groq"],
+            "GOOGLE_SHEETS_ID": BENCH_SHEET_ID,
+            "BOT_MODE": "polling",
+            "MEMORY_DB_URI": f"sqlite:///{os.path.join(workdir, 'app.db')}",
+            "CACHE_DB_PATH": os.path.join(workdir, "cache.db"),
+            "PARKED_DB_PATH": os.path.join(workdir, "parked.db"),
+            "SEARCH_DB_PATH": os.path.join(workdir, "search.db"),
+        })
+        if not use_ffmpeg:
+            # Synthetische Pakete sind nicht dekodierbar: Normalisierung überspringen
+            os.environ["AUDIO_NORMALIZE_MIN_BYTES"] = str(1 << 40)
+        return asyncio.run(_run(args, workdir, fake_urls, events, runs, "ffmpeg" if use_ffmpeg else "synthetic"))
+    finally:
+        fakes.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(result: dict):
+    latency = result["latency_seconds"]
+    notes = result["notes"]
+    fmt = lambda value: "-" if value is None else f"{value:.2f}"
+    print(f"\n📊 Benchmark @ {result['git']['commit']}{' (geändert)' if result['git']['dirty'] else ''} "
+          f"– Audio: {result['config']['audio']}")
+    print(f"   Sprachnachrichten: {notes['total']} (ok {notes.get('ok', 0)}, fehlgeschlagen {notes.get('failed', 0)}, "
+          f"geparkt {notes.get('parked', 0)}, offen {notes.get('unfinished', 0)})")
+    print(f"   Durchsatz: {result['throughput']['notes_per_second']:.2f} Nachrichten/s, "
+          f"{result['throughput']['audio_seconds_per_second']:.1f} s Audio/s")
+    print(f"   Latenz: p50 {fmt(latency['p50'])}s, p95 {fmt(latency['p95'])}s, p99 {fmt(latency['p99'])}s, "
+          f"max {fmt(latency['max'])}s")
+    for name, stage in result["stages"].items():
+        print(f"     {name:<16} {stage['count']:>5}×  Ø {stage['mean_seconds']:.3f}s  "
+              f"p95≈{fmt(stage['p95_approx'])}s  Summe {stage['total_seconds']:.1f}s")
+    print(f"   Sheets-Abgleich danach: {result['sheets_drain_seconds']:.1f}s")
+    print(f"   Speicher: RSS Start {fmt(result['memory_mb']['rss_start'])} MB, Spitze {result['memory_mb']['rss_peak']:.1f} MB")
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    rows = [("Durchsatz (Nachrichten/s)", ("throughput", "notes_per_second")),
+            ("Latenz p50 (s)", ("latency_seconds", "p50")),
+            ("Latenz p95 (s)", ("latency_seconds", "p95")),
+            ("Latenz p99 (s)", ("latency_seconds", "p99")),
+            ("Sheets-Abgleich (s)", ("sheets_drain_seconds",)),
+            ("RSS-Spitze (MB)", ("memory_mb", "rss_peak"))]
+    for stage in sorted(set(old["stages"]) | set(new["stages"])):
+        rows.append((f"Stufe {stage} Ø (s)", ("stages", stage, "mean_seconds")))
+
+    def lookup(result, path):
+        for key in path:
+            if not isinstance(result, dict) or key not in result:
+                return None
+            result = result[key]
+        return result
+
+    print(f"{'':<32} {old['git']['commit'] or 'alt':>12} {new['git']['commit'] or 'neu':>12} {'Δ':>9}")
+    for label, path in rows:
+        before, after = lookup(old, path), lookup(new, path)
+        delta = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else ""
+        print(f"{label:<32} {'-' if before is None else f'{before:.3f}':>12} "
+              f"{'-' if after is None else f'{after:.3f}':>12} {delta:>9}")
+
+
+# ---------------------------------------------------------------------------
+# Prüfung: gleichzeitige Sprachnachrichten blockieren sich nicht
+# ---------------------------------------------------------------------------
+
+class _SleepingGroq:
+    """AsyncGroq-Attrappe: jeder Aufruf (Whisper oder Chat) wartet `latency` Sekunden, ohne die Event-Loop zu blockieren."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    async def _transcribe(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        # Text aus dem Inhalt ableiten: verschiedene Nachrichten, verschiedene Transkripte (kein Cache-Treffer)
+        return SimpleNamespace(text=_fake_text(kwargs["file"][1].read(), 12))
+
+    async def _complete(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=messages[-1]["content"][-200:]))])
+
+
+class _CheckFile:
+    def __init__(self, source: str):
+        self.source = source
+
+    async def download_to_drive(self, path: str):
+        shutil.copyfile(self.source, path)
+
+
+class _CheckBot:
+    """Telegram-Attrappe: liefert die vorbereiteten Dateien aus `voice_dir` ohne Netzwerk."""
+
+    def __init__(self, voice_dir: str):
+        self.voice_dir = voice_dir
+
+    async def get_file(self, file_id: str):
+        return _CheckFile(os.path.join(self.voice_dir, f"{file_id}.ogg"))
+
+
+class _CheckStore:
+    async def save_memory(self, original_text, enhanced_text, author, telegram_file_id=None, prompt_version=None,
+                          entry_id=None):
+        return SimpleNamespace(entry_id=entry_id or telegram_file_id, author=author, created_at=datetime.now(),
+                               original_text=original_text, enhanced_text=enhanced_text)
+
+
+class _CheckIndex:
+    async def aadd(self, *args):
+        pass
+
+
+class _CheckStatus:
+    def __init__(self):
+        self.final: Optional[str] = None
+
+    def update(self, text: str):
+        pass
+
+    def finish(self, text: str, parse_mode: Optional[str] = None):
+        self.final = text
+
+
+def check_concurrency(args) -> bool:
+    """
+    Schickt erst eine, dann `--notes` Sprachnachrichten gleichzeitig durch VoiceProcessor.run; Groq ist
+    eine Attrappe mit fester Latenz je Aufruf. Laufen die Nachrichten wirklich nebeneinander, brauchen
+    alle zusammen kaum länger als eine einzelne. Gibt False zurück, wenn das nicht der Fall ist.
+    """
+    workdir = tempfile.mkdtemp(prefix="concurrency_check_")
+    voice_dir = os.path.join(workdir, "voice")
+    os.makedirs(voice_dir)
+    os.environ.update({
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.db"),
+        "ARCHIVE_ENABLED": "false",
+        "TRANSCRIPTION_BACKENDS": "groq",
+        # Die Obergrenze für Groq-Aufrufe ist gewollt; geprüft wird, dass darunter nichts serialisiert
+        "GROQ_MAX_CONCURRENCY": str(args.notes),
+        "AUDIO_NORMALIZE_MIN_BYTES": str(1 << 40),
+    })
+    from voice_processor import VoiceProcessor
+
+    for index in range(args.notes + 1):
+        synthetic_ogg(os.path.join(voice_dir, f"note-{index}.ogg"), 5, index)
+
+    async def scenario():
+        groq = _SleepingGroq(args.groq_latency)
+        processor = VoiceProcessor(_CheckBot(voice_dir), _CheckStore(), _CheckIndex())
+        processor.set_groq_client(groq)
+
+        async def one(index: int) -> bool:
+            status = _CheckStatus()
+            await processor.run(f"note-{index}", f"unique-{index}", "Benchmark", status)
+            return bool(status.final and status.final.startswith("✅"))
+
+        started = time.perf_counter()
+        single_ok = await one(0)
+        single = time.perf_counter() - started
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(index) for index in range(1, args.notes + 1)))
+        return single_ok and all(results), single, time.perf_counter() - started, groq.calls
+
+    try:
+        all_ok, single, concurrent, calls = asyncio.run(scenario())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    limit = single * args.tolerance + 0.1
+    print(f"Eine Sprachnachricht: {single:.2f}s, {args.notes} gleichzeitig: {concurrent:.2f}s "
+          f"(erlaubt ≤ {limit:.2f}s, nacheinander wären es ≈ {single * args.notes:.1f}s; {calls} Groq-Aufrufe)")
+    if not all_ok:
+        print("❌ Nicht alle Sprachnachrichten wurden gespeichert.")
+        return False
+    if concurrent > limit:
+        print("❌ Gleichzeitige Sprachnachrichten blockieren sich gegenseitig.")
+        return False
+    print("✅ Gleichzeitige Sprachnachrichten laufen parallel.")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Prüfung: Wiederholungen, Circuit Breaker und Frist gegen einen lokalen HTTP-Stub
+# ---------------------------------------------------------------------------
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    """Antwortet je Pfad der Reihe nach mit (Status, Header, Verzögerung); der letzte Eintrag wiederholt sich."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path].append(time.monotonic())
+            script = server.script[self.path]
+            status, headers, delay = script.pop(0) if len(script) > 1 else script[0]
+        time.sleep(delay)
+        data = json.dumps({"status": status}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _StubHTTPError(Exception):
+    """Wie die Fehler von httpx bzw. dem Groq-SDK: Statuscode und Antwort-Header an `response`."""
+
+    def __init__(self, status: int, headers: dict):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(status_code=status, headers=headers)
+
+
+def _stub_get(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        raise _StubHTTPError(e.code, dict(e.headers.items()))
+
+
+def check_resilience() -> bool:
+    """
+    Prüft resilient_call und CircuitBreaker gegen einen lokalen HTTP-Stub: 429 mit Retry-After wird
+    abgewartet, wiederholte 503 öffnen den Breaker, nach der Sperrzeit darf genau ein Testaufruf durch
+    (Fehler öffnet erneut, Erfolg schließt), und die Gesamtfrist begrenzt einen hängenden Aufruf.
+    """
+    from resilience import CircuitBreaker, CircuitOpenError, get_breaker, resilient_call
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = defaultdict(list)
+    server.script = {
+        "/retry-after": [(429, {"Retry-After": "1"}, 0), (503, {}, 0), (200, {}, 0)],
+        "/unavailable": [(503, {}, 0)],
+        "/slow": [(200, {}, 3)],
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+
+    def expect(name: str, condition: bool, detail: str = ""):
+        results.append(condition)
+        print(f"{'✅' if condition else '❌'} {name}{f' ({detail})' if detail else ''}")
+
+    def call(path: str):
+        return lambda: asyncio.to_thread(_stub_get, base_url + path)
+
+    async def scenario():
+        # 429 mit Retry-After, dann 503: der zweite Versuch kommt frühestens nach der angegebenen Zeit
+        status = await resilient_call(call("/retry-after"), backend="check-retry-after", timeout=5)
+        hits = server.hits["/retry-after"]
+        gap = hits[1] - hits[0] if len(hits) == 3 else 0.0
+        expect("429 mit Retry-After und 503 werden wiederholt", status == 200 and gap >= 0.9,
+               f"{len(hits)} Anfragen, Abstand {gap:.2f}s")
+
+        breaker = get_breaker("check-breaker")
+        breaker.failure_threshold, breaker.reset_seconds = 2, 1.0
+        try:
+            await resilient_call(call("/unavailable"), backend="check-breaker", timeout=5, max_attempts=2)
+            expect("503 führt nach allen Versuchen zum Fehler", False)
+        except _StubHTTPError as e:
+            expect("503 führt nach allen Versuchen zum Fehler", e.status_code == 503)
+        expect("Breaker öffnet nach wiederholten 503", breaker.state == CircuitBreaker.OPEN)
+
+        before = len(server.hits["/unavailable"])
+        try:
+            await resilient_call(call("/unavailable"), backend="check-breaker", timeout=5)
+            expect("Offener Breaker lehnt ohne Anfrage ab", False)
+        except CircuitOpenError as e:
+            expect("Offener Breaker lehnt ohne Anfrage ab", len(server.hits["/unavailable"]) == before,
+                   f"neuer Versuch in {e.retry_in:.1f}s")
+
+        await asyncio.sleep(breaker.reset_seconds + 0.1)
+        try:
+            await resilient_call(call("/unavailable"), backend="check-breaker", timeout=5, max_attempts=1)
+        except _StubHTTPError:
+            pass
+        expect("Fehlgeschlagener Testaufruf (halb offen) öffnet erneut",
+               breaker.state == CircuitBreaker.OPEN and len(server.hits["/unavailable"]) == before + 1)
+
+        await asyncio.sleep(breaker.reset_seconds + 0.1)
+        server.script["/unavailable"] = [(200, {}, 0)]
+        status = await resilient_call(call("/unavailable"), backend="check-breaker", timeout=5, max_attempts=1)
+        expect("Erfolgreicher Testaufruf schließt den Breaker", status == 200 and breaker.state == CircuitBreaker.CLOSED)
+
+        started = time.perf_counter()
+        try:
+            await resilient_call(call("/slow"), backend="check-deadline", timeout=5, deadline=0.5)
+            expect("Gesamtfrist begrenzt einen hängenden Aufruf", False)
+        except asyncio.TimeoutError:
+            elapsed = time.perf_counter() - started
+            expect("Gesamtfrist begrenzt einen hängenden Aufruf", elapsed < 1.0, f"{elapsed:.2f}s bei Frist 0.5s")
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-End-Benchmark für Sprachnachrichten mit lokalen Attrappen.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Benchmark ausführen")
+    run.add_argument("--notes", type=int, default=40, help="Anzahl gemessener Sprachnachrichten")
+    run.add_argument("--warmup", type=int, default=2, help="Sprachnachrichten vor der Messung (nicht gewertet)")
+    run.add_argument("--chats", type=int, default=8, help="Anzahl verschiedener Chats")
+    run.add_argument("--rate", type=float, default=2.0, help="Ankünfte pro Sekunde (0 = alle auf einmal)")
+    run.add_argument("--durations", default="5,20,60,180", help="Mögliche Längen in Sekunden, kommagetrennt")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--timeout", type=float, default=600, help="Maximale Wartezeit auf alle Ergebnisse (s)")
+    run.add_argument("--synthetic-audio", action="store_true", help="Kein ffmpeg verwenden (Normalisierung entfällt)")
+    run.add_argument("--telegram-latency", type=float, default=0.05)
+    run.add_argument("--telegram-error-rate", type=float, default=0.0)
+    run.add_argument("--telegram-download-mbps", type=float, default=20.0)
+    run.add_argument("--groq-latency", type=float, default=0.3)
+    run.add_argument("--groq-error-rate", type=float, default=0.0)
+    run.add_argument("--transcribe-rtf", type=float, default=0.01, help="Sekunden Transkription je Sekunde Audio")
+    run.add_argument("--llm-tokens-per-second", type=float, default=800.0)
+    run.add_argument("--sheets-latency", type=float, default=0.2)
+    run.add_argument("--sheets-error-rate", type=float, default=0.0)
+    run.add_argument("--log-level", default="WARNING")
+    run.add_argument("--output", help="Pfad der JSON-Datei (Standard: benchmark_results/<Zeit>-<Commit>.json)")
+    cmp = sub.add_parser("compare", help="Zwei Ergebnisdateien vergleichen")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    check = sub.add_parser("check-concurrency", help="Prüfen, dass N gleichzeitige Sprachnachrichten so lange "
+                                                     "wie eine dauern (Exit-Code 1 bei Verstoß)")
+    check.add_argument("--notes", type=int, default=8)
+    check.add_argument("--groq-latency", type=float, default=0.5, help="Latenz je Groq-Aufruf (s)")
+    check.add_argument("--tolerance", type=float, default=1.5, help="Erlaubtes Vielfaches der Dauer einer Nachricht")
+    sub.add_parser("check-resilience", help="Wiederholungen, Circuit Breaker und Frist gegen einen lokalen "
+                                            "HTTP-Stub prüfen (Exit-Code 1 bei Verstoß)")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.old, args.new)
+        return
+    if args.command == "check-concurrency":
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+        sys.exit(0 if check_concurrency(args) else 1)
+    if args.command == "check-resilience":
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.ERROR)
+        sys.exit(0 if check_resilience() else 1)
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=args.log_level)
+    logger.setLevel(logging.INFO)
+    result = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git']['commit'] or 'unbekannt'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print_report(result)
+    print(f"\n💾 Ergebnis gespeichert: {output}")
+
+
+if __name__ == '__main__':
+    main()
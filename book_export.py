@@ -0,0 +1,246 @@
+# book_export.py - Das Buch der Erinnerungen: ein Jahr als Markdown, HTML oder PDF
+#
+#   python book_export.py 2025                         # exports/erinnerungen-2025.html
+#   python book_export.py 2025 --format pdf            # PDF (benötigt weasyprint)
+#   python book_export.py 2025 --format md --output buch.md
+
+import os
+import sys
+import html
+import time
+import asyncio
+import argparse
+import logging
+import importlib.util
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from cache import TwoTierCache, sha256_text
+from models import db, Memory
+from summary_generator import MONTH_NAMES, month_label
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+BOOK_TITLE = os.getenv('BOOK_TITLE', 'Erinnerungen an Ellie')
+BOOK_EXPORT_DIR = os.getenv('BOOK_EXPORT_DIR', os.path.join(BASE_DIR, 'exports'))
+# Gerenderte Monate im Speicher; der Rest liegt in cache.db, damit ein Export nie das ganze Buch festhält
+BOOK_CACHE_MEMORY_ENTRIES = int(os.getenv('BOOK_CACHE_MEMORY_ENTRIES', '12'))
+# Bei jeder Änderung an den Vorlagen erhöhen, damit zwischengespeicherte Monate neu gerendert werden
+BOOK_RENDER_VERSION = "1"
+
+BOOK_FORMATS = ("md", "html", "pdf")
+WEEKDAY_NAMES = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
+
+HTML_STYLE = """
+body { font-family: Georgia, "Times New Roman", serif; max-width: 40em; margin: 2em auto; padding: 0 1em;
+       line-height: 1.6; color: #222; }
+h1 { text-align: center; font-size: 2.4em; margin: 3em 0; }
+h2 { border-bottom: 1px solid #ccc; padding-bottom: .2em; margin-top: 2.5em; }
+h3 { font-size: 1em; font-weight: normal; color: #666; margin-bottom: .3em; }
+article { margin-bottom: 1.8em; }
+@page { size: A5; margin: 2cm 1.8cm; }
+@media print { h2 { page-break-before: always; } h1 + h2 { page-break-before: avoid; } }
+"""
+
+
+def pdf_available() -> bool:
+    return importlib.util.find_spec("weasyprint") is not None
+
+
+@dataclass
+class BookEntry:
+    entry_id: str
+    author: str
+    created_at: datetime
+    text: str
+
+    @property
+    def heading(self) -> str:
+        day = self.created_at
+        return (f"{WEEKDAY_NAMES[day.weekday()]}, {day.day}. {MONTH_NAMES[day.month - 1]} {day.year} · "
+                f"{day.strftime('%H:%M')} · {self.author}")
+
+
+@dataclass
+class MonthTiming:
+    month: str
+    entries: int
+    cached: bool
+    seconds: float
+
+
+@dataclass
+class ExportResult:
+    path: str
+    format: str
+    year: str
+    entries: int = 0
+    months: List[MonthTiming] = field(default_factory=list)
+    pdf_seconds: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def rendered(self) -> int:
+        return sum(1 for month in self.months if not month.cached)
+
+    def summary(self) -> str:
+        text = (f"📖 {self.year}: {self.entries} Einträge in {len(self.months)} Monaten "
+                f"({self.rendered} neu gerendert, {len(self.months) - self.rendered} aus dem Cache), "
+                f"{self.seconds:.2f}s")
+        if self.format == "pdf":
+            text += f" (davon PDF-Satz {self.pdf_seconds:.2f}s)"
+        return text
+
+
+def book_months(memory_store, year: str) -> Iterator[Tuple[str, List[BookEntry]]]:
+    """Die Erinnerungen eines Jahres Monat für Monat; im Speicher liegt immer nur ein Monat."""
+    with memory_store.app.app_context():
+        query = db.session.query(Memory.entry_id, Memory.author, Memory.created_at, Memory.month,
+                                 Memory.original_text, Memory.enhanced_text
+                                 ).filter(Memory.year == year).order_by(Memory.created_at, Memory.id)
+        current, entries = None, []
+        for entry_id, author, created_at, month, original_text, enhanced_text in query.yield_per(500):
+            if month != current and entries:
+                yield current, entries
+                entries = []
+            current = month
+            entries.append(BookEntry(entry_id, author, created_at, enhanced_text or original_text))
+        if entries:
+            yield current, entries
+
+
+def month_hash(entries: List[BookEntry]) -> str:
+    """Inhalts-Hash eines Monats: ändert sich nur, wenn ein Eintrag hinzukommt oder sich ändert."""
+    return sha256_text("\n".join([BOOK_RENDER_VERSION] + [
+        f"{e.entry_id}|{e.created_at.isoformat()}|{e.author}|{sha256_text(e.text)}" for e in entries]))
+
+
+def _paragraphs(text: str) -> List[str]:
+    return [part.strip() for part in text.replace("\r\n", "\n").split("\n\n") if part.strip()]
+
+
+def render_markdown_month(month: str, entries: List[BookEntry]) -> str:
+    parts = [f"## {month_label(month)}\n"]
+    for entry in entries:
+        parts.append(f"### {entry.heading}\n")
+        parts.extend(f"{paragraph}\n" for paragraph in _paragraphs(entry.text))
+    return "\n".join(parts) + "\n"
+
+
+def render_html_month(month: str, entries: List[BookEntry]) -> str:
+    parts = [f'<section id="m{month}">', f"<h2>{html.escape(month_label(month))}</h2>"]
+    for entry in entries:
+        parts.append(f"<article><h3>{html.escape(entry.heading)}</h3>")
+        parts.extend(f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>"
+                     for paragraph in _paragraphs(entry.text))
+        parts.append("</article>")
+    parts.append("</section>\n")
+    return "\n".join(parts)
+
+
+def _document_start(fmt: str, year: str) -> str:
+    title = f"{BOOK_TITLE} – {year}"
+    if fmt == "md":
+        return f"# {title}\n\n"
+    return (f'<!DOCTYPE html>\n<html lang="de">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{html.escape(title)}</title>\n<style>{HTML_STYLE}</style>\n</head>\n<body>\n"
+            f"<h1>{html.escape(title)}</h1>\n")
+
+
+def _document_end(fmt: str) -> str:
+    return "" if fmt == "md" else "</body>\n</html>\n"
+
+
+class BookExporter:
+    """
+    Schreibt die Erinnerungen eines Jahres als Buch, Monat für Monat direkt in die Zieldatei.
+
+    Jeder Monat wird einzeln gerendert und in cache.db abgelegt, Schlüssel ist der Inhalts-Hash
+    seiner Einträge (month_hash). Kommt eine Erinnerung hinzu, wird beim nächsten Export nur ihr
+    Monat neu gerendert, die übrigen kommen aus dem Cache. PDF entsteht aus dem HTML (weasyprint).
+    """
+
+    def __init__(self, memory_store, cache: Optional[TwoTierCache] = None):
+        self.memory_store = memory_store
+        self.cache = cache or TwoTierCache("book", max_memory_entries=BOOK_CACHE_MEMORY_ENTRIES)
+
+    def export(self, year: str, fmt: str, path: str) -> ExportResult:
+        started = time.perf_counter()
+        result = ExportResult(path, fmt, year)
+        # PDF wird aus dem HTML gesetzt; dessen Monate teilen sich den Cache mit dem HTML-Export
+        text_format = "html" if fmt == "pdf" else fmt
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                out.write(_document_start(text_format, year))
+                for month, entries in book_months(self.memory_store, year):
+                    month_started = time.perf_counter()
+                    fragment, cached = self._fragment(text_format, month, entries)
+                    out.write(fragment)
+                    result.entries += len(entries)
+                    result.months.append(MonthTiming(month, len(entries), cached, time.perf_counter() - month_started))
+                out.write(_document_end(text_format))
+            if fmt == "pdf":
+                pdf_started = time.perf_counter()
+                self._write_pdf(tmp_path, path)
+                result.pdf_seconds = time.perf_counter() - pdf_started
+            else:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        result.seconds = time.perf_counter() - started
+        logger.info(result.summary())
+        return result
+
+    async def aexport(self, year: str, fmt: str, path: str) -> ExportResult:
+        return await asyncio.to_thread(self.export, year, fmt, path)
+
+    def _fragment(self, fmt: str, month: str, entries: List[BookEntry]) -> Tuple[str, bool]:
+        key = f"{fmt}:{month}:{month_hash(entries)}"
+        fragment = self.cache.get(key)
+        if fragment is not None:
+            return fragment, True
+        fragment = render_markdown_month(month, entries) if fmt == "md" else render_html_month(month, entries)
+        self.cache.set(key, fragment)
+        return fragment, False
+
+    @staticmethod
+    def _write_pdf(html_path: str, path: str):
+        from weasyprint import HTML
+
+        # Erst vollständig schreiben, dann umbenennen: kein halbes PDF bei einem Abbruch
+        tmp_pdf = f"{path}.{os.getpid()}.pdf.tmp"
+        try:
+            HTML(filename=html_path, encoding="utf-8").write_pdf(tmp_pdf)
+            os.replace(tmp_pdf, path)
+        finally:
+            if os.path.exists(tmp_pdf):
+                os.remove(tmp_pdf)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Erinnerungen eines Jahres als Buch exportieren (Markdown, HTML, PDF).")
+    parser.add_argument("year", help="Jahr, z.B. 2025")
+    parser.add_argument("--format", choices=BOOK_FORMATS, default="html")
+    parser.add_argument("--output", help="Zieldatei (Standard: exports/erinnerungen-<Jahr>.<Format>)")
+    args = parser.parse_args()
+
+    if args.format == "pdf" and not pdf_available():
+        print("❌ Für PDF wird weasyprint benötigt: pip install weasyprint")
+        sys.exit(1)
+    from memory_store import MemoryStore
+    output = args.output or os.path.join(BOOK_EXPORT_DIR, f"erinnerungen-{args.year}.{args.format}")
+    export = BookExporter(MemoryStore()).export(args.year, args.format, output)
+    for timing in export.months:
+        print(f"  {month_label(timing.month):<15} {timing.entries:>4} Einträge  "
+              f"{'Cache' if timing.cached else 'neu  '}  {timing.seconds * 1000:7.1f} ms")
+    if not export.entries:
+        print(f"📭 Für {args.year} sind keine Erinnerungen gespeichert.")
+    print(f"✅ {output}\n{export.summary()}")
@@ -0,0 +1,168 @@
+# cache.py - Zweistufiger Cache (LRU im Speicher + SQLite auf der Festplatte)
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join(BASE_DIR, 'cache.db'))
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv('CACHE_MEMORY_ENTRIES', '256'))
+CACHE_DISK_ENTRIES = int(os.getenv('CACHE_DISK_ENTRIES', '10000'))
+# Abgelaufene Einträge werden nur alle N Schreibvorgänge entfernt (und die Anzahl dabei neu gezählt)
+CACHE_EVICT_EVERY = int(os.getenv('CACHE_EVICT_EVERY', '100'))
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def sha256_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash einer Datei, blockweise gelesen, ohne sie komplett in den Speicher zu laden."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TwoTierCache:
+    """
+    Inhaltsadressierter Cache für Texte.
+
+    Stufe 1 ist ein LRU im Speicher, Stufe 2 eine SQLite-Tabelle, die Neustarts übersteht.
+    Einträge verfallen nach `ttl_seconds`; werden es auf der Festplatte mehr als
+    `max_disk_entries`, werden die am längsten nicht genutzten entfernt.
+    """
+
+    def __init__(self, namespace: str, path: str = CACHE_DB_PATH, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 max_memory_entries: int = CACHE_MEMORY_ENTRIES, max_disk_entries: int = CACHE_DISK_ENTRIES):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries(namespace, accessed_at)")
+        # Anzahl der Einträge auf der Festplatte, fortgeschrieben statt bei jedem Schreiben gezählt
+        self._disk_count = self._count_disk()
+        self._writes_since_sweep = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._memory_get(key)
+        return value if value is not None else self._disk_get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self._memory_set(key, value)
+        self._disk_set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Wie get, aber die Festplattenstufe läuft im Thread; ein Treffer im Speicher braucht keinen."""
+        value = self._memory_get(key)
+        return value if value is not None else await asyncio.to_thread(self._disk_get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        self._memory_set(key, value)
+        await asyncio.to_thread(self._disk_set, key, value)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[0]
+            return None
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)).fetchone()
+            if row and now - row[1] < self.ttl_seconds:
+                self._conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key))
+                self._remember(key, row[0], row[1])
+                self.counters['disk_hits'] += 1
+                return row[0]
+
+            self.counters['misses'] += 1
+            return None
+
+    def _memory_set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._remember(key, value, time.time())
+
+    def _disk_set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE cache_entries SET value = ?, created_at = ?, accessed_at = ? WHERE namespace = ? AND key = ?",
+                (value, now, now, self.namespace, key)).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (self.namespace, key, value, now, now))
+                self._disk_count += 1
+            self._evict_disk(now)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters, memory_entries=len(self._memory))
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _count_disk(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def _evict_disk(self, now: float):
+        expired = 0
+        self._writes_since_sweep += 1
+        if self._writes_since_sweep >= CACHE_EVICT_EVERY:
+            # Gelegentlich: Abgelaufenes entfernen und neu zählen (andere Prozesse schreiben in dieselbe Datei)
+            self._writes_since_sweep = 0
+            expired = self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.ttl_seconds)).rowcount
+            self._disk_count = self._count_disk()
+        overflow = self._disk_count - self.max_disk_entries
+        if overflow > 0:
+            overflow = self._conn.execute(
+                """DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                       SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at LIMIT ?)""",
+                (self.namespace, self.namespace, overflow)).rowcount
+            self._disk_count -= overflow
+        self.counters['evictions'] += max(expired, 0) + max(overflow, 0)
@@ -15,4 +15,7 @@ fi
 # Google Sheets ID für Referenz
 echo "Google Sheets ID: $GOOGLE_SHEETS_ID" > "$BACKUP_DIR/sheets_info.txt"
 
+# Erinnerungen und Original-Sprachnachrichten: inkrementeller Snapshot, nur neue Chunks werden kopiert
+python archive.py backup --dest backups/store
+
 echo "✅ Backup erstellt in: $BACKUP_DIR"
@@ -82,6 +82,8 @@ Environment=PATH={current_dir}/venv/bin
 ExecStart={current_dir}/venv/bin/python {current_dir}/start_bot.py
 Restart=always
 RestartSec=10
+# Laufende Sprachnachrichten bekommen VOICE_DRAIN_SECONDS, danach setzt das Journal fort
+TimeoutStopSec=45
 
 [Install]
 WantedBy=multi-user.target
@@ -146,6 +148,9 @@ fi
 # Google Sheets ID für Referenz
 echo "Google Sheets ID: $GOOGLE_SHEETS_ID" > "$BACKUP_DIR/sheets_info.txt"
 
+# Erinnerungen und Original-Sprachnachrichten: inkrementeller Snapshot, nur neue Chunks werden kopiert
+python archive.py backup --dest backups/store
+
 echo "✅ Backup erstellt in: $BACKUP_DIR"
 """
     
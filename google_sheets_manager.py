@@ -1,37 +1,69 @@
 # google_sheets_manager.py - Für Render optimierte Version
 
 import os
+import asyncio
 import logging
 import json
 from datetime import datetime
 from typing import List, Dict, Any
-import gspread
-from google.oauth2.service_account import Credentials
+
+from sheet_mirror import SheetMirror
+from sheets_writer import SHEETS_CALL_TIMEOUT, SheetsWriter
 
 logger = logging.getLogger(__name__)
 
+EXPECTED_HEADERS = ["Datum", "Autor", "Original Text", "Aufbereiteter Text", "Monat", "Jahr", "Eintrag-ID",
+                    "Prompt-Version"]
+
 class GoogleSheetsManager:
-    def __init__(self):
+    def __init__(self, memory_store):
         self.client = None
+        self.refresher = None
         self.spreadsheet = None
         self.worksheet = None
         self.sheets_id = os.getenv('GOOGLE_SHEETS_ID')
+        # Die Tabelle ist ein Replikat des lokalen MemoryStore. Ein Hintergrund-Worker
+        # schreibt noch nicht synchronisierte Erinnerungen gebündelt in die Tabelle.
+        self.memory_store = memory_store
+        # Lokale Lesekopie für /verlauf; nach jedem Batch des Writers sofort abgeglichen
+        self.mirror = SheetMirror()
+        self.writer = SheetsWriter(memory_store, id_column=EXPECTED_HEADERS.index("Eintrag-ID") + 1,
+                                   on_appended=self.mirror.notify)
 
     async def initialize(self) -> bool:
         """Initialisiert die Google Sheets Verbindung über eine einzige, robuste Methode."""
         if not self.sheets_id:
             logger.error("FEHLER: GOOGLE_SHEETS_ID ist nicht in den Umgebungsvariablen gesetzt!")
             return False
-            
+
+        # gspread ist synchron (Import, Token-Abruf, Header-Prüfung): alles in einem Thread,
+        # damit die Event-Loop währenddessen schon Updates annehmen kann
+        if not await asyncio.to_thread(self._connect):
+            return False
+        self.writer.start(self.worksheet)
+        self.mirror.start(self.worksheet)
+        logger.info("✅ Google Sheets erfolgreich initialisiert und verbunden.")
+        return True
+
+    async def open_worksheet(self) -> bool:
+        """Verbindet nur das Arbeitsblatt, ohne den Replikations-Worker (für Kommandozeilen-Werkzeuge)."""
+        if not self.sheets_id:
+            logger.error("FEHLER: GOOGLE_SHEETS_ID ist nicht in den Umgebungsvariablen gesetzt!")
+            return False
+        return await asyncio.to_thread(self._connect)
+
+    def _connect(self) -> bool:
+        # Erst hier importieren: gspread/google-auth verlängern sonst jeden Kaltstart
+        import gspread
+
         try:
-            self.client = await self._authenticate()
+            self.client = self._authenticate()
             if not self.client:
                 logger.error("FEHLER: Google Sheets Authentifizierung fehlgeschlagen. Überprüfe die Credentials in Render.")
                 return False
 
             self.spreadsheet = self.client.open_by_key(self.sheets_id)
-            await self._setup_worksheet()
-            logger.info("✅ Google Sheets erfolgreich initialisiert und verbunden.")
+            self._setup_worksheet()
             return True
         except gspread.exceptions.SpreadsheetNotFound:
             logger.error(f"FEHLER: Spreadsheet mit der ID '{self.sheets_id}' nicht gefunden. Überprüfe die ID und die Freigabe für den Service Account.")
@@ -40,8 +72,10 @@ class GoogleSheetsManager:
             logger.error(f"FEHLER: Unerwarteter Fehler bei der Google Sheets Initialisierung: {e}", exc_info=True)
             return False
 
-    async def _authenticate(self):
+    def _authenticate(self):
         """Authentifiziert sich bei der Google Sheets API über eine Secret File."""
+        import gspread
+
         # Render stellt Secret Files unter /etc/secrets/<filename> bereit
         creds_path = '/etc/secrets/credentials.json'
         
@@ -51,47 +85,45 @@ class GoogleSheetsManager:
 
         logger.info(f"Versuche Authentifizierung über Secret File '{creds_path}'.")
         try:
+            from google.oauth2.service_account import Credentials
+            from transport import CredentialRefresher, sheets_session
+
             scopes = ['https://www.googleapis.com/auth/spreadsheets']
-            # gspread kann direkt mit dem Dateipfad arbeiten
-            return gspread.service_account(filename=creds_path, scopes=scopes )
+            credentials = Credentials.from_service_account_file(creds_path, scopes=scopes)
+            # Token jetzt holen und danach im Hintergrund vor Ablauf erneuern, nie inline bei einer Anfrage
+            self.refresher = CredentialRefresher(credentials)
+            self.refresher.refresh()
+            self.refresher.start()
+            client = gspread.Client(auth=credentials, session=sheets_session(credentials))
+            # HTTP-Zeitlimit, damit auch ein Aufruf, auf den nicht mehr gewartet wird, sicher endet
+            client.set_timeout(SHEETS_CALL_TIMEOUT)
+            return client
         except Exception as e:
             logger.error(f"FEHLER bei der Google-Authentifizierung mit der Secret File: {e}", exc_info=True)
             return None
 
-    async def _setup_worksheet(self):
-        """Richtet das Arbeitsblatt ein und stellt sicher, dass die Header existieren."""
-        try:
-            self.worksheet = self.spreadsheet.sheet1
-        except gspread.exceptions.WorksheetNotFound:
-            logger.info("Standard-Arbeitsblatt 'Sheet1' nicht gefunden. Erstelle neues Blatt 'Erinnerungen'.")
-            self.worksheet = self.spreadsheet.add_worksheet(title="Erinnerungen", rows="1000", cols="5")
-        
-        headers = self.worksheet.row_values(1)
-        expected_headers = ["Datum", "Autor", "Original Text", "Aufbereiteter Text", "Monat", "Jahr"]
-        if headers != expected_headers:
-            logger.info("Header-Zeile fehlt oder ist inkorrekt. Erstelle sie neu.")
-            # Leere die erste Zeile, bevor neue Header eingefügt werden, um Duplikate zu vermeiden
-            self.worksheet.delete_rows(1)
-            self.worksheet.insert_row(expected_headers, 1)
-
-    async def save_memory(self, original_text: str, enhanced_text: str, author: str) -> bool:
-        """Speichert eine Erinnerung inklusive des Autors in Google Sheets."""
-        if not self.worksheet:
-            logger.error("FEHLER: Speichern fehlgeschlagen, da kein aktives Worksheet vorhanden ist.")
-            return False
-            
-        try:
-            now = datetime.now()
-            timestamp = now.strftime("%d.%m.%Y %H:%M:%S")
-            month = now.strftime("%Y-%m")
-            year = str(now.year)
-            
-            # Die neue Zeile enthält jetzt auch den Autorennamen
-            row_data = [timestamp, author, original_text, enhanced_text, month, year]
-            
-            self.worksheet.append_row(row_data)
-            logger.info(f"✅ Erinnerung von '{author}' erfolgreich in Google Sheets gespeichert.")
-            return True
-        except Exception as e:
-            logger.error(f"FEHLER beim Speichern der Zeile in Google Sheets: {e}", exc_info=True)
-            return False
+    def _setup_worksheet(self):
+        """
+        Richtet die Jahresblätter ein (sheet_partitions.py). `self.worksheet` verhält sich für den
+        SheetsWriter und die Werkzeuge wie ein einzelnes Arbeitsblatt.
+        """
+        from sheet_partitions import PartitionedSheets
+
+        partitions = PartitionedSheets(self.spreadsheet, EXPECTED_HEADERS)
+        partitions.open()
+        # Einmalig: das bisherige Einzelblatt auf die Jahresblätter verteilen
+        partitions.migrate_if_needed()
+        # Das Blatt des laufenden Jahres vorab anlegen, damit der erste Eintrag nicht darauf wartet
+        partitions.partition(str(datetime.now().year))
+        self.worksheet = partitions
+
+    def schedule_sync(self):
+        """Stößt die Replikation neu gespeicherter Erinnerungen nach Google Sheets an."""
+        self.writer.notify()
+
+    async def shutdown(self):
+        """Repliziert ausstehende Erinnerungen so weit wie möglich, bevor der Bot beendet wird."""
+        await self.writer.stop()
+        await self.mirror.stop()
+        if self.refresher:
+            self.refresher.stop()
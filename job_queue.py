@@ -0,0 +1,157 @@
+# job_queue.py - Dauerhafte Warteschlange für Sprachnachrichten zwischen Bot (Annahme) und Worker-Prozessen
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(BASE_DIR, 'jobs.db'))
+# So lange ist ein abgeholter Job für andere Worker unsichtbar; der Worker verlängert die Frist, solange er lebt
+JOB_VISIBILITY_SECONDS = float(os.getenv('JOB_VISIBILITY_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+
+
+@dataclass
+class VoiceJob:
+    id: int
+    chat_id: int
+    status_message_id: int
+    file_id: str
+    file_unique_id: str
+    author: str
+    attempts: int
+
+
+class VoiceJobQueue:
+    """
+    Warteschlange in SQLite (WAL), die sich mehrere Prozesse teilen.
+
+    `claim()` vergibt einen Job mit Sichtbarkeitsfrist: Stirbt der Worker, läuft die Frist ab
+    und ein anderer Worker holt den Job erneut ab. Pro Chat wird immer nur der älteste offene
+    Job vergeben, damit die Erinnerungen eines Chats in Eingangsreihenfolge gespeichert werden.
+    Erledigte Jobs werden gelöscht, endgültig gescheiterte bleiben mit Status 'failed' stehen.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS voice_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                status_message_id INTEGER NOT NULL,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT NOT NULL,
+                author TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                visible_at REAL NOT NULL,
+                worker TEXT,
+                enqueued_at REAL NOT NULL,
+                last_error TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS voice_jobs_chat ON voice_jobs (chat_id, status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS voice_jobs_visible ON voice_jobs (status, visible_at)")
+
+    def enqueue(self, chat_id: int, status_message_id: int, file_id: str, file_unique_id: str, author: str) -> int:
+        now = time.time()
+        with self._lock:
+            job_id = self._conn.execute(
+                "INSERT INTO voice_jobs (chat_id, status_message_id, file_id, file_unique_id, author, "
+                "visible_at, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, status_message_id, file_id, file_unique_id, author, now, now)).lastrowid
+        metrics.counter("bot_jobs_total", "Jobs der Warteschlange nach Ereignis").inc(labels={"event": "enqueued"})
+        return job_id
+
+    def claim(self, worker: str, visibility: float = JOB_VISIBILITY_SECONDS) -> Optional[VoiceJob]:
+        """Holt den ältesten sichtbaren Job ab (oder None). Jede Abholung zählt als Versuch."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: Schreibsperre sofort, damit zwei Prozesse nicht denselben Job abholen
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT id, chat_id, status_message_id, file_id, file_unique_id, author, attempts
+                       FROM voice_jobs j
+                       WHERE status IN ('queued', 'running') AND visible_at <= ?
+                         AND NOT EXISTS (SELECT 1 FROM voice_jobs k
+                                         WHERE k.chat_id = j.chat_id AND k.id < j.id
+                                           AND k.status IN ('queued', 'running'))
+                       ORDER BY id LIMIT 1""", (now,)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE voice_jobs SET status = 'running', attempts = attempts + 1, visible_at = ?, worker = ? "
+                    "WHERE id = ?", (now + visibility, worker, row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = VoiceJob(*row)
+        job.attempts += 1
+        if job.attempts > 1:
+            logger.warning(f"Job {job.id} wird erneut verarbeitet (Versuch {job.attempts}).")
+        return job
+
+    def extend(self, job_id: int, worker: str, visibility: float = JOB_VISIBILITY_SECONDS) -> bool:
+        """Verlängert die Sichtbarkeitsfrist. False, wenn der Job inzwischen einem anderen Worker gehört."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE voice_jobs SET visible_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + visibility, job_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM voice_jobs WHERE id = ? AND worker = ?", (job_id, worker))
+        metrics.counter("bot_jobs_total", "Jobs der Warteschlange nach Ereignis").inc(labels={"event": "completed"})
+
+    def retry(self, job_id: int, worker: str, delay: float, error: str = "", count_attempt: bool = True):
+        """Gibt den Job nach `delay` Sekunden wieder frei (z.B. bei offenem Circuit Breaker ohne Versuch zu zählen)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE voice_jobs SET status = 'queued', worker = NULL, visible_at = ?, last_error = ?, "
+                "attempts = attempts - ? WHERE id = ? AND worker = ?",
+                (time.time() + delay, error[:500], 0 if count_attempt else 1, job_id, worker))
+        metrics.counter("bot_jobs_total", "Jobs der Warteschlange nach Ereignis").inc(labels={"event": "retried"})
+
+    def fail(self, job_id: int, worker: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE voice_jobs SET status = 'failed', worker = NULL, last_error = ? WHERE id = ? AND worker = ?",
+                (error[:500], job_id, worker))
+        metrics.counter("bot_jobs_total", "Jobs der Warteschlange nach Ereignis").inc(labels={"event": "failed"})
+
+    def counts(self) -> Dict[str, int]:
+        """Anzahl Jobs je Status; laufende Jobs mit abgelaufener Frist zählen als 'expired'."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN status = 'running' AND visible_at < ? THEN 'expired' ELSE status END, COUNT(*) "
+                "FROM voice_jobs GROUP BY 1", (time.time(),)).fetchall()
+        return {status: count for status, count in rows}
+
+    def position(self, job_id: int) -> int:
+        """Anzahl der offenen Jobs vor diesem Job (0 = wird als Nächstes vergeben)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM voice_jobs WHERE id < ? AND status IN ('queued', 'running')",
+                (job_id,)).fetchone()[0]
+
+    def collect_metrics(self):
+        gauge = metrics.gauge("bot_jobs", "Jobs in der Warteschlange nach Status")
+        counts = self.counts()
+        for status in ("queued", "running", "expired", "failed"):
+            gauge.set(counts.get(status, 0), {"status": status})
@@ -1,10 +1,10 @@
 # main.py - Finale, stabile und synchrone Version
 
+import startup  # zuerst: misst die Startzeit ab Prozessbeginn
+
 import os
 import logging
 import threading
-from flask import Flask
-from telegram_bot import TochterErinnerungenBot
 
 # Logging konfigurieren
 logging.basicConfig(
@@ -13,33 +13,69 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bot, Flask und app.db werden erst unter __main__ importiert bzw. angelegt: Worker-Prozesse (spawn)
+# importieren dieses Modul erneut und sollen dabei weder den Bot laden noch eine zweite Engine öffnen.
+
 # --- Webserver für Render Health-Check ---
-app = Flask(__name__)
+def create_web_app():
+    """Flask-App mit Health-Check, /metrics und der Benutzer-API (routes.py), an app.db gebunden."""
+    from flask import Response
+    from metrics import metrics
+    from memory_store import create_db_app
+    from routes import user_bp
+
+    app = create_db_app()
+    app.register_blueprint(user_bp)
+
+    @app.route('/')
+    def index():
+        return "Bot is running healthily!"
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        # Latenzen, Nutzdatengrößen, Fehler und laufende Vorgänge je Verarbeitungsstufe
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/')
-def index():
-    return "Bot is running healthily!"
+    return app
 
-def run_flask():
+def run_flask(app):
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
 # --- Ende des Webserver-Teils ---
 
 if __name__ == '__main__':
+    from telegram_bot import TochterErinnerungenBot, BOT_MODE, VOICE_PROCESSING
+
+    startup.mark("imports")
+    worker_pool = None
     try:
-        # Starte den Flask-Webserver in einem Hintergrund-Thread
-        flask_thread = threading.Thread(target=run_flask, daemon=True)
-        flask_thread.start()
-        logger.info("Flask-Server für Render Health-Check gestartet.")
+        # Im Webhook-Modus bedient der uvicorn-Server Health-Check und Metriken selbst und reicht alle
+        # übrigen Pfade (Benutzer-API) an die Flask-App weiter. Nur im Polling-Modus läuft der
+        # Flask-Webserver in einem Hintergrund-Thread.
+        web_app = create_web_app()
+        if BOT_MODE != 'webhook':
+            flask_thread = threading.Thread(target=run_flask, args=(web_app,), daemon=True)
+            flask_thread.start()
+            logger.info("Flask-Server für Render Health-Check gestartet.")
+
+        # Warteschlangen-Modus: Worker-Prozesse verarbeiten die Sprachnachrichten (0 = separat mit worker.py)
+        if VOICE_PROCESSING == 'queue':
+            from worker import WorkerPool, VOICE_WORKERS
+            if VOICE_WORKERS > 0:
+                worker_pool = WorkerPool(VOICE_WORKERS)
+                worker_pool.start()
 
         # 1. Bot-Instanz erstellen (dies initialisiert auch Gemini synchron)
         bot = TochterErinnerungenBot()
-        
+        startup.mark("bot_created")
+
         # 2. Den Bot starten. Die run()-Methode ist jetzt blockierend und
         #    kümmert sich intern um ALLE asynchronen Aufgaben, inkl. Initialisierung.
         logger.info("Übergebe die Kontrolle an den Bot...")
-        bot.run()
+        bot.run(wsgi_app=web_app)
 
     except Exception as e:
         logger.critical(f"Bot konnte nicht gestartet werden: {e}", exc_info=True)
-
+    finally:
+        if worker_pool:
+            worker_pool.stop()
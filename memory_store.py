@@ -0,0 +1,226 @@
+# memory_store.py - Lokaler Speicher (SQLite) als führendes System für Erinnerungen
+
+import os
+import json
+import sqlite3
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import event, func, inspect, text
+
+from metrics import metrics
+from models import db, Memory, User
+from sheets_writer import new_entry_id
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MEMORY_DB_URI = os.getenv('MEMORY_DB_URI', f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}")
+LEGACY_QUEUE_PATH = os.path.join(BASE_DIR, 'sheets_queue.db')
+
+
+def create_db_app(database_uri: str = MEMORY_DB_URI) -> Flask:
+    """Erstellt eine minimale Flask-App, an die die SQLAlchemy-Modelle gebunden werden."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        if database_uri.startswith('sqlite'):
+            event.listen(db.engine, 'connect', _sqlite_pragmas)
+        db.create_all()
+        _add_missing_columns()
+    return app
+
+
+def _add_missing_columns():
+    """create_all legt nur fehlende Tabellen an; neue Spalten (und ihre Indizes) bestehender Tabellen werden hier ergänzt."""
+    for model in (Memory, User):
+        table = model.__table__
+        existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+        with db.engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    logger.info(f"Spalte '{column.name}' zur Tabelle '{table.name}' hinzugefügt.")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: Leser blockieren den Schreiber nicht, Commits kosten nur ein fsync des Logs
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class MemoryStore:
+    """
+    Speichert Erinnerungen zuerst lokal in der Tabelle `memories` (app.db).
+
+    Gleichzeitig dient die Tabelle als Ausgang für die Replikation nach Google Sheets:
+    Die Methoden pending/claim_batch/in_doubt/ack/release bilden die Schnittstelle,
+    über die der SheetsWriter unsynchronisierte Zeilen abgleicht.
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.app = app or create_db_app()
+        self._import_legacy_queue()
+
+    # --- Schreiben / Lesen ---
+
+    async def save_memory(self, original_text: str, enhanced_text: str, author: str,
+                          telegram_file_id: Optional[str] = None,
+                          prompt_version: Optional[str] = None, entry_id: Optional[str] = None) -> Optional[Memory]:
+        """
+        Speichert eine Erinnerung lokal. Gibt die gespeicherte Memory zurück oder None bei Fehlern.
+        Mit `entry_id` ist das Speichern idempotent: Gibt es den Eintrag schon, wird er zurückgegeben.
+        """
+        try:
+            memory = await asyncio.to_thread(self._insert, original_text, enhanced_text, author, telegram_file_id,
+                                             prompt_version, entry_id)
+            logger.info(f"✅ Erinnerung von '{author}' lokal gespeichert ({memory.entry_id}).")
+            return memory
+        except Exception as e:
+            logger.error(f"FEHLER beim lokalen Speichern der Erinnerung: {e}", exc_info=True)
+            metrics.record_error("save")
+            return None
+
+    def _insert(self, original_text, enhanced_text, author, telegram_file_id, prompt_version=None,
+                entry_id=None) -> Memory:
+        created_at = datetime.now()
+        with self.app.app_context():
+            if entry_id:
+                existing = Memory.query.filter_by(entry_id=entry_id).first()
+                if existing:
+                    db.session.expunge(existing)
+                    return existing
+            memory = Memory(
+                entry_id=entry_id or new_entry_id(),
+                author=author,
+                created_at=created_at,
+                month=created_at.strftime("%Y-%m"),
+                year=str(created_at.year),
+                original_text=original_text,
+                enhanced_text=enhanced_text,
+                telegram_file_id=telegram_file_id,
+                prompt_version=prompt_version,
+            )
+            db.session.add(memory)
+            db.session.commit()
+            db.session.refresh(memory)
+            db.session.expunge(memory)
+            return memory
+
+    async def list_period(self, month: Optional[str] = None, year: Optional[str] = None) -> List[Memory]:
+        """Alle Erinnerungen eines Monats (YYYY-MM) oder Jahres (YYYY), chronologisch sortiert."""
+        return await asyncio.to_thread(self._list_period, month, year)
+
+    def _list_period(self, month, year) -> List[Memory]:
+        with self.app.app_context():
+            query = Memory.query
+            if month:
+                query = query.filter(Memory.month == month)
+            if year:
+                query = query.filter(Memory.year == year)
+            memories = query.order_by(Memory.created_at, Memory.id).all()
+            db.session.expunge_all()
+            return memories
+
+    def update_enhancements(self, updates: List[Tuple[str, str, str]]) -> List[Memory]:
+        """
+        Übernimmt neu aufbereitete Texte (entry_id, Text, Prompt-Version), z.B. aus reenhance.py.
+        Die Tabelle wurde dabei bereits direkt aktualisiert, der Sync-Status bleibt daher unverändert.
+        Gibt die geänderten Erinnerungen zurück (losgelöst von der Session).
+        """
+        by_id = {entry_id: (enhanced_text, version) for entry_id, enhanced_text, version in updates}
+        with self.app.app_context():
+            memories = Memory.query.filter(Memory.entry_id.in_(list(by_id))).all() if by_id else []
+            for memory in memories:
+                memory.enhanced_text, memory.prompt_version = by_id[memory.entry_id]
+            db.session.commit()
+            for memory in memories:
+                db.session.refresh(memory)
+            db.session.expunge_all()
+            return memories
+
+    # --- Schnittstelle für den SheetsWriter (Replikation) ---
+
+    def size(self) -> int:
+        with self.app.app_context():
+            return db.session.query(func.count(Memory.id)).filter(Memory.sheets_synced_at.is_(None)).scalar()
+
+    def pending(self) -> int:
+        with self.app.app_context():
+            return db.session.query(func.count(Memory.id)).filter(
+                Memory.sheets_synced_at.is_(None), Memory.sheets_batch_id.is_(None)).scalar()
+
+    def claim_batch(self, limit: int) -> Tuple[Optional[str], List[Tuple[str, List[str]]]]:
+        batch_id = new_entry_id()
+        with self.app.app_context():
+            memories = Memory.query.filter(
+                Memory.sheets_synced_at.is_(None), Memory.sheets_batch_id.is_(None)
+            ).order_by(Memory.id).limit(limit).all()
+            if not memories:
+                return None, []
+            for memory in memories:
+                memory.sheets_batch_id = batch_id
+            db.session.commit()
+            return batch_id, [(m.entry_id, m.to_sheet_row()) for m in memories]
+
+    def in_doubt(self) -> List[Tuple[str, str, List[str]]]:
+        with self.app.app_context():
+            memories = Memory.query.filter(
+                Memory.sheets_synced_at.is_(None), Memory.sheets_batch_id.isnot(None)
+            ).order_by(Memory.id).all()
+            return [(m.sheets_batch_id, m.entry_id, m.to_sheet_row()) for m in memories]
+
+    def ack(self, entry_ids: List[str]) -> None:
+        if not entry_ids:
+            return
+        with self.app.app_context():
+            Memory.query.filter(Memory.entry_id.in_(entry_ids)).update(
+                {Memory.sheets_synced_at: datetime.now(), Memory.sheets_batch_id: None}, synchronize_session=False)
+            db.session.commit()
+
+    def release(self, entry_ids: List[str]) -> None:
+        if not entry_ids:
+            return
+        with self.app.app_context():
+            Memory.query.filter(Memory.entry_id.in_(entry_ids)).update(
+                {Memory.sheets_batch_id: None}, synchronize_session=False)
+            db.session.commit()
+
+    # --- Migration ---
+
+    def _import_legacy_queue(self):
+        """Übernimmt Zeilen aus der früheren Schreib-Warteschlange (sheets_queue.db) einmalig."""
+        if not os.path.exists(LEGACY_QUEUE_PATH):
+            return
+        conn = sqlite3.connect(LEGACY_QUEUE_PATH)
+        try:
+            rows = conn.execute("SELECT row_json, batch_id FROM pending_rows ORDER BY id").fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+        with self.app.app_context():
+            for row_json, batch_id in rows:
+                timestamp, author, original_text, enhanced_text, _, _, entry_id = json.loads(row_json)
+                if Memory.query.filter_by(entry_id=entry_id).first():
+                    continue
+                created_at = datetime.strptime(timestamp, "%d.%m.%Y %H:%M:%S")
+                db.session.add(Memory(
+                    entry_id=entry_id, author=author, created_at=created_at,
+                    month=created_at.strftime("%Y-%m"), year=str(created_at.year),
+                    original_text=original_text, enhanced_text=enhanced_text,
+                    sheets_batch_id=batch_id,
+                ))
+            db.session.commit()
+        os.replace(LEGACY_QUEUE_PATH, LEGACY_QUEUE_PATH + '.migrated')
+        logger.info(f"{len(rows)} Zeile(n) aus der alten Sheets-Warteschlange in app.db übernommen.")
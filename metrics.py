@@ -0,0 +1,175 @@
+# metrics.py - Leichtgewichtige Messwerte (Latenzen, Größen, Fehler) im Prometheus-Format
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sekunden; deckt Status-Edits (ms) bis zu langen Transkriptionen (Minuten) ab
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Bytes bzw. Zeichen
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 25_000_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # [Zähler je Bucket..., Summe, Anzahl]
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {series[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, labels: Optional[Dict[str, str]] = None):
+        self._values[_label_key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, labels: Optional[Dict[str, str]] = None):
+        self.inc(-amount, labels)
+
+
+class MetricsRegistry:
+    """
+    Sammelt alle Messwerte des Prozesses. Wird aus der Bot-Event-Loop und aus dem
+    Webserver-Thread verwendet, daher sind alle Zugriffe durch ein Lock geschützt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.stage_seconds = self.histogram("bot_stage_duration_seconds", "Dauer je Verarbeitungsstufe")
+        self.stage_errors = self.counter("bot_stage_errors_total", "Fehler je Verarbeitungsstufe")
+        self.stage_in_flight = self.gauge("bot_stage_in_flight", "Laufende Vorgänge je Verarbeitungsstufe")
+        self.payload_bytes = self.histogram("bot_payload_bytes", "Größe der Nutzdaten je Stufe", SIZE_BUCKETS)
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge(name, help_text))
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Registriert eine Funktion, die vor jedem Export Gauges aktualisiert (z.B. Cache-Zähler)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def observe_payload(self, stage: str, size: int):
+        with self._lock:
+            self.payload_bytes.observe(size, {"stage": stage})
+
+    def record_error(self, stage: str):
+        """Zählt einen Fehler, der innerhalb einer Stufe abgefangen wurde."""
+        with self._lock:
+            self.stage_errors.inc(1, {"stage": stage})
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Misst die Dauer eines Abschnitts und zählt laufende Vorgänge und Fehler.
+        Funktioniert auch um `await`-Aufrufe herum: `with metrics.stage("transcribe"): await ...`
+        """
+        labels = {"stage": name}
+        with self._lock:
+            self.stage_in_flight.inc(1, labels)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.stage_errors.inc(1, labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stage_in_flight.dec(1, labels)
+                self.stage_seconds.observe(elapsed, labels)
+
+    def histogram_snapshot(self, name: str) -> Dict[LabelKey, list]:
+        """Kopie der Rohdaten eines Histogramms ([Zähler je Bucket..., Summe, Anzahl] je Label-Satz)."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if not isinstance(metric, Histogram):
+                return {}
+            return {key: list(series) for key, series in metric._series.items()}
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrik-Collector fehlgeschlagen: {e}")
+        with self._lock:
+            lines = []
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Prozessweite Instanz, analog zum Modul-Logger
+metrics = MetricsRegistry()
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -6,6 +8,8 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    # Für ETags der Benutzer-API: jede Änderung erhöht max(updated_at)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -14,5 +18,60 @@ class User(db.Model):
         return {
             'id': self.id,
             'username': self.username,
-            'email': self.email
+            'email': self.email,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class Memory(db.Model):
+    """Eine Erinnerung. Die lokale Tabelle ist das führende System, Google Sheets nur ein Replikat."""
+    __tablename__ = 'memories'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.String(32), unique=True, nullable=False)
+    author = db.Column(db.String(120), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    month = db.Column(db.String(7), nullable=False, index=True)
+    year = db.Column(db.String(4), nullable=False, index=True)
+    original_text = db.Column(db.Text, nullable=False)
+    enhanced_text = db.Column(db.Text, nullable=False)
+    telegram_file_id = db.Column(db.String(255))
+    # Prompt/Modell der Aufbereitung (text_enhancer.prompt_version), leer wenn sie fehlgeschlagen ist
+    prompt_version = db.Column(db.String(64))
+    # Replikation nach Google Sheets
+    sheets_batch_id = db.Column(db.String(32), index=True)
+    sheets_synced_at = db.Column(db.DateTime, index=True)
+
+    __table_args__ = (
+        db.Index('ix_memories_author_month', 'author', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<Memory {self.entry_id} von {self.author}>'
+
+    def to_sheet_row(self):
+        return [
+            self.created_at.strftime("%d.%m.%Y %H:%M:%S"),
+            self.author,
+            self.original_text,
+            self.enhanced_text,
+            self.month,
+            self.year,
+            self.entry_id,
+            self.prompt_version or "",
+        ]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entry_id': self.entry_id,
+            'author': self.author,
+            'created_at': self.created_at.isoformat(),
+            'month': self.month,
+            'year': self.year,
+            'original_text': self.original_text,
+            'enhanced_text': self.enhanced_text,
+            'telegram_file_id': self.telegram_file_id,
+            'prompt_version': self.prompt_version,
+            'sheets_synced': self.sheets_synced_at is not None,
         }
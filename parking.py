@@ -0,0 +1,121 @@
+# parking.py - Geparkte Sprachnachrichten, solange der Transkriptionsdienst nicht erreichbar ist
+
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from metrics import metrics
+from resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+PARKED_DB_PATH = os.getenv('PARKED_DB_PATH', os.path.join(BASE_DIR, 'parked.db'))
+PARKED_CHECK_SECONDS = float(os.getenv('PARKED_CHECK_SECONDS', '15'))
+PARKED_MAX_ATTEMPTS = int(os.getenv('PARKED_MAX_ATTEMPTS', '5'))
+
+
+@dataclass
+class ParkedNote:
+    id: int
+    chat_id: int
+    status_message_id: int
+    file_id: str
+    file_unique_id: str
+    author: str
+    attempts: int
+
+
+class ParkedNotes:
+    """
+    Dauerhafte Liste (SQLite) von Sprachnachrichten, die wegen eines offenen Circuit
+    Breakers nicht transkribiert werden konnten. Ein Hintergrund-Task verarbeitet sie
+    in Eingangsreihenfolge, sobald der Dienst wieder Aufrufe zulässt.
+    """
+
+    def __init__(self, path: str = PARKED_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS parked_notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                status_message_id INTEGER NOT NULL,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT NOT NULL,
+                author TEXT NOT NULL,
+                parked_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._task: Optional[asyncio.Task] = None
+        metrics.add_collector(lambda: metrics.gauge("bot_parked_notes", "Geparkte Sprachnachrichten").set(self.count()))
+
+    def park(self, chat_id: int, status_message_id: int, file_id: str, file_unique_id: str, author: str):
+        """Blockiert (SQLite); aus async-Code über asyncio.to_thread aufrufen."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO parked_notes (chat_id, status_message_id, file_id, file_unique_id, author, parked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, status_message_id, file_id, file_unique_id, author, time.time()))
+            waiting = self._conn.execute("SELECT COUNT(*) FROM parked_notes").fetchone()[0]
+        logger.info(f"Sprachnachricht von '{author}' geparkt ({waiting} wartend).")
+
+    def has_chat(self, chat_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM parked_notes WHERE chat_id = ? LIMIT 1",
+                                      (chat_id,)).fetchone() is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM parked_notes").fetchone()[0]
+
+    def oldest(self, limit: int) -> List[ParkedNote]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, status_message_id, file_id, file_unique_id, author, attempts "
+                "FROM parked_notes ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [ParkedNote(*row) for row in rows]
+
+    def remove(self, note_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM parked_notes WHERE id = ?", (note_id,))
+
+    def increment_attempts(self, note_id: int):
+        with self._lock:
+            self._conn.execute("UPDATE parked_notes SET attempts = attempts + 1 WHERE id = ?", (note_id,))
+
+    def start(self, breaker: CircuitBreaker, process: Callable[[ParkedNote], Awaitable[None]]):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(breaker, process), name="parked-notes")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self, breaker: CircuitBreaker, process):
+        while True:
+            await asyncio.sleep(PARKED_CHECK_SECONDS)
+            if not breaker.is_available():
+                continue
+            for note in await asyncio.to_thread(self.oldest, 10):
+                try:
+                    await process(note)
+                    await asyncio.to_thread(self.remove, note.id)
+                except CircuitOpenError:
+                    # Dienst weiterhin gestört; Reihenfolge beibehalten und später erneut versuchen
+                    break
+                except Exception as e:
+                    logger.error(f"FEHLER bei geparkter Sprachnachricht {note.id}: {e}", exc_info=True)
+                    if note.attempts + 1 >= PARKED_MAX_ATTEMPTS:
+                        logger.error(f"Geparkte Sprachnachricht {note.id} nach {PARKED_MAX_ATTEMPTS} Versuchen verworfen.")
+                        await asyncio.to_thread(self.remove, note.id)
+                    else:
+                        await asyncio.to_thread(self.increment_attempts, note.id)
@@ -0,0 +1,155 @@
+# pipeline_journal.py - Journal der Verarbeitungsstufen je Sprachnachricht, damit ein Neustart keine Arbeit kostet
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+from metrics import metrics
+from sheets_writer import new_entry_id
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', os.path.join(BASE_DIR, 'journal.db'))
+JOURNAL_AUDIO_DIR = os.getenv('JOURNAL_AUDIO_DIR', os.path.join(BASE_DIR, 'journal_audio'))
+# Nach so vielen Fortsetzungen (Neustarts mitten in der Verarbeitung) wird eine Nachricht aufgegeben
+JOURNAL_MAX_RESUMES = int(os.getenv('JOURNAL_MAX_RESUMES', '3'))
+# Beim Beenden bekommen laufende Sprachnachrichten (Bot und Worker) so lange Zeit; danach werden sie
+# abgebrochen und nach dem Neustart aus dem Journal an der letzten abgeschlossenen Stufe fortgesetzt
+VOICE_DRAIN_SECONDS = float(os.getenv('VOICE_DRAIN_SECONDS', '20'))
+
+# Reihenfolge der Stufen; gespeichert wird jeweils die zuletzt abgeschlossene
+STAGES = ("received", "downloaded", "transcribed", "enhanced", "saved")
+
+
+@dataclass
+class JournalEntry:
+    id: int
+    key: str
+    source: str
+    chat_id: int
+    status_message_id: int
+    file_id: str
+    file_unique_id: str
+    author: str
+    stage: str
+    entry_id: str
+    audio_path: Optional[str]
+    transcript: Optional[str]
+    enhanced_text: Optional[str]
+    prompt_version: Optional[str]
+    resumes: int
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+
+class PipelineJournal:
+    """
+    Hält pro Sprachnachricht fest, welche Stufe zuletzt abgeschlossen wurde, samt Ergebnis
+    (heruntergeladene Datei, Transkript, aufbereiteter Text). Nach einem Neustart setzt die
+    Verarbeitung dort fort, statt erneut herunterzuladen und Groq zu bezahlen.
+
+    Die Eintrag-ID der Erinnerung wird schon beim Anlegen vergeben; das Speichern ist damit
+    auch dann genau einmal, wenn der Prozess zwischen Speichern und Journal-Eintrag endet.
+    Bot und Worker-Prozesse teilen sich die Datei (SQLite, WAL); `source` trennt ihre Einträge.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH, audio_dir: str = JOURNAL_AUDIO_DIR):
+        self.audio_dir = audio_dir
+        os.makedirs(audio_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS voice_journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                status_message_id INTEGER NOT NULL,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT NOT NULL,
+                author TEXT NOT NULL,
+                stage TEXT NOT NULL DEFAULT 'received',
+                entry_id TEXT NOT NULL,
+                audio_path TEXT,
+                transcript TEXT,
+                enhanced_text TEXT,
+                prompt_version TEXT,
+                resumes INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS voice_journal_source ON voice_journal (source, id)")
+
+    _FIELDS = ("id, key, source, chat_id, status_message_id, file_id, file_unique_id, author, stage, entry_id, "
+               "audio_path, transcript, enhanced_text, prompt_version, resumes")
+
+    def begin(self, key: str, source: str, chat_id: int, status_message_id: int, file_id: str,
+              file_unique_id: str, author: str) -> JournalEntry:
+        """Legt den Eintrag an; gibt es ihn unter `key` schon (z.B. erneuter Versuch eines Jobs), den bestehenden."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO voice_journal (key, source, chat_id, status_message_id, file_id, file_unique_id, "
+                "author, entry_id, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, source, chat_id, status_message_id, file_id, file_unique_id, author, new_entry_id(), time.time()))
+            return self._get("key = ?", key)
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM voice_journal WHERE key = ?", (key,)).fetchone() is not None
+
+    def advance(self, journal_id: int, stage: str, **fields):
+        """Markiert `stage` als abgeschlossen und speichert ihr Ergebnis (audio_path, transcript, ...)."""
+        columns = ["stage = ?", "updated_at = ?"] + [f"{name} = ?" for name in fields]
+        with self._lock:
+            self._conn.execute(f"UPDATE voice_journal SET {', '.join(columns)} WHERE id = ?",
+                               (stage, time.time(), *fields.values(), journal_id))
+        metrics.counter("bot_journal_stages_total", "Abgeschlossene Stufen im Verarbeitungs-Journal").inc(
+            labels={"stage": stage})
+
+    def mark_resumed(self, journal_id: int) -> int:
+        """Zählt eine Fortsetzung nach einem Neustart und gibt die neue Anzahl zurück."""
+        with self._lock:
+            self._conn.execute("UPDATE voice_journal SET resumes = resumes + 1 WHERE id = ?", (journal_id,))
+            row = self._conn.execute("SELECT resumes FROM voice_journal WHERE id = ?", (journal_id,)).fetchone()
+        return row[0] if row else 0
+
+    def finish(self, journal_id: int):
+        """Entfernt einen abgeschlossenen (oder aufgegebenen) Eintrag samt zwischengespeicherter Audiodatei."""
+        with self._lock:
+            row = self._conn.execute("SELECT audio_path FROM voice_journal WHERE id = ?", (journal_id,)).fetchone()
+            self._conn.execute("DELETE FROM voice_journal WHERE id = ?", (journal_id,))
+        if row and row[0]:
+            try:
+                os.remove(row[0])
+            except FileNotFoundError:
+                pass
+
+    def unfinished(self, source: str) -> List[JournalEntry]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {self._FIELDS} FROM voice_journal WHERE source = ? ORDER BY id",
+                                      (source,)).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def audio_path(self, journal_id: int) -> str:
+        """Ablage für die heruntergeladene Sprachnachricht, die einen Neustart überdauert."""
+        return os.path.join(self.audio_dir, f"{journal_id}.ogg")
+
+    def _get(self, where: str, *params) -> Optional[JournalEntry]:
+        row = self._conn.execute(f"SELECT {self._FIELDS} FROM voice_journal WHERE {where}", params).fetchone()
+        return JournalEntry(*row) if row else None
+
+    def collect_metrics(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT stage, COUNT(*) FROM voice_journal GROUP BY stage").fetchall())
+        gauge = metrics.gauge("bot_journal_entries", "Offene Sprachnachrichten im Journal nach letzter Stufe")
+        for stage in STAGES:
+            gauge.set(counts.get(stage, 0), {"stage": stage})
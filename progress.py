@@ -0,0 +1,164 @@
+# progress.py - Status-Updates zu einer Sprachnachricht, ohne die Verarbeitung aufzuhalten
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+from telegram.error import BadRequest, RetryAfter
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram erlaubt pro Chat etwa eine Nachricht bzw. Bearbeitung pro Sekunde
+STATUS_EDITS_PER_SECOND = float(os.getenv('STATUS_EDITS_PER_SECOND', '1.0'))
+STATUS_EDITS_BURST = int(os.getenv('STATUS_EDITS_BURST', '3'))
+STATUS_FINAL_MAX_ATTEMPTS = int(os.getenv('STATUS_FINAL_MAX_ATTEMPTS', '5'))
+
+
+class TokenBucket:
+    """Einfacher Token-Bucket: `rate` Tokens pro Sekunde, höchstens `capacity` auf Vorrat."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Nach einem RetryAfter von Telegram: Vorrat so leeren, dass `seconds` gewartet wird."""
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class ProgressReporter:
+    """
+    Status-Nachricht einer einzelnen Sprachnachricht.
+
+    `update()` kehrt sofort zurück. Ein Hintergrund-Task sendet jeweils nur den neuesten
+    Stand; Zwischenstände, die inzwischen überholt sind, werden verworfen. `finish()` setzt
+    die Endnachricht, die immer zugestellt wird (mit Wiederholungen und ohne Markdown als Fallback).
+    """
+
+    def __init__(self, hub: "ProgressHub", message, bucket: TokenBucket):
+        self.hub = hub
+        self.message = message
+        self.bucket = bucket
+        self._pending: Optional[tuple] = None
+        self._finished = False
+        self._last_text: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, text: str, **kwargs):
+        if self._finished:
+            return
+        self._pending = (text, kwargs, False)
+        self._kick()
+
+    def finish(self, text: str, **kwargs) -> asyncio.Task:
+        """Setzt die Endnachricht. Der zurückgegebene Task kann bei Bedarf abgewartet werden."""
+        self._finished = True
+        self._pending = (text, kwargs, True)
+        self._kick()
+        return self._task
+
+    def _kick(self):
+        if self._task is None or self._task.done():
+            self._task = self.hub.spawn(self._drain())
+
+    async def _drain(self):
+        while self._pending:
+            await self.bucket.acquire()
+            if not self._pending:
+                return
+            text, kwargs, final = self._pending
+            self._pending = None
+            if text == self._last_text:
+                continue
+            if final:
+                await self._deliver_final(text, kwargs)
+            else:
+                await self._deliver(text, kwargs)
+
+    async def _deliver(self, text: str, kwargs: dict) -> bool:
+        try:
+            with metrics.stage("status_edit"):
+                await self.message.edit_text(text, **kwargs)
+            self._last_text = text
+            return True
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            self.bucket.penalize(retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after))
+            logger.info(f"Telegram-Flood-Limit erreicht, Status-Update wird verschoben ({e.retry_after}s).")
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                self._last_text = text
+                return True
+            logger.warning(f"Status-Update abgelehnt: {e}")
+        except Exception as e:
+            logger.warning(f"Status-Update fehlgeschlagen: {e}")
+        return False
+
+    async def _deliver_final(self, text: str, kwargs: dict):
+        for attempt in range(1, STATUS_FINAL_MAX_ATTEMPTS + 1):
+            if await self._deliver(text, kwargs):
+                return
+            if attempt > 1 and kwargs.get('parse_mode'):
+                # Z.B. Unterstriche im Transkript können Markdown ungültig machen
+                kwargs = {k: v for k, v in kwargs.items() if k != 'parse_mode'}
+            await self.bucket.acquire()
+        logger.error("Endgültige Status-Nachricht konnte nicht zugestellt werden.")
+        metrics.record_error("status_final")
+
+
+class ProgressHub:
+    """Verwaltet die Token-Buckets pro Chat und hält Referenzen auf laufende Hintergrund-Tasks."""
+
+    def __init__(self, rate: float = STATUS_EDITS_PER_SECOND, burst: int = STATUS_EDITS_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def reporter(self, message) -> ProgressReporter:
+        chat_id = message.chat_id
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+        return ProgressReporter(self, message, bucket)
+
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self, timeout: float = 10.0):
+        """Wartet beim Beenden kurz, bis ausstehende Endnachrichten zugestellt sind."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+
+class EditableMessage:
+    """Bereits gesendete Nachricht, die nur über chat_id/message_id bekannt ist (z.B. nach einem Neustart)."""
+
+    def __init__(self, bot, chat_id: int, message_id: int):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id, **kwargs)
@@ -0,0 +1,287 @@
+# reenhance.py - Bestehende Einträge nach einer Änderung an Prompt oder Modell neu aufbereiten
+
+"""
+Verwendung:
+    python reenhance.py [--dry-run] [--concurrency 4] [--requests-per-minute 30] [--batch-size 50] [--limit N] [--year YYYY] [--force]
+
+Liest alle Zeilen jedes Jahresblatts mit einem Aufruf und bereitet jede Zeile neu auf, deren "Prompt-Version"
+nicht der aktuellen (text_enhancer.prompt_version) entspricht. Die Ergebnisse werden gebündelt per
+`batch_update` zurückgeschrieben (Spalten "Aufbereiteter Text" und "Prompt-Version"); der lokale Speicher
+und der Suchindex werden mit aktualisiert.
+
+Fertige, aber noch nicht geschriebene Ergebnisse liegen in einer Checkpoint-Datei. Nach einem Abbruch
+setzt ein erneuter Aufruf dort fort, ohne bereits bezahlte Groq-Aufrufe zu wiederholen.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import sqlite3
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from cache import TwoTierCache, sha256_text
+from google_sheets_manager import GoogleSheetsManager, EXPECTED_HEADERS
+from memory_store import MemoryStore
+from resilience import CircuitOpenError, resilient_call
+from search_index import SearchIndex
+from sheets_writer import SHEETS_CALL_TIMEOUT
+from text_enhancer import TextEnhancer, prompt_version
+
+load_dotenv()
+logger = logging.getLogger("reenhance")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REENHANCE_CHECKPOINT_PATH = os.getenv('REENHANCE_CHECKPOINT_PATH', os.path.join(BASE_DIR, 'reenhance_checkpoint.db'))
+
+ORIGINAL_COLUMN = EXPECTED_HEADERS.index("Original Text")
+ENHANCED_COLUMN = EXPECTED_HEADERS.index("Aufbereiteter Text")
+ID_COLUMN = EXPECTED_HEADERS.index("Eintrag-ID")
+VERSION_COLUMN = EXPECTED_HEADERS.index("Prompt-Version")
+
+
+def column_letter(index: int) -> str:
+    """0-basierter Spaltenindex -> A1-Buchstaben (0 -> A, 26 -> AA)."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+@dataclass
+class Candidate:
+    row: int  # Zeilennummer im Jahresblatt (1-basiert, Zeile 1 = Header)
+    entry_id: str
+    original: str
+    partition: str = ""  # Titel des Jahresblatts
+
+    @property
+    def key(self) -> str:
+        # Ältere Zeilen ohne Eintrag-ID werden über Blatt und Zeilennummer identifiziert
+        return self.entry_id or f"{self.partition}:row-{self.row}"
+
+
+class Checkpoint:
+    """Ergebnisse pro Eintrag und Prompt-Version (SQLite), damit ein Abbruch keine Arbeit kostet."""
+
+    def __init__(self, path: str, version: str):
+        self.version = version
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                enhanced TEXT NOT NULL,
+                written INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (key, version)
+            )""")
+
+    def pending_result(self, candidate: Candidate) -> Optional[str]:
+        """Bereits aufbereiteter, aber noch nicht geschriebener Text (nur wenn das Original unverändert ist)."""
+        row = self._conn.execute(
+            "SELECT enhanced FROM results WHERE key = ? AND version = ? AND source_hash = ? AND written = 0",
+            (candidate.key, self.version, sha256_text(candidate.original))).fetchone()
+        return row[0] if row else None
+
+    def save(self, candidate: Candidate, enhanced: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (key, version, source_hash, enhanced, written) VALUES (?, ?, ?, ?, 0)",
+            (candidate.key, self.version, sha256_text(candidate.original), enhanced))
+
+    def mark_written(self, candidates: List[Candidate]):
+        self._conn.executemany("UPDATE results SET written = 1 WHERE key = ? AND version = ?",
+                               [(c.key, self.version) for c in candidates])
+
+    def purge_written(self):
+        self._conn.execute("DELETE FROM results WHERE written = 1")
+
+
+class RequestPacer:
+    """Verteilt höchstens `per_minute` Aufrufe gleichmäßig (Groq-Limits gelten pro Minute)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def find_candidates(values: List[List[str]], version: str, force: bool, partition: str = "") -> List[Candidate]:
+    candidates = []
+    for row_number, row in enumerate(values[1:], start=2):
+        row = row + [""] * (len(EXPECTED_HEADERS) - len(row))
+        if not row[ORIGINAL_COLUMN].strip():
+            continue
+        if row[VERSION_COLUMN] == version and not force:
+            continue
+        candidates.append(Candidate(row_number, row[ID_COLUMN], row[ORIGINAL_COLUMN], partition))
+    return candidates
+
+
+class ReEnhanceJob:
+    def __init__(self, worksheet, enhancer: TextEnhancer, checkpoint: Checkpoint, memory_store: MemoryStore,
+                 search_index: SearchIndex, pacer: RequestPacer, batch_size: int):
+        self.worksheet = worksheet
+        self.enhancer = enhancer
+        self.checkpoint = checkpoint
+        self.memory_store = memory_store
+        self.search_index = search_index
+        self.pacer = pacer
+        self.batch_size = batch_size
+        self.version = checkpoint.version
+        self.written = 0
+        self.failed = 0
+
+    async def run(self, candidates: List[Candidate]):
+        buffer: List[Tuple[Candidate, str]] = []
+        todo = []
+        for candidate in candidates:
+            resumed = self.checkpoint.pending_result(candidate)
+            if resumed is not None:
+                buffer.append((candidate, resumed))
+            else:
+                todo.append(candidate)
+        if buffer:
+            logger.info(f"{len(buffer)} Ergebnis(se) aus dem Checkpoint übernommen.")
+
+        started = time.monotonic()
+        tasks = [asyncio.create_task(self._enhance(candidate)) for candidate in todo]
+        for done, future in enumerate(asyncio.as_completed(tasks), start=1):
+            result = await future
+            if result:
+                buffer.append(result)
+            if len(buffer) >= self.batch_size:
+                await self._flush(buffer)
+                buffer = []
+            if done % 10 == 0 or done == len(tasks):
+                rate = done / max(time.monotonic() - started, 1e-9)
+                logger.info(f"{done}/{len(tasks)} aufbereitet ({rate * 60:.1f}/min, "
+                            f"noch ca. {(len(tasks) - done) / rate / 60:.1f} min), {self.written} geschrieben.")
+        if buffer:
+            await self._flush(buffer)
+
+    async def _enhance(self, candidate: Candidate) -> Optional[Tuple[Candidate, str]]:
+        while True:
+            await self.pacer.wait()
+            try:
+                enhanced = await self.enhancer.enhance(candidate.original)
+                break
+            except CircuitOpenError as e:
+                # Groq ist überlastet/gestört: warten statt aufgeben, der Job läuft unbeaufsichtigt
+                await asyncio.sleep(max(e.retry_in, 1.0))
+            except Exception as e:
+                logger.error(f"FEHLER bei Zeile {candidate.row} ({candidate.key}): {e}")
+                self.failed += 1
+                return None
+        self.checkpoint.save(candidate, enhanced)
+        return candidate, enhanced
+
+    async def _flush(self, results: List[Tuple[Candidate, str]]):
+        """Schreibt einen Block per batch_update; Zeilen mit Eintrag-ID werden vorher neu lokalisiert."""
+        ids = await resilient_call(lambda: asyncio.to_thread(self.worksheet.col_values, ID_COLUMN + 1),
+                                   backend="sheets", timeout=SHEETS_CALL_TIMEOUT)
+        row_by_id: Dict[str, int] = {entry_id: number for number, entry_id in enumerate(ids, start=1) if entry_id}
+
+        data, written = [], []
+        for candidate, enhanced in results:
+            row = row_by_id.get(candidate.entry_id) if candidate.entry_id else candidate.row
+            if row is None:
+                logger.warning(f"Eintrag {candidate.entry_id} ist nicht mehr in der Tabelle, übersprungen.")
+                written.append(candidate)
+                continue
+            data.append({"range": f"{column_letter(ENHANCED_COLUMN)}{row}", "values": [[enhanced]]})
+            data.append({"range": f"{column_letter(VERSION_COLUMN)}{row}", "values": [[self.version]]})
+            written.append(candidate)
+
+        if data:
+            await resilient_call(
+                lambda: asyncio.to_thread(self.worksheet.batch_update, data, value_input_option="RAW"),
+                backend="sheets", timeout=SHEETS_CALL_TIMEOUT)
+        self.checkpoint.mark_written(written)
+        self.written += len(data) // 2
+
+        # Lokalen Speicher und Suchindex nachziehen (führendes System bleibt konsistent mit der Tabelle)
+        updates = [(c.entry_id, enhanced, self.version) for c, enhanced in results if c.entry_id]
+        memories = await asyncio.to_thread(self.memory_store.update_enhancements, updates)
+        for memory in memories:
+            await self.search_index.aadd(memory.entry_id, memory.author, memory.created_at,
+                                         memory.original_text, memory.enhanced_text)
+
+
+async def main(args) -> int:
+    version = prompt_version()
+    memory_store = MemoryStore()
+    manager = GoogleSheetsManager(memory_store)
+    if not await manager.open_worksheet():
+        return 1
+
+    # Jedes Jahresblatt für sich: Zeilennummern und batch_update gelten pro Blatt
+    work, total_rows, remaining = [], 0, args.limit
+    for year, worksheet in manager.worksheet.partitions():
+        if args.year and year != args.year:
+            continue
+        values = await asyncio.to_thread(worksheet.get_all_values)
+        total_rows += len(values) - 1
+        candidates = find_candidates(values, version, args.force, worksheet.title)
+        if remaining is not None:
+            candidates, remaining = candidates[:remaining], max(remaining - len(candidates), 0)
+        if candidates:
+            work.append((worksheet, candidates))
+    count = sum(len(candidates) for _, candidates in work)
+    print(f"📋 {total_rows} Zeilen, {count} davon werden mit Prompt-Version '{version}' neu aufbereitet.")
+    if args.dry_run or not count:
+        return 0
+
+    groq_api_key = os.getenv('GROQ_API_KEY')
+    if not groq_api_key:
+        print("❌ GROQ_API_KEY nicht gefunden!")
+        return 1
+    from voice_processor import create_groq_client
+    # Wiederholungen (inkl. Retry-After bei 429) übernimmt resilient_call im TextEnhancer
+    enhancer = TextEnhancer(create_groq_client(groq_api_key), asyncio.Semaphore(args.concurrency),
+                            None if args.force else TwoTierCache("enhancements"))
+
+    checkpoint = Checkpoint(REENHANCE_CHECKPOINT_PATH, version)
+    search_index, pacer = SearchIndex(), RequestPacer(args.requests_per_minute)
+    written = failed = 0
+    for worksheet, candidates in work:
+        logger.info(f"Bearbeite '{worksheet.title}' ({len(candidates)} Zeilen)...")
+        job = ReEnhanceJob(worksheet, enhancer, checkpoint, memory_store, search_index, pacer, args.batch_size)
+        await job.run(candidates)
+        written, failed = written + job.written, failed + job.failed
+    if not failed:
+        checkpoint.purge_written()
+    print(f"✅ {written} Zeile(n) aktualisiert, {failed} fehlgeschlagen"
+          f"{' (erneut ausführen, um sie nachzuholen)' if failed else ''}.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bestehende Einträge mit dem aktuellen Prompt/Modell neu aufbereiten.")
+    parser.add_argument("--dry-run", action="store_true", help="Nur zählen, nichts ändern")
+    parser.add_argument("--concurrency", type=int, default=4, help="Gleichzeitige Groq-Aufrufe")
+    parser.add_argument("--requests-per-minute", type=float, default=30, help="Obergrenze für Groq-Aufrufe (0 = aus)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Zeilen pro batch_update")
+    parser.add_argument("--limit", type=int, help="Höchstens so viele Zeilen bearbeiten")
+    parser.add_argument("--year", help="Nur das Jahresblatt dieses Jahres (z.B. 2025)")
+    parser.add_argument("--force", action="store_true", help="Auch Zeilen mit aktueller Prompt-Version (ohne Cache)")
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    sys.exit(asyncio.run(main(parser.parse_args())))
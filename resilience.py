@@ -0,0 +1,204 @@
+# resilience.py - Timeouts, Wiederholungen mit Backoff und Circuit Breaker für externe Dienste (Groq, Google Sheets)
+
+import os
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Konfiguration über Umgebungsvariablen
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_SECONDS = float(os.getenv('RETRY_BASE_SECONDS', '0.5'))
+RETRY_MAX_SECONDS = float(os.getenv('RETRY_MAX_SECONDS', '30'))
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout',
+                         'ConnectTimeout', 'RemoteProtocolError', 'ChunkedEncodingError'}
+
+
+class CircuitOpenError(Exception):
+    """Der Circuit Breaker des Dienstes ist offen; der Aufruf wurde gar nicht erst versucht."""
+
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f"Circuit Breaker für '{backend}' ist offen (neuer Versuch in {retry_in:.0f}s)")
+        self.backend = backend
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Die Gesamtfrist für einen Aufruf inklusive Wiederholungen ist abgelaufen."""
+
+
+class CircuitBreaker:
+    """
+    Klassischer Circuit Breaker pro Dienst:
+
+    - geschlossen: Aufrufe laufen durch, aufeinanderfolgende Fehler werden gezählt
+    - offen: nach `failure_threshold` Fehlern werden Aufrufe für `reset_seconds` sofort abgelehnt
+    - halb offen: danach darf genau ein Testaufruf durch; Erfolg schließt, Fehler öffnet erneut
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def is_available(self) -> bool:
+        """True, wenn ein Aufruf derzeit erlaubt wäre (ohne den Testaufruf zu verbrauchen)."""
+        if self.state == self.OPEN:
+            return self.retry_in() == 0
+        return not (self.state == self.HALF_OPEN and self._probe_in_flight)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() == 0:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info(f"✅ Circuit Breaker '{self.name}' wieder geschlossen.")
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit Breaker '{self.name}' geöffnet nach {self._failures} Fehler(n).")
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def release_probe(self):
+        """Testaufruf ohne Aussage über den Dienst beendet (z.B. Client-Fehler 4xx)."""
+        self._probe_in_flight = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.gauge("bot_circuit_open", "1, wenn der Circuit Breaker des Dienstes offen ist").set(
+            1 if state == self.OPEN else 0, {"backend": self.name})
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(backend: str) -> CircuitBreaker:
+    breaker = _breakers.get(backend)
+    if breaker is None:
+        breaker = _breakers[backend] = CircuitBreaker(backend)
+    return breaker
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, 'status_code', None)
+    if code is None:
+        code = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Liest einen Retry-After-Header (Sekunden oder HTTP-Datum) aus der Antwort der Exception."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Vorübergehende Fehler (Timeouts, Verbindungsabbrüche, 429/5xx) lohnen einen neuen Versuch."""
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    return status_code_of(exc) in TRANSIENT_STATUS_CODES
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_SECONDS, cap: float = RETRY_MAX_SECONDS) -> float:
+    """Exponentielles Backoff mit "Full Jitter"."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+async def resilient_call(func: Callable[[], Awaitable[T]], *, backend: str, timeout: float,
+                         deadline: Optional[float] = None, max_attempts: int = RETRY_MAX_ATTEMPTS) -> T:
+    """
+    Führt `func()` mit Timeout pro Versuch, Gesamtfrist `deadline` (Sekunden), Wiederholungen
+    bei vorübergehenden Fehlern und dem Circuit Breaker des Dienstes `backend` aus.
+
+    `func` wird für jeden Versuch neu aufgerufen und muss daher z.B. Dateien selbst öffnen.
+    Bei synchronen Bibliotheken (gspread) läuft der Aufruf in einem Thread; ein Timeout gibt
+    die Event-Loop frei, der Thread selbst läuft aber bis zum Ende weiter.
+    """
+    breaker = get_breaker(backend)
+    give_up_at = time.monotonic() + (deadline if deadline is not None else timeout * max_attempts + RETRY_MAX_SECONDS)
+
+    for attempt in range(1, max_attempts + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(backend, breaker.retry_in())
+        probing = breaker.state == CircuitBreaker.HALF_OPEN
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            breaker.release_probe()
+            raise DeadlineExceeded(f"Frist für '{backend}' abgelaufen")
+        try:
+            result = await asyncio.wait_for(func(), timeout=min(timeout, remaining))
+        except Exception as e:
+            if not is_transient(e):
+                breaker.release_probe()
+                raise
+            breaker.record_failure()
+            metrics.counter("bot_backend_retries_total", "Fehlgeschlagene Versuche je Dienst").inc(
+                1, {"backend": backend})
+            delay = retry_after_seconds(e)
+            delay = backoff_delay(attempt) if delay is None else delay
+            if attempt == max_attempts or time.monotonic() + delay >= give_up_at:
+                raise
+            logger.warning(f"Vorübergehender Fehler bei '{backend}' (Versuch {attempt}/{max_attempts}): {e}. "
+                           f"Neuer Versuch in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Abbruch von außen (CancelledError beim Beenden, wait_for des Aufrufers) sagt nichts über
+            # den Dienst, darf aber keinen Testaufruf belegt lassen: sonst bliebe der Breaker gesperrt
+            if probing:
+                breaker.release_probe()
+            raise
+        breaker.record_success()
+        return result
@@ -1,36 +1,162 @@
-from flask import Blueprint, jsonify, request
+# routes.py - Benutzer-API (CRUD) mit Keyset-Paginierung, gestreamtem Export, ETags und Sammel-Endpunkt
+
+import os
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
 from models import User, db
 
 user_bp = Blueprint('user', __name__)
 
+# Konfiguration über Umgebungsvariablen
+USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', '50'))
+USERS_MAX_PAGE_SIZE = int(os.getenv('USERS_MAX_PAGE_SIZE', '500'))
+USERS_EXPORT_BATCH = int(os.getenv('USERS_EXPORT_BATCH', '1000'))
+USERS_BULK_MAX_ITEMS = int(os.getenv('USERS_BULK_MAX_ITEMS', '1000'))
+
+
+def _conditional(payload):
+    """JSON-Antwort mit ETag; stimmt If-None-Match überein, wird 304 ohne Inhalt gesendet."""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _collection_etag() -> str:
+    """Schwacher ETag über die ganze Tabelle, ohne sie zu lesen (Anzahl, höchste ID, letzte Änderung)."""
+    count, max_id, last_change = db.session.query(
+        func.count(User.id), func.max(User.id), func.max(User.updated_at)).one()
+    return f"users-{count}-{max_id or 0}-{last_change.timestamp() if last_change else 0}"
+
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    """Seitenweise nach ID: /users?limit=50&after=<letzte ID der vorherigen Seite>."""
+    limit = min(max(request.args.get('limit', USERS_PAGE_SIZE, type=int), 1), USERS_MAX_PAGE_SIZE)
+    after = request.args.get('after', 0, type=int)
+    # Eine Zeile mehr laden, um zu wissen, ob es eine weitere Seite gibt (kein COUNT, kein OFFSET)
+    users = User.query.filter(User.id > after).order_by(User.id).limit(limit + 1).all()
+    next_after = users[limit - 1].id if len(users) > limit else None
+    response = _conditional({'users': [user.to_dict() for user in users[:limit]], 'next_after': next_after})
+    if next_after is not None:
+        response.headers['Link'] = f'<{request.base_url}?limit={limit}&after={next_after}>; rel="next"'
+    return response
+
+
+@user_bp.route('/users/export', methods=['GET'])
+def export_users():
+    """Alle Benutzer als JSON-Liste, gestreamt in Blöcken; der Speicherbedarf hängt nicht von der Tabellengröße ab."""
+    etag = _collection_etag()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    def generate():
+        yield '['
+        after, first = 0, True
+        while True:
+            batch = User.query.filter(User.id > after).order_by(User.id).limit(USERS_EXPORT_BATCH).all()
+            if not batch:
+                break
+            chunk = ','.join(json.dumps(user.to_dict(), ensure_ascii=False) for user in batch)
+            yield chunk if first else ',' + chunk
+            first, after = False, batch[-1].id
+            db.session.expunge_all()
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    return response
+
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
-    
-    data = request.json
+    data = request.get_json(silent=True) or {}
+    if not data.get('username') or not data.get('email'):
+        return jsonify({'error': "'username' und 'email' sind erforderlich"}), 400
     user = User(username=data['username'], email=data['email'])
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Benutzername oder E-Mail existiert bereits'}), 409
     return jsonify(user.to_dict()), 201
 
+
+@user_bp.route('/users/bulk', methods=['POST'])
+def bulk_upsert_users():
+    """
+    Legt Benutzer an bzw. ändert sie (Einträge mit 'id') in einer einzigen Transaktion.
+    Schlägt ein Eintrag fehl, wird nichts übernommen.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Erwartet wird eine nicht-leere JSON-Liste'}), 400
+    if len(items) > USERS_BULK_MAX_ITEMS:
+        return jsonify({'error': f'Höchstens {USERS_BULK_MAX_ITEMS} Einträge pro Aufruf'}), 413
+
+    # Erst die Form aller Einträge prüfen: eine Liste oder ein Objekt als 'id' darf nicht in die Abfrage
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({'error': 'Ungültiger Eintrag', 'index': position}), 400
+        item_id = item.get('id')
+        if item_id is not None and (not isinstance(item_id, int) or isinstance(item_id, bool)):
+            return jsonify({'error': "'id' muss eine ganze Zahl sein", 'index': position}), 400
+
+    ids = [item['id'] for item in items if item.get('id') is not None]
+    # Alle zu ändernden Benutzer mit einer Abfrage laden statt einzeln
+    existing = {user.id: user for user in User.query.filter(User.id.in_(ids)).all()} if ids else {}
+
+    results = []
+    for position, item in enumerate(items):
+        if item.get('id') is not None:
+            user = existing.get(item['id'])
+            if user is None:
+                db.session.rollback()
+                return jsonify({'error': f"Benutzer {item['id']} nicht gefunden", 'index': position}), 404
+            user.username = item.get('username', user.username)
+            user.email = item.get('email', user.email)
+        else:
+            if not item.get('username') or not item.get('email'):
+                db.session.rollback()
+                return jsonify({'error': "'username' und 'email' sind erforderlich", 'index': position}), 400
+            user = User(username=item['username'], email=item['email'])
+            db.session.add(user)
+        results.append(user)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Benutzername oder E-Mail existiert bereits'}), 409
+    return jsonify({'users': [user.to_dict() for user in results]}), 200
+
+
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    return _conditional(user.to_dict())
+
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     user = User.query.get_or_404(user_id)
-    data = request.json
+    data = request.get_json(silent=True) or {}
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Benutzername oder E-Mail existiert bereits'}), 409
     return jsonify(user.to_dict())
 
+
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
@@ -0,0 +1,104 @@
+# scheduler.py - Nebenläufige Verarbeitung mit fester Reihenfolge pro Chat und globaler Obergrenze
+
+import os
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Maximale Anzahl Sprachnachrichten, die gleichzeitig transkribiert/aufbereitet werden
+VOICE_MAX_IN_FLIGHT = int(os.getenv('VOICE_MAX_IN_FLIGHT', '4'))
+
+
+class ChatScheduler:
+    """
+    Verschiedene Chats laufen parallel, innerhalb eines Chats strikt nacheinander
+    (in Eingangsreihenfolge), damit Einträge eines Autors nie vertauscht gespeichert werden.
+
+    Zusätzlich begrenzt eine globale FIFO-Warteschlange die Zahl gleichzeitig laufender
+    Vorgänge. Wer warten muss, erfährt über `on_queued` seinen Platz in der Schlange.
+    """
+
+    def __init__(self, max_in_flight: int = VOICE_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_users: Dict[int, int] = {}
+        metrics.add_collector(self._collect_metrics)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Anzahl der Vorgänge, die auf einen freien Platz oder auf ihren Chat warten."""
+        waiting_for_chat = sum(users - 1 for users in self._chat_users.values() if users > 1)
+        return len(self._waiters) + waiting_for_chat
+
+    @asynccontextmanager
+    async def slot(self, chat_id: int, on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+                   on_reserved: Optional[Callable[[], None]] = None):
+        """
+        Wartet, bis der Chat an der Reihe ist und ein globaler Platz frei wird. `on_reserved` wird
+        aufgerufen, sobald der Chat gehalten wird (vor dem Warten auf einen globalen Platz).
+        """
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        self._chat_users[chat_id] = self._chat_users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                if on_reserved:
+                    on_reserved()
+                await self._acquire(on_queued)
+                try:
+                    yield
+                finally:
+                    self._release()
+        finally:
+            self._chat_users[chat_id] -= 1
+            if self._chat_users[chat_id] == 0:
+                del self._chat_users[chat_id]
+                del self._chat_locks[chat_id]
+
+    async def _acquire(self, on_queued):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        position = len(self._waiters)
+        logger.info(f"Obergrenze von {self.max_in_flight} erreicht, Vorgang auf Platz {position} eingereiht.")
+        if on_queued:
+            try:
+                await on_queued(position)
+            except Exception as e:
+                logger.warning(f"Konnte Warteschlangen-Hinweis nicht senden: {e}")
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # Platz wurde schon übergeben, aber nicht mehr genutzt
+                self._release()
+            raise
+
+    def _release(self):
+        # Der Platz wird direkt an den nächsten Wartenden übergeben (in_flight bleibt gleich)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _collect_metrics(self):
+        metrics.gauge("bot_scheduler_in_flight", "Gleichzeitig verarbeitete Sprachnachrichten").set(self._in_flight)
+        metrics.gauge("bot_scheduler_queue_depth", "Wartende Sprachnachrichten").set(self.queue_depth)
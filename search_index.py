@@ -0,0 +1,220 @@
+# search_index.py - Volltextsuche über alle Erinnerungen (SQLite FTS5 mit deutschem Stemming)
+
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+SEARCH_DB_PATH = os.getenv('SEARCH_DB_PATH', os.path.join(BASE_DIR, 'search.db'))
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '5'))
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def german_stem(word: str) -> str:
+    """
+    Stemmer für deutsche Wörter nach CISTEM (Weissweiler & Fraser, 2017).
+    Groß-/Kleinschreibung wird ignoriert, damit Index und Suchanfrage gleich behandelt werden.
+    """
+    word = word.lower()
+    word = word.replace("ü", "u").replace("ö", "o").replace("ä", "a").replace("ß", "ss")
+    word = re.sub(r"^ge(.{4,})", r"\1", word)
+    word = word.replace("sch", "$").replace("ei", "%").replace("ie", "&")
+    word = re.sub(r"(.)\1", r"\1*", word)
+    while len(word) > 3:
+        if len(word) > 5:
+            word, changed = re.subn(r"e[mr]$", "", word)
+            if changed:
+                continue
+            word, changed = re.subn(r"nd$", "", word)
+            if changed:
+                continue
+        word, changed = re.subn(r"t$", "", word)
+        if changed:
+            continue
+        word, changed = re.subn(r"[esn]$", "", word)
+        if not changed:
+            break
+    word = re.sub(r"(.)\*", r"\1\1", word)
+    return word.replace("&", "ie").replace("%", "ei").replace("$", "sch")
+
+
+def stem_text(text: str) -> str:
+    return " ".join(german_stem(token) for token in WORD_RE.findall(text or ""))
+
+
+@dataclass
+class SearchHit:
+    entry_id: str
+    author: str
+    created_at: str
+    snippet: str
+
+
+class SearchIndex:
+    """
+    Persistenter invertierter Index (FTS5) über Original- und aufbereiteten Text.
+
+    Die Texte werden vor dem Indexieren gestemmt ("Gärten", "Garten" → "gar"),
+    die Suchbegriffe ebenso; die Originaltexte liegen daneben für die Trefferanzeige.
+    """
+
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                entry_id TEXT NOT NULL UNIQUE,
+                author TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                original_text TEXT NOT NULL,
+                enhanced_text TEXT NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(original, enhanced, tokenize='unicode61')")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def add(self, entry_id: str, author: str, created_at: datetime, original_text: str, enhanced_text: str):
+        """Fügt eine Erinnerung hinzu oder aktualisiert sie (inkrementell bei jedem Speichern)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._upsert(entry_id, author, created_at, original_text, enhanced_text)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def rebuild(self, rows: Iterable[Tuple[str, str, datetime, str, str]]) -> int:
+        """Baut den Index komplett neu auf, in einer Transaktion. rows: (entry_id, author, created_at, original, enhanced)."""
+        count = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.execute("DELETE FROM entries_fts")
+                for row in rows:
+                    self._upsert(*row)
+                    count += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("INSERT INTO entries_fts(entries_fts) VALUES ('optimize')")
+        return count
+
+    def _upsert(self, entry_id, author, created_at, original_text, enhanced_text):
+        created = created_at.isoformat(timespec='seconds') if isinstance(created_at, datetime) else str(created_at)
+        row = self._conn.execute("SELECT id FROM entries WHERE entry_id = ?", (entry_id,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM entries_fts WHERE rowid = ?", (row[0],))
+            self._conn.execute(
+                "UPDATE entries SET author = ?, created_at = ?, original_text = ?, enhanced_text = ? WHERE id = ?",
+                (author, created, original_text, enhanced_text, row[0]))
+            rowid = row[0]
+        else:
+            rowid = self._conn.execute(
+                "INSERT INTO entries (entry_id, author, created_at, original_text, enhanced_text) VALUES (?, ?, ?, ?, ?)",
+                (entry_id, author, created, original_text, enhanced_text)).lastrowid
+        self._conn.execute("INSERT INTO entries_fts (rowid, original, enhanced) VALUES (?, ?, ?)",
+                           (rowid, stem_text(original_text), stem_text(enhanced_text)))
+
+    def search(self, query: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE) -> Tuple[int, List[SearchHit]]:
+        """Liefert (Gesamtzahl, Treffer der Seite), sortiert nach Relevanz (BM25, aufbereiteter Text zählt doppelt)."""
+        terms = [german_stem(t) for t in WORD_RE.findall(query)]
+        terms = [t for t in terms if t]
+        if not terms:
+            return 0, []
+        match = " AND ".join(f'"{t}"*' for t in terms)
+        offset = (max(page, 1) - 1) * page_size
+        with self._lock:
+            total = self._conn.execute(
+                "SELECT COUNT(*) FROM entries_fts WHERE entries_fts MATCH ?", (match,)).fetchone()[0]
+            rows = self._conn.execute(
+                """SELECT e.entry_id, e.author, e.created_at, e.enhanced_text, e.original_text
+                   FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+                   WHERE entries_fts MATCH ?
+                   ORDER BY bm25(entries_fts, 1.0, 2.0), e.created_at DESC
+                   LIMIT ? OFFSET ?""", (match, page_size, offset)).fetchall()
+        words = WORD_RE.findall(query)
+        return total, [SearchHit(r[0], r[1], r[2], self._snippet(r[3] or r[4], words)) for r in rows]
+
+    async def asearch(self, query: str, page: int = 1) -> Tuple[int, List[SearchHit]]:
+        return await asyncio.to_thread(self.search, query, page)
+
+    async def aadd(self, *args):
+        await asyncio.to_thread(self.add, *args)
+
+    @staticmethod
+    def _snippet(text: str, words: List[str], width: int = 160) -> str:
+        """Ausschnitt um das erste Vorkommen eines Suchbegriffs (bzw. seines Wortstamms)."""
+        lowered = text.lower()
+        positions = [lowered.find(candidate) for w in words for candidate in (w.lower(), german_stem(w)) if candidate]
+        positions = [p for p in positions if p >= 0]
+        start = max(0, min(positions) - width // 3) if positions else 0
+        snippet = text[start:start + width].strip()
+        return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+
+
+def rows_from_memory_store(store):
+    """Alle Erinnerungen aus dem lokalen MemoryStore im Format für SearchIndex.rebuild."""
+    from models import Memory
+
+    with store.app.app_context():
+        for m in Memory.query.order_by(Memory.id).yield_per(500):
+            yield m.entry_id, m.author, m.created_at, m.original_text, m.enhanced_text
+
+
+async def _rows_from_sheet():
+    from google_sheets_manager import GoogleSheetsManager
+    from memory_store import MemoryStore
+
+    manager = GoogleSheetsManager(MemoryStore())
+    if not await manager.open_worksheet():
+        raise RuntimeError("Google Sheets konnte nicht initialisiert werden.")
+    rows = await asyncio.to_thread(manager.worksheet.get_all_values)
+    result = []
+    for index, row in enumerate(rows[1:], start=2):
+        row = row + [""] * (7 - len(row))
+        timestamp, author, original, enhanced, _, _, entry_id = row[:7]
+        try:
+            created_at = datetime.strptime(timestamp, "%d.%m.%Y %H:%M:%S")
+        except ValueError:
+            created_at = timestamp
+        # Ältere Zeilen ohne Eintrag-ID bekommen eine stabile ID aus der Zeilennummer
+        result.append((entry_id or f"row-{index}", author, created_at, original, enhanced))
+    return result
+
+
+if __name__ == '__main__':
+    # python search_index.py rebuild [--from-sheet]
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Verwendung: python search_index.py rebuild [--from-sheet]")
+        sys.exit(1)
+    started = time.perf_counter()
+    if '--from-sheet' in sys.argv:
+        source = asyncio.run(_rows_from_sheet())
+    else:
+        from memory_store import MemoryStore
+        source = rows_from_memory_store(MemoryStore())
+    count = SearchIndex().rebuild(source)
+    print(f"✅ Suchindex mit {count} Einträgen neu aufgebaut ({time.perf_counter() - started:.1f}s).")
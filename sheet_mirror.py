@@ -0,0 +1,308 @@
+# sheet_mirror.py - Lokale Lesekopie der Jahresblätter, inkrementell abgeglichen, für /verlauf
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from metrics import metrics
+from resilience import CircuitOpenError, resilient_call
+from sheets_writer import SHEETS_CALL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+SHEET_MIRROR_PATH = os.getenv('SHEET_MIRROR_PATH', os.path.join(BASE_DIR, 'sheet_mirror.db'))
+SHEET_MIRROR_SYNC_SECONDS = float(os.getenv('SHEET_MIRROR_SYNC_SECONDS', '300'))
+# Prüfung älterer Zeilen auf Änderungen von Hand: alle VERIFY_SECONDS je ein Block pro Blatt
+SHEET_MIRROR_VERIFY_SECONDS = float(os.getenv('SHEET_MIRROR_VERIFY_SECONDS', '600'))
+SHEET_MIRROR_VERIFY_ROWS = int(os.getenv('SHEET_MIRROR_VERIFY_ROWS', '200'))
+VERLAUF_PAGE_SIZE = int(os.getenv('VERLAUF_PAGE_SIZE', '5'))
+
+# Spalten wie in google_sheets_manager.EXPECTED_HEADERS
+COLUMNS = ("Datum", "Autor", "Original Text", "Aufbereiteter Text", "Monat", "Jahr", "Eintrag-ID", "Prompt-Version")
+LAST_COLUMN = chr(ord("A") + len(COLUMNS) - 1)
+
+
+@dataclass
+class MirrorEntry:
+    sort_key: str
+    created: str
+    author: str
+    month: str
+    original_text: str
+    enhanced_text: str
+
+
+@dataclass
+class MirrorPage:
+    entries: List[MirrorEntry]
+    total: int
+    has_newer: bool
+    has_older: bool
+
+
+def _row_hash(row: List[str]) -> str:
+    return hashlib.sha256("\x1f".join(row).encode("utf-8")).hexdigest()
+
+
+def _block_checksum(hashes: List[str]) -> str:
+    return hashlib.sha256("".join(hashes).encode("ascii")).hexdigest()
+
+
+def _pad(row) -> List[str]:
+    row = [str(cell) for cell in row][:len(COLUMNS)]
+    return row + [""] * (len(COLUMNS) - len(row))
+
+
+def _sort_key(sheet: str, row_number: int, row: List[str]) -> str:
+    """Chronologischer, eindeutiger Schlüssel für die Keyset-Paginierung (passt in callback_data)."""
+    try:
+        stamp = datetime.strptime(row[0], "%d.%m.%Y %H:%M:%S").strftime("%Y%m%d%H%M%S")
+    except ValueError:
+        stamp = "0" * 14
+    return f"{stamp}|{row[6] or f'{sheet}#{row_number}'}"
+
+
+class SheetMirror:
+    """
+    Lesekopie der Jahresblätter in SQLite. Abgeglichen wird nur, was seit dem letzten Mal
+    hinzugekommen ist (Zeilen hinter der zuletzt gesehenen Zeilenzahl). Ältere Bereiche werden
+    blockweise per Prüfsumme mit der Tabelle verglichen, damit Änderungen von Hand ankommen.
+
+    Lesen (page/count) greift nie auf die Sheets-API zu.
+    """
+
+    def __init__(self, path: str = SHEET_MIRROR_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mirror_rows (
+                sheet TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                sort_key TEXT NOT NULL,
+                created TEXT NOT NULL,
+                author TEXT NOT NULL,
+                month TEXT NOT NULL,
+                original_text TEXT NOT NULL,
+                enhanced_text TEXT NOT NULL,
+                row_hash TEXT NOT NULL,
+                PRIMARY KEY (sheet, row)
+            );
+            CREATE INDEX IF NOT EXISTS mirror_rows_sort ON mirror_rows (sort_key);
+            CREATE INDEX IF NOT EXISTS mirror_rows_author ON mirror_rows (author COLLATE NOCASE, sort_key);
+            CREATE INDEX IF NOT EXISTS mirror_rows_month ON mirror_rows (month, sort_key);
+            CREATE TABLE IF NOT EXISTS mirror_sheets (
+                sheet TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL,
+                verify_cursor INTEGER NOT NULL DEFAULT 2
+            );""")
+        self.sheets = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        metrics.add_collector(self._collect)
+
+    # --- Abgleich (synchron, läuft im Thread) ---
+
+    def sync_worksheet(self, worksheet) -> int:
+        """Holt nur die Zeilen hinter der zuletzt gesehenen Zeilenzahl. Gibt die Anzahl neuer Zeilen zurück."""
+        from gspread.exceptions import APIError
+
+        seen = self._row_count(worksheet.title)
+        try:
+            values = worksheet.get(f"A{seen + 1}:{LAST_COLUMN}")
+        except APIError as e:
+            # Die Zeilenzahl liegt hinter dem Rand des Blattes: nichts Neues
+            if "exceeds grid limits" in str(e):
+                return 0
+            raise
+        rows = [(number, _pad(row)) for number, row in enumerate(values, start=seen + 1)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for number, row in rows:
+                self._store(worksheet.title, number, row)
+            self._conn.execute(
+                "INSERT INTO mirror_sheets (sheet, row_count) VALUES (?, ?) "
+                "ON CONFLICT(sheet) DO UPDATE SET row_count = excluded.row_count",
+                (worksheet.title, seen + len(rows)))
+            self._conn.execute("COMMIT")
+        if rows:
+            metrics.counter("bot_sheet_mirror_rows_total", "Abgeglichene Zeilen der Lesekopie").inc(
+                len(rows), labels={"source": "append"})
+        return len(rows)
+
+    def verify_worksheet(self, worksheet) -> int:
+        """
+        Vergleicht den nächsten Block bereits gespiegelter Zeilen per Prüfsumme mit der Tabelle
+        und übernimmt Abweichungen. Gibt die Anzahl korrigierter Zeilen zurück.
+        """
+        with self._lock:
+            state = self._conn.execute("SELECT row_count, verify_cursor FROM mirror_sheets WHERE sheet = ?",
+                                       (worksheet.title,)).fetchone()
+        if not state or state[0] < 2:
+            return 0
+        row_count, start = state
+        if start > row_count:
+            start = 2
+        end = min(start + SHEET_MIRROR_VERIFY_ROWS - 1, row_count)
+        fetched = worksheet.get(f"A{start}:{LAST_COLUMN}{end}")
+        remote = {number: _pad(row) for number, row in enumerate(fetched, start=start)
+                  if any(str(cell).strip() for cell in row)}
+
+        with self._lock:
+            local = dict(self._conn.execute(
+                "SELECT row, row_hash FROM mirror_rows WHERE sheet = ? AND row BETWEEN ? AND ? ORDER BY row",
+                (worksheet.title, start, end)).fetchall())
+            remote_hashes = {number: _row_hash(row) for number, row in remote.items()}
+            repaired = 0
+            self._conn.execute("BEGIN")
+            if _block_checksum([remote_hashes.get(n, "") for n in range(start, end + 1)]) != \
+                    _block_checksum([local.get(n, "") for n in range(start, end + 1)]):
+                for number in range(start, end + 1):
+                    if number not in remote:
+                        if number in local:
+                            self._conn.execute("DELETE FROM mirror_rows WHERE sheet = ? AND row = ?",
+                                               (worksheet.title, number))
+                            repaired += 1
+                    elif local.get(number) != remote_hashes[number]:
+                        self._store(worksheet.title, number, remote[number])
+                        repaired += 1
+            # Am Ende des Blattes: gelöschte Zeilen verkürzen die Zeilenzahl wieder
+            if end == row_count:
+                row_count = max(remote, default=start - 1)
+                self._conn.execute("DELETE FROM mirror_rows WHERE sheet = ? AND row > ?", (worksheet.title, row_count))
+            self._conn.execute("UPDATE mirror_sheets SET row_count = ?, verify_cursor = ? WHERE sheet = ?",
+                               (row_count, end + 1, worksheet.title))
+            self._conn.execute("COMMIT")
+        if repaired:
+            logger.info(f"Lesekopie: {repaired} geänderte Zeile(n) in '{worksheet.title}' (Zeilen {start}–{end}) übernommen.")
+            metrics.counter("bot_sheet_mirror_rows_total", "Abgeglichene Zeilen der Lesekopie").inc(
+                repaired, labels={"source": "verify"})
+        return repaired
+
+    def _row_count(self, sheet: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT row_count FROM mirror_sheets WHERE sheet = ?", (sheet,)).fetchone()
+        # Zeile 1 ist der Header
+        return row[0] if row else 1
+
+    def _store(self, sheet: str, number: int, row: List[str]):
+        if not any(cell.strip() for cell in row):
+            self._conn.execute("DELETE FROM mirror_rows WHERE sheet = ? AND row = ?", (sheet, number))
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO mirror_rows (sheet, row, sort_key, created, author, month, original_text, "
+            "enhanced_text, row_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (sheet, number, _sort_key(sheet, number, row), row[0], row[1], row[4], row[2], row[3], _row_hash(row)))
+
+    # --- Hintergrund-Abgleich ---
+
+    def start(self, sheets) -> None:
+        """`sheets` ist das PartitionedSheets-Objekt des GoogleSheetsManager."""
+        self.sheets = sheets
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="sheet-mirror")
+
+    def notify(self) -> None:
+        """Nach dem Anhängen neuer Zeilen (SheetsWriter) sofort abgleichen, statt auf das Intervall zu warten."""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        next_verify = time.monotonic() + SHEET_MIRROR_VERIFY_SECONDS
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                for _, worksheet in self.sheets.partitions():
+                    await resilient_call(lambda: asyncio.to_thread(self.sync_worksheet, worksheet),
+                                         backend="sheets", timeout=SHEETS_CALL_TIMEOUT)
+                if time.monotonic() >= next_verify:
+                    for _, worksheet in self.sheets.partitions():
+                        await resilient_call(lambda: asyncio.to_thread(self.verify_worksheet, worksheet),
+                                             backend="sheets", timeout=SHEETS_CALL_TIMEOUT)
+                    next_verify = time.monotonic() + SHEET_MIRROR_VERIFY_SECONDS
+            except CircuitOpenError as e:
+                logger.warning(f"{e}; Lesekopie wird später abgeglichen.")
+            except Exception as e:
+                logger.error(f"FEHLER beim Abgleich der Lesekopie: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), SHEET_MIRROR_SYNC_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Lesen (nur SQLite) ---
+
+    _FIELDS = "sort_key, created, author, month, original_text, enhanced_text"
+
+    def page(self, author: Optional[str] = None, month: Optional[str] = None, before: Optional[str] = None,
+             after: Optional[str] = None, limit: int = VERLAUF_PAGE_SIZE) -> MirrorPage:
+        """
+        Neueste zuerst. `before`: Einträge älter als dieser Schlüssel (nächste Seite),
+        `after`: neuer als dieser Schlüssel (vorherige Seite).
+        """
+        where, params = self._filters(author, month)
+        if after:
+            query = f"SELECT {self._FIELDS} FROM mirror_rows WHERE {' AND '.join(where + ['sort_key > ?'])} " \
+                    f"ORDER BY sort_key ASC LIMIT ?"
+            args = params + [after, limit]
+        else:
+            query = f"SELECT {self._FIELDS} FROM mirror_rows WHERE {' AND '.join(where + ['sort_key < ?'])} " \
+                    f"ORDER BY sort_key DESC LIMIT ?"
+            args = params + [before or "~", limit]
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+            if after:
+                rows.reverse()
+            entries = [MirrorEntry(*row) for row in rows]
+            total = self._conn.execute(f"SELECT COUNT(*) FROM mirror_rows WHERE {' AND '.join(where)}",
+                                       params).fetchone()[0]
+            has_newer = has_older = False
+            if entries:
+                has_newer = self._exists(where + ["sort_key > ?"], params + [entries[0].sort_key])
+                has_older = self._exists(where + ["sort_key < ?"], params + [entries[-1].sort_key])
+        return MirrorPage(entries, total, has_newer, has_older)
+
+    async def apage(self, *args, **kwargs) -> MirrorPage:
+        return await asyncio.to_thread(self.page, *args, **kwargs)
+
+    @staticmethod
+    def _filters(author: Optional[str], month: Optional[str]) -> Tuple[List[str], list]:
+        where, params = ["1 = 1"], []
+        if author:
+            where.append("author = ? COLLATE NOCASE")
+            params.append(author)
+        if month:
+            where.append("month = ?")
+            params.append(month)
+        return where, params
+
+    def _exists(self, where: List[str], params: list) -> bool:
+        return self._conn.execute(f"SELECT 1 FROM mirror_rows WHERE {' AND '.join(where)} LIMIT 1",
+                                  params).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM mirror_rows").fetchone()[0]
+
+    def _collect(self):
+        metrics.gauge("bot_sheet_mirror_entries", "Einträge in der Lesekopie der Tabelle").set(len(self))
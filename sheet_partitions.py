@@ -0,0 +1,234 @@
+# sheet_partitions.py - Ein Arbeitsblatt pro Jahr in Google Sheets
+
+"""
+Verwendung:
+    python sheet_partitions.py status     # Jahresblätter anzeigen
+
+Jede Erinnerung landet im Arbeitsblatt ihres Jahres ("Erinnerungen 2025", "Erinnerungen 2026", ...).
+Das Blatt eines neuen Jahres wird beim ersten Eintrag angelegt. Gelesen wird die Tabelle nur von
+Werkzeugen (reenhance.py, Suchindex) und der Lesekopie für /verlauf (sheet_mirror.py), jeweils
+blattweise; Monats- und Jahresrückblicke kommen aus app.db und fragen die Sheets-API gar nicht ab.
+
+Beim ersten Verbinden wird das bisherige einzelne Blatt (sheet1) einmalig auf die Jahresblätter
+verteilt und danach in "<Titel> (vor Aufteilung)" umbenannt; gelöscht wird nichts.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Konfiguration über Umgebungsvariablen
+SHEETS_PARTITION_PREFIX = os.getenv('SHEETS_PARTITION_PREFIX', 'Erinnerungen ')
+SHEETS_PARTITION_ROWS = int(os.getenv('SHEETS_PARTITION_ROWS', '1000'))
+SHEETS_PARTITION_INDEX_PATH = os.getenv('SHEETS_PARTITION_INDEX_PATH', os.path.join(BASE_DIR, 'sheet_partitions.db'))
+SHEETS_MIGRATION_BATCH = int(os.getenv('SHEETS_MIGRATION_BATCH', '500'))
+
+LEGACY_SUFFIX = " (vor Aufteilung)"
+
+
+def partition_title(year: str) -> str:
+    return f"{SHEETS_PARTITION_PREFIX}{year}"
+
+
+class PartitionIndex:
+    """
+    Lokaler Index (SQLite): Jahr → Arbeitsblatt und der Stand der einmaligen Migration.
+    """
+
+    def __init__(self, path: str = SHEETS_PARTITION_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS partitions (
+                year TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                sheet_id INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );""")
+
+    def set_partition(self, year: str, title: str, sheet_id: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO partitions (year, title, sheet_id) VALUES (?, ?, ?)",
+                               (year, title, sheet_id))
+
+    def partitions(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT year, title FROM partitions ORDER BY year").fetchall())
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+class PartitionedSheets:
+    """
+    Verteilt Zeilen nach der Spalte 'Jahr' auf Jahresblätter.
+
+    Bietet die Methoden eines gspread-Worksheets, die SheetsWriter und die Werkzeuge benutzen
+    (`append_rows`, `col_values`, `get_all_values`), und kann daher an dessen Stelle treten.
+    Alle Methoden sind synchron (gspread) und werden aus asyncio mit to_thread aufgerufen.
+    """
+
+    def __init__(self, spreadsheet, headers: List[str], index: Optional[PartitionIndex] = None):
+        self.spreadsheet = spreadsheet
+        self.headers = list(headers)
+        self.index = index or PartitionIndex()
+        self.year_column = self.headers.index("Jahr")
+        self.date_column = self.headers.index("Datum")
+        self._worksheets: Dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    def open(self):
+        """Liest die vorhandenen Jahresblätter mit einem Aufruf ein."""
+        with self._lock:
+            for worksheet in self.spreadsheet.worksheets():
+                year = worksheet.title[len(SHEETS_PARTITION_PREFIX):]
+                if worksheet.title.startswith(SHEETS_PARTITION_PREFIX) and year.isdigit():
+                    self._worksheets[year] = worksheet
+                    self.index.set_partition(year, worksheet.title, worksheet.id)
+
+    def partition(self, year: str):
+        """Arbeitsblatt eines Jahres; beim ersten Eintrag eines neuen Jahres wird es angelegt."""
+        with self._lock:
+            worksheet = self._worksheets.get(year)
+            if worksheet is None:
+                title = partition_title(year)
+                logger.info(f"Lege Arbeitsblatt '{title}' an.")
+                worksheet = self.spreadsheet.add_worksheet(title=title, rows=SHEETS_PARTITION_ROWS,
+                                                           cols=len(self.headers))
+                worksheet.insert_row(self.headers, 1)
+                self._worksheets[year] = worksheet
+                self.index.set_partition(year, title, worksheet.id)
+            return worksheet
+
+    def partitions(self) -> List[Tuple[str, object]]:
+        with self._lock:
+            return sorted(self._worksheets.items())
+
+    def is_partition(self, worksheet) -> bool:
+        with self._lock:
+            return any(worksheet.id == known.id for known in self._worksheets.values())
+
+    def year_of(self, row: List[str]) -> str:
+        year = row[self.year_column] if len(row) > self.year_column else ""
+        if year.strip().isdigit():
+            return year.strip()
+        try:
+            return str(datetime.strptime(row[self.date_column][:10], "%d.%m.%Y").year)
+        except (IndexError, ValueError):
+            return str(datetime.now().year)
+
+    # --- Schnittstelle eines Worksheets ---
+
+    def append_rows(self, values: List[List[str]], **kwargs):
+        """Hängt jede Zeile an das Blatt ihres Jahres an (ein Aufruf pro betroffenem Jahr)."""
+        by_year: Dict[str, List[List[str]]] = {}
+        for row in values:
+            by_year.setdefault(self.year_of(row), []).append(row)
+        responses = []
+        for year, rows in sorted(by_year.items()):
+            responses.append(self.partition(year).append_rows(rows, **kwargs))
+        return responses
+
+    def col_values(self, col: int) -> List[str]:
+        values = []
+        for _, worksheet in self.partitions():
+            values.extend(worksheet.col_values(col))
+        return values
+
+    def get_all_values(self) -> List[List[str]]:
+        """Header und alle Zeilen aller Jahresblätter, chronologisch nach Jahr."""
+        values = [list(self.headers)]
+        for _, worksheet in self.partitions():
+            values.extend(worksheet.get_all_values()[1:])
+        return values
+
+    # --- Einmalige Migration ---
+
+    def migrate_legacy(self, legacy) -> int:
+        """
+        Verteilt die Zeilen des bisherigen Einzelblatts auf die Jahresblätter. Bereits übertragene
+        Zeilen (gleiche Eintrag-ID bzw. identische Zeile) werden übersprungen, ein abgebrochener
+        Lauf kann also einfach wiederholt werden. Das alte Blatt wird danach nur umbenannt.
+        """
+        values = legacy.get_all_values()
+        rows = values[1:] if values and values[0][:1] == [self.headers[0]] else values
+        rows = [list(row) + [""] * (len(self.headers) - len(row)) for row in rows if any(cell.strip() for cell in row)]
+        id_column = self.headers.index("Eintrag-ID")
+
+        by_year: Dict[str, List[List[str]]] = {}
+        for row in rows:
+            by_year.setdefault(self.year_of(row), []).append(row[:len(self.headers)])
+
+        moved = 0
+        for year, year_rows in sorted(by_year.items()):
+            existing = self.partition(year).get_all_values()[1:]
+            known_ids = {row[id_column] for row in existing if len(row) > id_column and row[id_column]}
+            known_rows = {tuple(list(row) + [""] * (len(self.headers) - len(row))) for row in existing}
+            todo = [row for row in year_rows
+                    if not (row[id_column] and row[id_column] in known_ids) and tuple(row) not in known_rows]
+            for start in range(0, len(todo), SHEETS_MIGRATION_BATCH):
+                self.partition(year).append_rows(todo[start:start + SHEETS_MIGRATION_BATCH])
+            moved += len(todo)
+            logger.info(f"Migration: {len(todo)} von {len(year_rows)} Zeile(n) nach '{partition_title(year)}' übertragen.")
+
+        if rows and not legacy.title.endswith(LEGACY_SUFFIX):
+            legacy.update_title(f"{legacy.title}{LEGACY_SUFFIX}")
+        self.index.set_meta("legacy_migrated", datetime.now().isoformat(timespec="seconds"))
+        return moved
+
+    def migrate_if_needed(self):
+        """
+        Führt die Migration beim ersten Verbinden aus. Maßgeblich ist der Titel des alten Blatts in der
+        Tabelle selbst: Der lokale Index geht bei einem Deploy (flüchtige Platte) verloren, und eine zweite
+        Migration würde inzwischen geänderte Zeilen (z.B. nach reenhance.py) erneut anhängen.
+        """
+        if self.index.get_meta("legacy_migrated"):
+            return
+        legacy = self.spreadsheet.sheet1
+        if self.is_partition(legacy) or legacy.title.endswith(LEGACY_SUFFIX):
+            self.index.set_meta("legacy_migrated", datetime.now().isoformat(timespec="seconds"))
+            return
+        logger.info(f"📦 Verteile das bisherige Arbeitsblatt '{legacy.title}' auf Jahresblätter...")
+        moved = self.migrate_legacy(legacy)
+        logger.info(f"✅ Migration abgeschlossen: {moved} Zeile(n) übertragen.")
+
+
+async def _main() -> int:
+    from google_sheets_manager import GoogleSheetsManager
+    from memory_store import MemoryStore
+
+    manager = GoogleSheetsManager(MemoryStore())
+    if not await manager.open_worksheet():
+        return 1
+    for year, worksheet in manager.worksheet.partitions():
+        print(f"📄 {worksheet.title}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "status":
+        print("Verwendung: python sheet_partitions.py status")
+        sys.exit(1)
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,194 @@
+# sheets_writer.py - Gebündeltes, nicht-blockierendes Schreiben nach Google Sheets
+
+import os
+import time
+import random
+import asyncio
+import logging
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from metrics import metrics
+from resilience import CircuitOpenError, resilient_call, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', '50'))
+SHEETS_LINGER_SECONDS = float(os.getenv('SHEETS_LINGER_SECONDS', '2.0'))
+SHEETS_RETRY_BASE_SECONDS = float(os.getenv('SHEETS_RETRY_BASE_SECONDS', '1.0'))
+SHEETS_RETRY_MAX_SECONDS = float(os.getenv('SHEETS_RETRY_MAX_SECONDS', '300'))
+SHEETS_CALL_TIMEOUT = float(os.getenv('SHEETS_CALL_TIMEOUT', '60'))
+# Auch ohne notify() regelmäßig nachsehen: Worker-Prozesse speichern in dieselbe Datenbank
+SHEETS_POLL_SECONDS = float(os.getenv('SHEETS_POLL_SECONDS', '15'))
+
+
+def new_entry_id() -> str:
+    """Erzeugt eine eindeutige ID für eine Erinnerung (Spalte 'Eintrag-ID')."""
+    return uuid.uuid4().hex
+
+
+class SheetsWriter:
+    """
+    Hintergrund-Worker (Reconciler), der noch nicht replizierte Zeilen gebündelt mit
+    einem einzigen `append_rows`-Aufruf in das Worksheet schreibt.
+
+    Die Quelle (`queue`) ist der MemoryStore; sie muss size/pending/claim_batch/
+    in_doubt/ack/release anbieten.
+
+    Exactly-once: Bevor ein unbestätigter Batch erneut gesendet wird, wird die
+    Spalte 'Eintrag-ID' gelesen und bereits vorhandene Zeilen werden nur bestätigt.
+    """
+
+    def __init__(self, queue, id_column: int,
+                 batch_size: int = SHEETS_BATCH_SIZE, linger_seconds: float = SHEETS_LINGER_SECONDS,
+                 on_appended: Optional[Callable[[], None]] = None):
+        self.queue = queue
+        self.id_column = id_column
+        self.on_appended = on_appended
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.worksheet = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        # Letzter append_rows-Thread; läuft nach einer Zeitüberschreitung weiter (siehe _settle_append)
+        self._append_future: Optional[asyncio.Future] = None
+
+    def start(self, worksheet) -> None:
+        self.worksheet = worksheet
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="sheets-writer")
+            logger.info(f"SheetsWriter gestartet (Batch-Größe {self.batch_size}, Linger {self.linger_seconds}s).")
+
+    def notify(self) -> None:
+        """Weckt den Worker auf, nachdem eine neue Zeile eingereiht wurde."""
+        self._wakeup.set()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Beendet den Worker und versucht vorher, die Warteschlange zu leeren."""
+        if not self._task:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            remaining = await asyncio.to_thread(self.queue.size)
+            logger.warning(f"SheetsWriter beim Beenden abgebrochen, {remaining} Zeilen bleiben für den nächsten Start.")
+
+    async def _run(self):
+        # Alle Zugriffe auf die Quelle (app.db, SQLAlchemy) laufen im Thread, nie auf der Event-Loop
+        logger.info(f"{await asyncio.to_thread(self.queue.size)} Zeilen in der Sheets-Warteschlange.")
+        failures = 0
+        while True:
+            if await asyncio.to_thread(self.queue.in_doubt) and not await self._recover_in_doubt():
+                return
+            if await asyncio.to_thread(self.queue.pending) == 0:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), SHEETS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    continue
+            if not self._stopping:
+                await self._linger()
+
+            _, rows = await asyncio.to_thread(self.queue.claim_batch, self.batch_size)
+            if not rows:
+                continue
+            try:
+                await self._append(rows)
+                failures = 0
+            except CircuitOpenError as e:
+                # Es wurde nichts gesendet: Zeilen sofort wieder freigeben und auf den Breaker warten
+                await asyncio.to_thread(self.queue.release, [entry_id for entry_id, _ in rows])
+                logger.warning(f"{e}; {len(rows)} Zeile(n) bleiben in der Warteschlange.")
+                if self._stopping:
+                    return
+                await asyncio.sleep(max(e.retry_in, 1.0))
+            except Exception as e:
+                failures += 1
+                delay = retry_after_seconds(e) or self._backoff(failures)
+                logger.error(f"FEHLER beim gebündelten Schreiben von {len(rows)} Zeilen nach Google Sheets: {e}. "
+                             f"Neuer Versuch in {delay:.1f}s.", exc_info=True)
+                if self._stopping:
+                    return
+                await asyncio.sleep(delay)
+
+    async def _linger(self):
+        """Wartet kurz, damit sich bei Lastspitzen mehrere Zeilen zu einem Batch sammeln."""
+        deadline = time.monotonic() + self.linger_seconds
+        while await asyncio.to_thread(self.queue.pending) < self.batch_size and not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def _append(self, rows: List[Tuple[str, List[str]]]):
+        values = [row for _, row in rows]
+
+        def send():
+            # Das Zeitlimit bricht nur das Warten ab, nicht den Thread: das Future bleibt erhalten,
+            # damit _recover_in_doubt erst nach seinem Ende abgleicht
+            self._append_future = asyncio.ensure_future(asyncio.to_thread(self.worksheet.append_rows, values))
+            return asyncio.shield(self._append_future)
+
+        with metrics.stage("sheets_append"):
+            # Ein Versuch pro Aufruf: Wiederholungen übernimmt diese Schleife, da nach einem
+            # Fehler erst über die Eintrag-IDs geprüft werden muss, was angekommen ist.
+            await resilient_call(send, backend="sheets", timeout=SHEETS_CALL_TIMEOUT, max_attempts=1)
+        await asyncio.to_thread(self.queue.ack, [entry_id for entry_id, _ in rows])
+        logger.info(f"✅ {len(rows)} Erinnerung(en) gebündelt in Google Sheets gespeichert.")
+        if self.on_appended:
+            self.on_appended()
+
+    async def _recover_in_doubt(self) -> bool:
+        """
+        Gleicht unbestätigte Batches (Fehler oder Absturz während des Sendens) mit der
+        Spalte 'Eintrag-ID' ab: Vorhandene Zeilen werden bestätigt, der Rest wird freigegeben.
+        """
+        await self._settle_append()
+        rows = await asyncio.to_thread(self.queue.in_doubt)
+        logger.info(f"Gleiche {len(rows)} unbestätigte Zeile(n) mit Google Sheets ab...")
+        failures = 0
+        while True:
+            try:
+                existing = set(await resilient_call(
+                    lambda: asyncio.to_thread(self.worksheet.col_values, self.id_column),
+                    backend="sheets", timeout=SHEETS_CALL_TIMEOUT))
+                break
+            except Exception as e:
+                failures += 1
+                if self._stopping:
+                    return False
+                delay = e.retry_in if isinstance(e, CircuitOpenError) else self._backoff(failures)
+                logger.error(f"FEHLER beim Abgleich unbestätigter Zeilen: {e}. Neuer Versuch in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+        await asyncio.to_thread(self.queue.ack, [entry_id for _, entry_id, _ in rows if entry_id in existing])
+        await asyncio.to_thread(self.queue.release, [entry_id for _, entry_id, _ in rows if entry_id not in existing])
+        return True
+
+    async def _settle_append(self):
+        """
+        Wartet auf einen append_rows-Thread, dessen Aufruf das Zeitlimit überschritten hat. Er kann die
+        Zeilen noch schreiben; ein Abgleich davor würde sie freigeben und doppelt senden lassen.
+        """
+        future, self._append_future = self._append_future, None
+        if future is None:
+            return
+        if not future.done():
+            logger.info("Warte auf das Ende eines abgelaufenen append_rows-Aufrufs, bevor abgeglichen wird...")
+        await asyncio.gather(future, return_exceptions=True)
+
+    @staticmethod
+    def _backoff(failures: int) -> float:
+        delay = min(SHEETS_RETRY_MAX_SECONDS, SHEETS_RETRY_BASE_SECONDS * (2 ** (failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
@@ -4,6 +4,8 @@ Separater Starter für den Telegram Bot
 Läuft unabhängig von Flask
 """
 
+import startup  # zuerst: misst die Startzeit ab Prozessbeginn
+
 import os
 import sys
 from dotenv import load_dotenv
@@ -16,6 +18,8 @@ load_dotenv()
 
 from telegram_bot import TochterErinnerungenBot
 
+startup.mark("imports")
+
 if __name__ == "__main__":
     print("🚀 Starte Tochter-Erinnerungen Telegram Bot...")
     
@@ -37,6 +41,7 @@ if __name__ == "__main__":
     try:
         # Bot erstellen und starten
         bot = TochterErinnerungenBot()
+        startup.mark("bot_created")
         print("🤖 Bot erfolgreich initialisiert!")
         print("📱 Bot ist jetzt online und wartet auf Nachrichten...")
         print("💡 Sende /start an deinen Bot in Telegram um zu beginnen!")
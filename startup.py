@@ -0,0 +1,29 @@
+# startup.py - Messung der Startzeit (Kaltstart auf Render: Import, Initialisierung, erstes Update)
+
+import time
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Möglichst früh importieren (erste Zeile in main.py/start_bot.py), dann ist das der Prozessstart
+STARTED = time.perf_counter()
+
+_phases: Dict[str, float] = {}
+
+
+def mark(phase: str) -> float:
+    """Hält fest, wie viele Sekunden seit dem Start bis zu `phase` vergangen sind (nur beim ersten Mal)."""
+    if phase in _phases:
+        return _phases[phase]
+    seconds = _phases[phase] = time.perf_counter() - STARTED
+    # Erst hier importieren, damit dieses Modul selbst nichts zur Startzeit beiträgt
+    from metrics import metrics
+    metrics.gauge("bot_startup_seconds", "Sekunden vom Prozessstart bis zur jeweiligen Startphase").set(
+        seconds, {"phase": phase})
+    logger.info(f"⏱️ Start: '{phase}' nach {seconds:.2f}s")
+    return seconds
+
+
+def phases() -> Dict[str, float]:
+    return dict(_phases)
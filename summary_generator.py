@@ -1,13 +1,168 @@
-# summary_generator.py - Komplett deaktiviert
+# summary_generator.py - Inkrementelle Monats- und Jahreszusammenfassungen (Map-Reduce)
 
+import os
+import asyncio
 import logging
+from collections import OrderedDict
+from typing import List, Optional
+
+from cache import TwoTierCache, sha256_text
+from resilience import resilient_call
+
 logger = logging.getLogger(__name__)
 
+# Konfiguration über Umgebungsvariablen
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', 'llama-3.1-8b-instant')
+SUMMARY_TIMEOUT = float(os.getenv('SUMMARY_TIMEOUT', '90'))
+# Maximale Eingabelänge pro LLM-Aufruf; längere Eingaben werden hierarchisch reduziert
+SUMMARY_MAX_INPUT_CHARS = int(os.getenv('SUMMARY_MAX_INPUT_CHARS', '12000'))
+# Höchstens so viele Reduktionsstufen; danach wird alles gekürzt in einem letzten Aufruf verdichtet
+SUMMARY_MAX_REDUCE_DEPTH = int(os.getenv('SUMMARY_MAX_REDUCE_DEPTH', '3'))
+# Bei jeder Änderung an den Prompts erhöhen, damit zwischengespeicherte Teilergebnisse neu erzeugt werden
+SUMMARY_PROMPT_VERSION = "1"
+
+MONTH_NAMES = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli",
+               "August", "September", "Oktober", "November", "Dezember"]
+
+
+def month_label(month: str) -> str:
+    """'2025-03' → 'März 2025'"""
+    year, number = month.split("-")
+    return f"{MONTH_NAMES[int(number) - 1]} {year}"
+
+WEEK_PROMPT = """Du fasst Tagebucheinträge zusammen, die Eltern für ihre Tochter Ellie aufgeschrieben haben.
+Schreibe auf Deutsch eine kurze, liebevolle Zusammenfassung (höchstens 5 Sätze) der folgenden Einträge einer Woche.
+Behalte konkrete Ereignisse, Namen und die zeitliche Reihenfolge bei. Erfinde nichts dazu.
+Gib NUR die Zusammenfassung zurück, ohne Einleitung.
+
+{entries}"""
+
+REDUCE_PROMPT = """Du schreibst einen Rückblick für Ellie (Du-Form) auf Deutsch, warm und optimistisch.
+Unten stehen Zusammenfassungen einzelner Abschnitte von {period}, in zeitlicher Reihenfolge.
+Verdichte sie zu einem zusammenhängenden Rückblick (höchstens {sentences} Sätze).
+Behalte die wichtigsten Ereignisse und die zeitliche Reihenfolge bei. Erfinde nichts dazu.
+Gib NUR den Rückblick zurück, ohne Einleitung.
+
+{parts}"""
+
+
 class SummaryGenerator:
-    def __init__(self):
+    """
+    Erstellt Monats- und Jahresrückblicke inkrementell:
+
+    - Map: Jede Kalenderwoche bekommt genau einmal eine Teilzusammenfassung. Der Cache-Schlüssel
+      ist ein Hash über die Einträge der Woche, d.h. sie wird nur neu erzeugt, wenn sich dort etwas ändert.
+    - Reduce: Monate werden aus den Wochen, Jahre aus den Monaten verdichtet, ebenfalls
+      über Hashes der Teilergebnisse zwischengespeichert.
+    - Passen die Teilergebnisse nicht in einen Aufruf, wird in mehreren Stufen reduziert.
+    """
+
+    def __init__(self, groq_client=None, memory_store=None, semaphore: Optional[asyncio.Semaphore] = None):
+        self.groq_client = groq_client
+        self.memory_store = memory_store
+        self.semaphore = semaphore or asyncio.Semaphore(2)
+        self.cache = TwoTierCache("summaries")
+        if not groq_client:
+            logger.info("SummaryGenerator ist deaktiviert (kein Groq-Client).")
+
+    @property
+    def enabled(self) -> bool:
+        return self.groq_client is not None and self.memory_store is not None
+
+    async def month_summary(self, month: str) -> Optional[str]:
+        """Rückblick für einen Monat im Format YYYY-MM oder None, wenn es keine Einträge gibt."""
+        memories = await self.memory_store.list_period(month=month)
+        if not memories:
+            return None
+        return await self._month_from_memories(month, memories)
+
+    async def year_summary(self, year: str) -> Optional[str]:
+        """Rückblick für ein Jahr (YYYY), verdichtet aus den Monatsrückblicken."""
+        memories = await self.memory_store.list_period(year=year)
+        if not memories:
+            return None
+        by_month = OrderedDict()
+        for memory in memories:
+            by_month.setdefault(memory.month, []).append(memory)
+        month_summaries = await asyncio.gather(
+            *(self._month_from_memories(month, entries) for month, entries in by_month.items()))
+        parts = [f"{month_label(month)}:\n{summary}" for month, summary in zip(by_month, month_summaries)]
+        return await self._reduce(parts, f"dem Jahr {year}", sentences=15)
+
+    async def _month_from_memories(self, month: str, memories) -> str:
+        weeks = OrderedDict()
+        for memory in memories:
+            iso = memory.created_at.isocalendar()
+            weeks.setdefault((iso[0], iso[1]), []).append(memory)
+        week_summaries = await asyncio.gather(*(self._week_summary(entries) for entries in weeks.values()))
+        return await self._reduce(list(week_summaries), month_label(month), sentences=8)
+
+    async def _week_summary(self, memories) -> str:
+        entries = [f"{m.created_at.strftime('%d.%m.%Y')} ({m.author}): {m.enhanced_text}" for m in memories]
+        key = "week:" + sha256_text(SUMMARY_PROMPT_VERSION + "\n" + "\n".join(
+            f"{m.entry_id}:{sha256_text(m.enhanced_text)}" for m in memories))
+        cached = await self.cache.aget(key)
+        if cached:
+            return cached
+        # Sehr lange Wochen werden vorab in Abschnitte zerlegt und hierarchisch verdichtet
+        chunks = self._pack(entries)
+        if len(chunks) == 1:
+            summary = await self._complete(WEEK_PROMPT.format(entries=chunks[0]))
+        else:
+            partials = await asyncio.gather(*(self._complete(WEEK_PROMPT.format(entries=c)) for c in chunks))
+            summary = await self._reduce(list(partials), "dieser Woche", sentences=5)
+        await self.cache.aset(key, summary)
+        return summary
+
+    async def _reduce(self, parts: List[str], period: str, sentences: int, depth: int = 0) -> str:
         """
-        Diese Klasse ist aktuell deaktiviert, um Fehler zu vermeiden.
-        Die Zusammenfassungs-Funktionen sind nicht verfügbar.
+        Verdichtet Teilergebnisse, bei Bedarf in mehreren Stufen, bis alles in einen Aufruf passt.
+        Wird eine Stufe nicht kürzer (das Modell antwortet zu lang) oder ist SUMMARY_MAX_REDUCE_DEPTH
+        erreicht, bekommt jeder Teil einen gleich großen Anteil der Eingabe und es folgt ein letzter Aufruf.
         """
-        logger.info("SummaryGenerator ist deaktiviert.")
-        pass
+        key = "reduce:" + sha256_text("\n".join([SUMMARY_PROMPT_VERSION, period, str(sentences)] + parts))
+        cached = await self.cache.aget(key)
+        if cached:
+            return cached
+
+        chunks = self._pack(parts)
+        if len(chunks) > 1 and (len(chunks) >= len(parts) or depth >= SUMMARY_MAX_REDUCE_DEPTH):
+            logger.warning(f"Reduktion für {period} kommt nicht voran ({len(parts)} Teile, Stufe {depth}), "
+                           "verdichte gekürzt in einem Aufruf.")
+            share = max(SUMMARY_MAX_INPUT_CHARS // len(parts) - 2, 1)
+            chunks = ["\n\n".join(part[:share] for part in parts)[:SUMMARY_MAX_INPUT_CHARS]]
+        if len(chunks) == 1:
+            result = await self._complete(REDUCE_PROMPT.format(period=period, sentences=sentences, parts=chunks[0]))
+        else:
+            logger.info(f"Hierarchische Reduktion für {period}: {len(parts)} Teile in {len(chunks)} Gruppen.")
+            level = await asyncio.gather(*(
+                self._complete(REDUCE_PROMPT.format(period=period, sentences=sentences, parts=chunk))
+                for chunk in chunks))
+            result = await self._reduce(list(level), period, sentences, depth + 1)
+        await self.cache.aset(key, result)
+        return result
+
+    @staticmethod
+    def _pack(texts: List[str]) -> List[str]:
+        """Fasst Texte der Reihe nach zu Blöcken zusammen, die SUMMARY_MAX_INPUT_CHARS nicht überschreiten."""
+        chunks, current = [], ""
+        for text in texts:
+            text = text[:SUMMARY_MAX_INPUT_CHARS]
+            if current and len(current) + len(text) + 2 > SUMMARY_MAX_INPUT_CHARS:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{text}" if current else text
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _complete(self, prompt: str) -> str:
+        async def call():
+            async with self.semaphore:
+                return await self.groq_client.chat.completions.create(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=SUMMARY_MODEL,
+                    temperature=0.5,
+                )
+        completion = await resilient_call(call, backend="groq", timeout=SUMMARY_TIMEOUT)
+        return completion.choices[0].message.content.strip()
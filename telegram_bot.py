@@ -1,25 +1,52 @@
 # telegram_bot.py - Finale, stabile Version mit Groq und Autor-Fix
 
 import os
+import re
+import time
+import shutil
+import tempfile
+import asyncio
 import logging
 from datetime import datetime
 import pytz
-from typing import Optional
-from io import BytesIO
+from typing import Dict, List, Optional, Set
 
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
 from dotenv import load_dotenv
-from pydub import AudioSegment
-from groq import Groq
+
+import startup
 
 from google_sheets_manager import GoogleSheetsManager
+from memory_store import MemoryStore
+from metrics import metrics
+from scheduler import ChatScheduler
+from progress import ProgressHub, EditableMessage
+from resilience import CircuitOpenError, get_breaker
+from parking import ParkedNotes, ParkedNote
+from book_export import BOOK_FORMATS, BookExporter, pdf_available
+from pipeline_journal import JOURNAL_MAX_RESUMES, VOICE_DRAIN_SECONDS, JournalEntry, PipelineJournal
 from summary_generator import SummaryGenerator
+from search_index import SearchIndex, SEARCH_PAGE_SIZE, rows_from_memory_store
+from voice_processor import VoiceProcessor, connect_groq, warm_up_groq
+from job_queue import VoiceJobQueue
+from transport import TELEGRAM_API_BASE_URL, TELEGRAM_FILE_BASE_URL, telegram_request
 
 load_dotenv()
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Schnellstart: Groq und Google Sheets werden nach dem Start im Hintergrund verbunden, Updates
+# werden sofort angenommen und warten bei Bedarf. Mit 'false' blockiert post_init wie früher.
+BOT_FAST_START = os.getenv('BOT_FAST_START', 'true').lower() == 'true'
+
+# 'polling' für lokale Nutzung, 'webhook' für den Betrieb hinter einem öffentlichen HTTPS-Endpunkt
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# 'inline': Sprachnachrichten werden im Bot-Prozess verarbeitet. 'queue': Der Bot nimmt sie nur an
+# und reiht sie in die Job-Warteschlange ein, Worker-Prozesse (worker.py) verarbeiten sie.
+VOICE_PROCESSING = os.getenv('VOICE_PROCESSING', 'inline')
+
 class TochterErinnerungenBot:
     def __init__(self):
         """Initialisiert den Bot und seine Komponenten synchron."""
@@ -28,173 +55,477 @@ class TochterErinnerungenBot:
             raise ValueError("TELEGRAM_BOT_TOKEN nicht gefunden!")
 
         
-        self.sheets_manager = GoogleSheetsManager()
-        self.summary_generator = SummaryGenerator()
-        self.application = Application.builder().token(self.token).build()
+        self.memory_store = MemoryStore()
+        self.sheets_manager = GoogleSheetsManager(self.memory_store)
+        # concurrent_updates: Updates werden parallel verarbeitet, damit eine lange
+        # Sprachnachricht nicht alle anderen Chats blockiert. Die Reihenfolge innerhalb
+        # eines Chats und die globale Obergrenze regelt der ChatScheduler.
+        builder = (Application.builder().token(self.token).concurrent_updates(True)
+                   .request(telegram_request())
+                   .get_updates_request(telegram_request(pool_size=1, backend="telegram_updates")))
+        if TELEGRAM_API_BASE_URL:
+            builder = builder.base_url(TELEGRAM_API_BASE_URL)
+        if TELEGRAM_FILE_BASE_URL:
+            builder = builder.base_file_url(TELEGRAM_FILE_BASE_URL)
+        self.application = builder.build()
         self.application.post_init = self.post_init_async
+        self.application.post_shutdown = self.post_shutdown_async
 
-        # GROQ INITIALISIERUNG
+        # GROQ: Der Client wird erst in post_init erzeugt (siehe _connect_groq)
         self.groq_client = None
-        try:
-            groq_api_key = os.getenv('GROQ_API_KEY')
-            if not groq_api_key:
-                logger.warning("GROQ_API_KEY nicht gefunden. Text-Verfeinerung wird deaktiviert.")
-            else:
-                self.groq_client = Groq(api_key=groq_api_key)
-                logger.info("✅ Groq Client erfolgreich initialisiert.")
-        except Exception as e:
-            logger.error(f"FEHLER bei der Initialisierung von Groq: {e}. Text-Verfeinerung ist deaktiviert.")
-        
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self._drain_deadline: Optional[float] = None
+        self._voice_tasks: Set[asyncio.Task] = set()
+        # Journal-Schlüssel der beim Start fortgesetzten Nachrichten (gegen erneut zugestellte Updates)
+        self._resumed_keys: Set[str] = set()
+
+        self.search_index = SearchIndex()
+        self.journal = PipelineJournal()
+        self.processor = VoiceProcessor(self.application.bot, self.memory_store, self.search_index,
+                                        on_saved=self.sheets_manager.schedule_sync, journal=self.journal)
+        self.summary_generator = SummaryGenerator(self.groq_client, self.memory_store, self.processor.groq_semaphore)
+        self.book_exporter = BookExporter(self.memory_store)
+        self.scheduler = ChatScheduler()
+        self.progress = ProgressHub()
+        self.parked_notes = ParkedNotes()
+        self.job_queue = VoiceJobQueue() if VOICE_PROCESSING == 'queue' else None
+        metrics.add_collector(self._collect_cache_metrics)
+        metrics.add_collector(self.journal.collect_metrics)
+        if self.job_queue:
+            metrics.add_collector(self.job_queue.collect_metrics)
         self._register_handlers()
 
     async def post_init_async(self, application: Application):
-        """Wird nach der Initialisierung der Application ausgeführt, um Sheets zu verbinden."""
-        logger.info("Führe Post-Initialisierungs-Aufgaben aus (Google Sheets)...")
+        """Verbindet Groq und Google Sheets – im Schnellstart-Modus im Hintergrund, damit Updates sofort angenommen werden."""
+        startup.mark("application_initialized")
+        self.parked_notes.start(get_breaker("groq"), self._resume_parked_note)
+        self._drain_task = asyncio.create_task(self._drain_on_stop(), name="voice-drain")
+        # Vor dem ersten Update: Sprachnachrichten, die beim letzten Beenden noch liefen, je Chat einreihen.
+        # post_init wartet, bis jeder dieser Chats reserviert ist; neue Nachrichten kommen erst danach dran.
+        by_chat: Dict[int, List[JournalEntry]] = {}
+        for entry in await asyncio.to_thread(self.journal.unfinished, "inline"):
+            self._resumed_keys.add(entry.key)
+            by_chat.setdefault(entry.chat_id, []).append(entry)
+        reserved = []
+        for chat_id, entries in by_chat.items():
+            event = asyncio.Event()
+            reserved.append(event)
+            self._track_voice_task(asyncio.create_task(self._resume_chat(chat_id, entries, event)))
+        await asyncio.gather(*(event.wait() for event in reserved))
+        if BOT_FAST_START:
+            self._warmup_task = asyncio.create_task(self._warm_up(), name="warm-up")
+        else:
+            await self._warm_up()
+
+    async def _warm_up(self):
+        await asyncio.gather(self._connect_groq(), self._connect_sheets(), self._prepare_search_index(),
+                             self.processor.warm_up_backends())
+        startup.mark("backends_ready")
+
+    async def _connect_groq(self):
+        self.groq_client = await connect_groq()
+        self.summary_generator.groq_client = self.groq_client
+        self.processor.set_groq_client(self.groq_client)
+        startup.mark("groq_ready")
+        if self.groq_client:
+            await warm_up_groq(self.groq_client)
+
+    async def _connect_sheets(self):
+        logger.info("Verbinde Google Sheets...")
         is_sheets_ok = await self.sheets_manager.initialize()
         if not is_sheets_ok:
             logger.critical("KRITISCHER FEHLER: Google Sheets konnte nicht initialisiert werden.")
         else:
-            logger.info("✅ Post-Initialisierung (Google Sheets) erfolgreich abgeschlossen.")
+            startup.mark("sheets_ready")
+
+    async def _prepare_search_index(self):
+        if len(self.search_index) == 0:
+            # Erster Start mit Suche: Index einmalig aus dem lokalen Speicher aufbauen
+            count = await asyncio.to_thread(self.search_index.rebuild, rows_from_memory_store(self.memory_store))
+            logger.info(f"Suchindex mit {count} Einträgen aufgebaut.")
+
+    async def post_shutdown_async(self, application: Application):
+        """Gleicht noch ausstehende Erinnerungen mit Google Sheets ab, bevor der Prozess endet."""
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        if self._drain_task and not self._drain_task.done():
+            self._drain_task.cancel()
+        # Auch fortgesetzte Nachrichten (eigene Tasks, auf die PTB nicht wartet) bekommen die Frist
+        await self._drain_voice_tasks()
+        await self.parked_notes.stop()
+        await self.progress.drain()
+        await self.sheets_manager.shutdown()
 
     def _register_handlers(self):
+        # Startzeit: erstes empfangenes (Gruppe -1) und erstes fertig bearbeitetes Update (Gruppe 1)
+        self.application.add_handler(TypeHandler(Update, self._on_update_received), group=-1)
+        self.application.add_handler(TypeHandler(Update, self._on_update_handled), group=1)
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("monats_zusammenfassung", self.month_summary_command))
+        self.application.add_handler(CommandHandler("jahres_zusammenfassung", self.year_summary_command))
+        self.application.add_handler(CommandHandler("suche", self.search_command))
+        self.application.add_handler(CallbackQueryHandler(self.search_page_callback, pattern=r"^suche:\d+$"))
+        self.application.add_handler(CommandHandler("verlauf", self.history_command))
+        self.application.add_handler(CommandHandler("buch", self.book_command))
+        self.application.add_handler(CallbackQueryHandler(self.history_page_callback, pattern=r"^verlauf:[<>]:"))
         self.application.add_handler(MessageHandler(filters.VOICE, self.handle_voice_message))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message))
 
+    async def _on_update_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        startup.mark("first_update_received")
+
+    async def _on_update_handled(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        startup.mark("first_update_handled")
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🎉 Willkommen! Sende eine Sprachnachricht, um eine Erinnerung zu speichern. 🎤")
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text("Sende eine Sprachnachricht. Ich transkribiere sie, verbessere den Text und speichere alles in Google Sheets.")
+        await update.message.reply_text(
+            "Sende eine Sprachnachricht. Ich transkribiere sie, verbessere den Text und speichere alles in Google Sheets.\n\n"
+            "/monats_zusammenfassung [JJJJ-MM] – Rückblick auf einen Monat\n"
+            "/jahres_zusammenfassung [JJJJ] – Rückblick auf ein Jahr\n"
+            "/suche <Begriff> – Erinnerungen durchsuchen\n"
+            "/verlauf [Name] [JJJJ-MM] – Erinnerungen durchblättern, neueste zuerst\n"
+            "/buch [JJJJ] [md|html|pdf] – ein Jahr als Buch herunterladen")
+
+    async def month_summary_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/monats_zusammenfassung [YYYY-MM] – Rückblick auf den aktuellen oder angegebenen Monat."""
+        month = context.args[0] if context.args else datetime.now(pytz.timezone("Europe/Berlin")).strftime("%Y-%m")
+        if not re.fullmatch(r"\d{4}-\d{2}", month):
+            await update.message.reply_text("Bitte gib den Monat als JJJJ-MM an, z.B. /monats_zusammenfassung 2025-07")
+            return
+        await self._send_summary(update, f"📅 Rückblick {month}", self.summary_generator.month_summary(month))
+
+    async def year_summary_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/jahres_zusammenfassung [YYYY] – Rückblick auf das aktuelle oder angegebene Jahr."""
+        year = context.args[0] if context.args else str(datetime.now(pytz.timezone("Europe/Berlin")).year)
+        if not re.fullmatch(r"\d{4}", year):
+            await update.message.reply_text("Bitte gib das Jahr als JJJJ an, z.B. /jahres_zusammenfassung 2025")
+            return
+        await self._send_summary(update, f"🎉 Jahresrückblick {year}", self.summary_generator.year_summary(year))
+
+    async def _send_summary(self, update: Update, title: str, summary_coro):
+        await self.processor.wait_for_groq()
+        if not self.summary_generator.enabled:
+            summary_coro.close()
+            await update.message.reply_text("❌ Zusammenfassungen sind nicht verfügbar (Groq ist nicht konfiguriert).")
+            return
+        processing_msg = await update.message.reply_text("✍️ Erstelle die Zusammenfassung...")
+        try:
+            with metrics.stage("summary"):
+                summary = await summary_coro
+        except Exception as e:
+            logger.error(f"FEHLER bei der Zusammenfassung: {e}", exc_info=True)
+            metrics.record_error("summary")
+            await processing_msg.edit_text("❌ Die Zusammenfassung konnte gerade nicht erstellt werden.")
+            return
+        if not summary:
+            await processing_msg.edit_text("📭 Für diesen Zeitraum sind noch keine Erinnerungen gespeichert.")
+            return
+        text = f"{title}\n\n{summary}"
+        # Telegram erlaubt höchstens 4096 Zeichen pro Nachricht
+        await processing_msg.edit_text(text[:4096])
+        for start in range(4096, len(text), 4096):
+            await update.message.reply_text(text[start:start + 4096])
+
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/suche <Begriff> – Volltextsuche über alle Erinnerungen."""
+        query = " ".join(context.args or []).strip()
+        if not query:
+            await update.message.reply_text("🔎 Bitte gib einen Suchbegriff an, z.B. /suche Schwimmbad")
+            return
+        # Der Suchbegriff bleibt im Chat gespeichert, da callback_data auf 64 Bytes begrenzt ist
+        context.chat_data['suche'] = query
+        text, keyboard = await self._search_page(query, 1)
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    async def search_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        search_term = context.chat_data.get('suche')
+        if not search_term:
+            await query.edit_message_text("Die Suche ist abgelaufen. Bitte starte sie mit /suche neu.")
+            return
+        text, keyboard = await self._search_page(search_term, int(query.data.split(":")[1]))
+        await query.edit_message_text(text, reply_markup=keyboard)
+
+    async def _search_page(self, search_term: str, page: int):
+        with metrics.stage("search"):
+            total, hits = await self.search_index.asearch(search_term, page)
+        if not total:
+            return f"🔎 Keine Erinnerungen zu „{search_term}“ gefunden.", None
+        pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        lines = [f"🔎 {total} Treffer für „{search_term}“ (Seite {page}/{pages})", ""]
+        for number, hit in enumerate(hits, start=(page - 1) * SEARCH_PAGE_SIZE + 1):
+            try:
+                date = datetime.fromisoformat(hit.created_at).strftime("%d.%m.%Y")
+            except ValueError:
+                date = hit.created_at
+            lines.append(f"{number}. {date} – {hit.author}\n{hit.snippet}\n")
+        buttons = []
+        if page > 1:
+            buttons.append(InlineKeyboardButton("◀️ Zurück", callback_data=f"suche:{page - 1}"))
+        if page < pages:
+            buttons.append(InlineKeyboardButton("Weiter ▶️", callback_data=f"suche:{page + 1}"))
+        return "\n".join(lines)[:4096], InlineKeyboardMarkup([buttons]) if buttons else None
+
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/verlauf [Name] [JJJJ-MM] – blättert aus der lokalen Lesekopie der Tabelle, ohne Sheets-Aufruf."""
+        author, month = None, None
+        for arg in context.args or []:
+            if re.fullmatch(r"\d{4}-\d{2}", arg):
+                month = arg
+            else:
+                author = f"{author} {arg}" if author else arg
+        # Filter im Chat speichern, in callback_data steht nur der Schlüssel der Seitengrenze
+        context.chat_data['verlauf'] = (author, month)
+        text, keyboard = await self._history_page(author, month)
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    async def history_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        filters_ = context.chat_data.get('verlauf')
+        if filters_ is None:
+            await query.edit_message_text("Der Verlauf ist abgelaufen. Bitte öffne ihn mit /verlauf neu.")
+            return
+        _, direction, key = query.data.split(":", 2)
+        if direction == "<":
+            text, keyboard = await self._history_page(*filters_, before=key)
+        else:
+            text, keyboard = await self._history_page(*filters_, after=key)
+        await query.edit_message_text(text, reply_markup=keyboard)
+
+    async def _history_page(self, author: Optional[str], month: Optional[str], before: Optional[str] = None,
+                            after: Optional[str] = None):
+        with metrics.stage("history"):
+            page = await self.sheets_manager.mirror.apage(author, month, before=before, after=after)
+        scope = ", ".join(part for part in (author, month) if part)
+        if not page.entries:
+            return f"📭 Keine Erinnerungen{f' für {scope}' if scope else ''} gefunden.", None
+        lines = [f"📜 Verlauf{f' – {scope}' if scope else ''} ({page.total} Einträge)", ""]
+        for entry in page.entries:
+            text = entry.enhanced_text or entry.original_text
+            lines.append(f"🗓️ {entry.created[:16]} – {entry.author}\n{text[:600]}{'…' if len(text) > 600 else ''}\n")
+        buttons = []
+        if page.has_newer:
+            buttons.append(InlineKeyboardButton("◀️ Neuere", callback_data=f"verlauf:>:{page.entries[0].sort_key}"))
+        if page.has_older:
+            buttons.append(InlineKeyboardButton("Ältere ▶️", callback_data=f"verlauf:<:{page.entries[-1].sort_key}"))
+        return "\n".join(lines)[:4096], InlineKeyboardMarkup([buttons]) if buttons else None
+
+    async def book_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/buch [JJJJ] [md|html|pdf] – das Jahr als Datei; unveränderte Monate kommen aus dem Cache."""
+        year = str(datetime.now(pytz.timezone("Europe/Berlin")).year)
+        fmt = "pdf" if pdf_available() else "html"
+        for arg in context.args or []:
+            if re.fullmatch(r"\d{4}", arg):
+                year = arg
+            elif arg.lower() in BOOK_FORMATS:
+                fmt = arg.lower()
+            else:
+                await update.message.reply_text("Bitte gib Jahr und Format an, z.B. /buch 2025 pdf (md, html oder pdf)")
+                return
+        if fmt == "pdf" and not pdf_available():
+            await update.message.reply_text(f"❌ PDF ist auf diesem Server nicht verfügbar. Versuche /buch {year} html")
+            return
+
+        processing_msg = await update.message.reply_text("📖 Erstelle das Buch...")
+        work_dir = tempfile.mkdtemp(prefix="buch_")
+        path = os.path.join(work_dir, f"erinnerungen-{year}.{fmt}")
+        try:
+            with metrics.stage("book_export"):
+                result = await self.book_exporter.aexport(year, fmt, path)
+            if not result.entries:
+                await processing_msg.edit_text(f"📭 Für {year} sind noch keine Erinnerungen gespeichert.")
+                return
+            with open(path, "rb") as f:
+                await update.message.reply_document(f, filename=os.path.basename(path), caption=result.summary())
+            await processing_msg.delete()
+        except Exception as e:
+            logger.error(f"FEHLER beim Buch-Export: {e}", exc_info=True)
+            metrics.record_error("book_export")
+            await processing_msg.edit_text("❌ Das Buch konnte gerade nicht erstellt werden.")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _collect_cache_metrics(self):
+        cache_events = metrics.gauge("bot_cache_events", "Treffer/Fehlschläge der Caches seit Start")
+        for cache in (self.processor.transcript_cache, self.processor.enhance_cache, self.summary_generator.cache,
+                      self.book_exporter.cache):
+            for event, value in cache.stats().items():
+                cache_events.set(value, {"cache": cache.namespace, "event": event})
 
     async def handle_voice_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if self.job_queue:
+            await self._enqueue_voice_message(update)
+            return
+
+        async def notify_queued(position: int):
+            await update.message.reply_text(
+                f"⏳ Gerade ist viel los. Deine Sprachnachricht ist auf Platz {position} der Warteschlange "
+                "und wird gleich verarbeitet.")
+
+        # Telegram stellt nach einem Absturz unbestätigte Updates erneut zu: die laufen schon über das Journal
+        journal_key = f"msg:{update.effective_chat.id}:{update.message.message_id}"
+        if journal_key in self._resumed_keys:
+            logger.info(f"Sprachnachricht {journal_key} wurde bereits aus dem Journal fortgesetzt.")
+            return
+        self._track_voice_task(asyncio.current_task())
+        # Vor dem ersten await in den Chat einreihen, sonst könnten zwei Nachrichten die Plätze tauschen
+        async with self.scheduler.slot(update.effective_chat.id, on_queued=notify_queued):
+            if await asyncio.to_thread(self.journal.exists, journal_key):
+                logger.info(f"Sprachnachricht {journal_key} wird bereits aus dem Journal fortgesetzt.")
+                return
+            # Ältere geparkte Nachrichten des Chats dürfen nicht überholt werden
+            if await asyncio.to_thread(self.parked_notes.has_chat, update.effective_chat.id):
+                await self._park_behind(update)
+                return
+            with metrics.stage("voice_message"):
+                await self._process_voice_message(update, journal_key)
+
+    async def _process_voice_message(self, update: Update, journal_key: str):
         user = update.message.from_user
         
         try:
             author_name = user.first_name
             
             processing_msg = await update.message.reply_text("🎤 Verarbeite deine Sprachnachricht...")
+            # Status-Updates laufen im Hintergrund; die Verarbeitung wartet nie auf sie
+            status = self.progress.reporter(processing_msg)
             voice = update.message.voice
-            
-            await processing_msg.edit_text("📥 Lade herunter...")
-            voice_file = await voice.get_file()
-            voice_data = BytesIO()
-            await voice_file.download_to_memory(voice_data)
-            voice_data.seek(0)
-            
-            await processing_msg.edit_text("🎯 Transkribiere...")
-            transcript = await self._transcribe_audio(voice_data)
-            if not transcript:
-                await processing_msg.edit_text("❌ Konnte nichts verstehen.")
-                return
-            
-            await processing_msg.edit_text("✨ Bereite Text auf...")
-            enhanced_text = await self._enhance_text(transcript)
-            
-            await processing_msg.edit_text("💾 Speichere...")
-            success = await self.sheets_manager.save_memory(transcript, enhanced_text, author_name)
-            
-            if success:
-                # +++ HIER IST DIE GEWÜNSCHTE ANTWORT-FORMATIERUNG +++
-                berlin_tz = pytz.timezone("Europe/Berlin")
-                now_berlin = datetime.now(berlin_tz)
-                
-                response_message = f"""✅ **Erinnerung von {author_name} erfolgreich gespeichert!**
-
-📝 **Original-Transkript:**
-_{transcript}_
-
-✨ **Aufbereitete Version:**
-{enhanced_text}
-
-📅 **Gespeichert am:** {now_berlin.strftime("%d.%m.%Y um %H:%M Uhr")}"""
-                
-                await processing_msg.edit_text(response_message, parse_mode='Markdown')
-            else:
-                # Die Fehlermeldung bleibt informativ
-                response_message = f"""⚠️ **Transkription erfolgreich, aber Speichern fehlgeschlagen**
-
-📝 **Original-Transkript:**
-_{transcript}_
-
-✨ **Aufbereitete Version:**
-{enhanced_text}
-
-❌ **Hinweis:** Die Erinnerung konnte nicht in der Google-Tabelle gespeichert werden. Prüfe die Logs in Render."""
-                await processing_msg.edit_text(response_message, parse_mode='Markdown')
+            entry = await asyncio.to_thread(self.journal.begin, journal_key, "inline", update.effective_chat.id,
+                                            processing_msg.message_id, voice.file_id, voice.file_unique_id,
+                                            author_name)
+            await self._run_journaled(entry, status)
 
         except Exception as e:
             logger.error(f"Fehler in handle_voice_message: {e}", exc_info=True)
+            metrics.record_error("voice_message")
             await update.message.reply_text("❌ Ein unerwarteter Fehler ist aufgetreten.")
-    async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text("📝 Ich verstehe nur Sprachnachrichten! 🎤")
 
-    async def _transcribe_audio(self, audio_data: BytesIO) -> Optional[str]:
+    async def _run_journaled(self, entry: JournalEntry, status):
         """
-        Transkribiert eine Audiodatei mit Groq unter Verwendung des Whisper-Modells.
+        Verarbeitet eine Sprachnachricht mit Checkpoints im Journal. Abgeschlossene, geparkte oder
+        gescheiterte Nachrichten verlassen das Journal; nur ein Abbruch (Beenden) lässt sie stehen.
         """
-        if not self.groq_client:
-            logger.warning("Transkription übersprungen, da der Groq-Client nicht initialisiert wurde.")
-            return None
-
         try:
-            logger.info("Sende Audiodatei zur Transkription an Groq (Whisper)...")
-            
-            # Wichtig: Wir müssen sicherstellen, dass die BytesIO-Daten einen Dateinamen haben,
-            # damit die Groq-API den Dateityp erkennen kann.
-            audio_data.name = "voice_message.ogg"
+            await self.processor.run(entry.file_id, entry.file_unique_id, entry.author, status, journal_entry=entry)
+        except CircuitOpenError as e:
+            # Groq ist gestört: Nachricht parken statt verwerfen, sie wird später automatisch verarbeitet
+            logger.warning(f"Sprachnachricht geparkt: {e}")
+            await asyncio.to_thread(self.parked_notes.park, entry.chat_id, entry.status_message_id,
+                                    entry.file_id, entry.file_unique_id, entry.author)
+            status.finish("⏸️ Die Transkription ist gerade nicht erreichbar. Deine Sprachnachricht ist "
+                          "gesichert und wird automatisch verarbeitet, sobald der Dienst wieder läuft.")
+        except Exception:
+            await asyncio.to_thread(self.journal.finish, entry.id)
+            raise
+        await asyncio.to_thread(self.journal.finish, entry.id)
 
-            # Die Groq-API erwartet ein Tupel: (Dateiname, Audiodaten)
-            transcription = self.groq_client.audio.transcriptions.create(
-                file=(audio_data.name, audio_data.read()),
-                model="whisper-large-v3",
-                response_format="json", # Stellt sicher, dass wir eine saubere Antwort bekommen
-                language="de" # Wichtig: Wir geben die Sprache an, um die Genauigkeit zu maximieren
-            )
+    async def _park_behind(self, update: Update):
+        voice = update.message.voice
+        processing_msg = await update.message.reply_text(
+            "⏸️ Deine Sprachnachricht ist gesichert und wird nach deinen vorherigen Nachrichten verarbeitet.")
+        await asyncio.to_thread(self.parked_notes.park, update.effective_chat.id, processing_msg.message_id,
+                                voice.file_id, voice.file_unique_id, update.message.from_user.first_name)
 
-            logger.info("✅ Transkription von Groq erfolgreich erhalten.")
-            return transcription.text.strip()
+    async def _resume_chat(self, chat_id: int, entries: List[JournalEntry], reserved: asyncio.Event):
+        """Setzt die unterbrochenen Nachrichten eines Chats der Reihe nach fort und hält den Chat so lange."""
+        try:
+            async with self.scheduler.slot(chat_id, on_reserved=reserved.set):
+                for entry in entries:
+                    await self._resume_journal_entry(entry)
+        finally:
+            reserved.set()
 
+    async def _resume_journal_entry(self, entry: JournalEntry):
+        """Setzt eine beim letzten Beenden unterbrochene Sprachnachricht an ihrer letzten Stufe fort (im Slot von _resume_chat)."""
+        status = self.progress.reporter(EditableMessage(self.application.bot, entry.chat_id, entry.status_message_id))
+        resumes = await asyncio.to_thread(self.journal.mark_resumed, entry.id)
+        if resumes > JOURNAL_MAX_RESUMES:
+            logger.error(f"Journal-Eintrag {entry.id} nach {JOURNAL_MAX_RESUMES} Fortsetzungen aufgegeben.")
+            await asyncio.to_thread(self.journal.finish, entry.id)
+            status.finish("❌ Deine Sprachnachricht konnte leider nicht verarbeitet werden. Bitte sende sie erneut.")
+            return
+        logger.info(f"Setze Sprachnachricht aus dem Journal fort (Eintrag {entry.id}, Stufe '{entry.stage}').")
+        status.update("🔄 Der Bot wurde neu gestartet, deine Sprachnachricht wird weiter verarbeitet...")
+        try:
+            with metrics.stage("voice_message"):
+                await self._run_journaled(entry, status)
         except Exception as e:
-            logger.error(f"Fehler bei der Transkription mjt Groq: {e}", exc_info=True)
-            return None
+            logger.error(f"Fehler beim Fortsetzen von Journal-Eintrag {entry.id}: {e}", exc_info=True)
+            metrics.record_error("voice_message")
+            status.finish("❌ Ein unerwarteter Fehler ist aufgetreten.")
 
-    async def _enhance_text(self, text: str) -> str:
-        if not self.groq_client:
-            logger.warning("Text-Verbesserung übersprungen, da Groq-Client nicht initialisiert.")
-            return text
+    def _track_voice_task(self, task: asyncio.Task):
+        self._voice_tasks.add(task)
+        task.add_done_callback(self._voice_tasks.discard)
+
+    async def _drain_on_stop(self):
+        """PTB wartet beim Beenden ohne Frist auf laufende Handler; sobald die Application stoppt, gilt die Frist."""
+        while not self.application.running:
+            await asyncio.sleep(0.5)
+        while self.application.running:
+            await asyncio.sleep(0.5)
+        await self._drain_voice_tasks()
+
+    async def _drain_voice_tasks(self):
+        """
+        Laufende Sprachnachrichten bekommen ab Beginn des Beendens VOICE_DRAIN_SECONDS. Was dann noch
+        läuft, wird abgebrochen und beim nächsten Start aus dem Journal fortgesetzt.
+        """
+        if self._drain_deadline is None:
+            self._drain_deadline = time.monotonic() + VOICE_DRAIN_SECONDS
+        tasks = {task for task in self._voice_tasks if not task.done()}
+        if not tasks:
+            return
+        remaining = max(self._drain_deadline - time.monotonic(), 0)
+        logger.info(f"Warte bis zu {remaining:.0f}s auf {len(tasks)} laufende Sprachnachricht(en)...")
+        _, pending = await asyncio.wait(tasks, timeout=remaining) if remaining > 0 else (set(), tasks)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending, timeout=1.0)
+            logger.warning(f"{len(pending)} Sprachnachricht(en) abgebrochen; sie werden nach dem Neustart "
+                           "an ihrer letzten Stufe fortgesetzt.")
+
+    async def _resume_parked_note(self, note: ParkedNote):
+        """Verarbeitet eine geparkte Sprachnachricht und aktualisiert ihre ursprüngliche Status-Nachricht."""
+        status = self.progress.reporter(EditableMessage(self.application.bot, note.chat_id, note.status_message_id))
+        async with self.scheduler.slot(note.chat_id):
+            with metrics.stage("voice_message"):
+                await self.processor.run(note.file_id, note.file_unique_id, note.author, status)
+
+    async def _enqueue_voice_message(self, update: Update):
+        """Warteschlangen-Modus: nur annehmen und einreihen, die Antwort schickt später ein Worker."""
         try:
-            prompt = f"""**Aufgabe:**
-            Du bist ein Assistant der einen diktierten Tagebucheintrag an Ellie (die Tochter) stilistisch überarbeitet. Deine Aufgabe ist es, den Text flüssiger und angenehmer lesbar zu machen ohne den Inhalt oder die Kernaussage zu verändern.
-            Der Grundton des Textes soll immer optimistisch und liebevoll sein.
-            Befolge diese Regeln strikt:
-            1.  **SPRACHE:** Deine Antwort MUSS ausschließlich auf Deutsch sein. Antworte unter keinen Umständen auf Englisch.
-            2.  **INHALT:** Du erhältst einen Rohtext, der wie ein spontanes Gespräch, Transkript oder Mitschnitt wirkt.
-Schreibe daraus einen flüssigen Fließtext in in einem flüssigen, erzählerischen Stil.
-
-Anforderungen:
-	1.	Behalte den Inhalt und die Kernaussagen vollständig bei. Erfinde keine Story dazu!
-    2.  Halte dich exakt an dkie Zeitabfolge des Originals. Erfinde keine Zeitsprünge dazu.
-    3.  Glätte Formulierungen, entferne unnötige Wiederholungen, korrigiere zeitliche Abfolgen und fasse abgehackte Sätze sinnvoll zusammen.
-	4.	Strukturiere Dialoge sauber mit korrekten deutschen Anführungszeichen („…“) und füge Sprecherhinweise ein, wo passend.
-	5.	Schreibe aus der Perspektive des Autors der direkt an den Empfänger spricht (Du-Form)
-	6.	Halte Erzählperspektive, Rechtschreibung und Grammatik durchgehend korrekt.
-            3.  **FORMAT:** Gib NUR den reinen, verbesserten Text des Tagebucheintrags zurück. Verwende keine Anführungszeichen am Anfang oder Ende des gesamten Textes. KEINE Einleitungen, Keine Grusformel, KEINE Kommentare, Schweife nicht aus!
-
-            **Original-Transkript:**"{text}" """
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.3
-            )
-            enhanced_text = chat_completion.choices[0].message.content.strip()
-            logger.info("✅ Text erfolgreich mit Groq/Llama3 verbessert.")
-            return enhanced_text if enhanced_text else text
+            voice = update.message.voice
+            processing_msg = await update.message.reply_text("🎤 Sprachnachricht angenommen, sie wird gleich verarbeitet...")
+            job_id = await asyncio.to_thread(
+                self.job_queue.enqueue, update.effective_chat.id, processing_msg.message_id,
+                voice.file_id, voice.file_unique_id, update.message.from_user.first_name)
+            position = await asyncio.to_thread(self.job_queue.position, job_id)
+            if position > 0:
+                await processing_msg.edit_text(
+                    f"⏳ Deine Sprachnachricht ist auf Platz {position + 1} der Warteschlange und wird gleich verarbeitet.")
         except Exception as e:
-            logger.error(f"FEHLER bei der Text-Verbesserung mit Groq: {e}", exc_info=True)
-            return text
+            logger.error(f"Fehler beim Einreihen der Sprachnachricht: {e}", exc_info=True)
+            metrics.record_error("enqueue")
+            await update.message.reply_text("❌ Ein unerwarteter Fehler ist aufgetreten.")
 
-    def run(self):
-        logger.info("Starte run_polling...")
-        self.application.run_polling()
+    async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.message.reply_text("📝 Ich verstehe nur Sprachnachrichten! 🎤")
+
+    def run(self, wsgi_app=None):
+        """Blockiert bis zum Beenden. `wsgi_app` (Benutzer-API) bedient im Webhook-Modus derselbe Server."""
+        if BOT_MODE == 'webhook':
+            from webhook_server import run_webhook
+            logger.info("Starte Webhook-Server...")
+            asyncio.run(run_webhook(self, wsgi_app))
+        else:
+            logger.info("Starte run_polling...")
+            self.application.run_polling()
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from book_export import BookEntry, month_hash, render_html_month, render_markdown_month
+from summary_generator import month_label
+
+
+def entry(entry_id="e1", text="Erster Absatz.\n\nZweiter Absatz.", day=3):
+    return BookEntry(entry_id, "Mama", datetime(2025, 3, day, 18, 30), text)
+
+
+def test_month_label():
+    assert month_label("2025-03") == "März 2025"
+    assert month_label("2024-12") == "Dezember 2024"
+
+
+def test_heading():
+    assert entry().heading == "Montag, 3. März 2025 · 18:30 · Mama"
+
+
+def test_month_hash_is_stable_and_content_sensitive():
+    base = [entry(), entry("e2", "Noch ein Tag.", day=4)]
+    assert month_hash(base) == month_hash([entry(), entry("e2", "Noch ein Tag.", day=4)])
+    assert month_hash(base) != month_hash([entry(), entry("e2", "Noch ein Tag!", day=4)])
+    assert month_hash(base) != month_hash(base[:1])
+    assert month_hash(base) != month_hash(list(reversed(base)))
+
+
+def test_render_markdown_month():
+    text = render_markdown_month("2025-03", [entry()])
+    assert text.startswith("## März 2025\n")
+    assert "### Montag, 3. März 2025 · 18:30 · Mama" in text
+    assert "Erster Absatz.\n" in text and "Zweiter Absatz.\n" in text
+
+
+def test_render_html_month_escapes_text():
+    html = render_html_month("2025-03", [entry(text="<b>Ellie</b> & Papa")])
+    assert '<section id="m2025-03">' in html
+    assert "<h2>März 2025</h2>" in html
+    assert "<p>&lt;b&gt;Ellie&lt;/b&gt; &amp; Papa</p>" in html
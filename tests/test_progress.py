@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from progress import TokenBucket
+
+
+def test_burst_then_rate_limited():
+    async def scenario():
+        bucket = TokenBucket(rate=20.0, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(2):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.02
+    assert 0.09 <= total < 0.3
+
+
+def test_penalize_adds_the_given_seconds_before_the_next_token():
+    async def scenario():
+        bucket = TokenBucket(rate=10.0, capacity=3)
+        bucket.penalize(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    waited = asyncio.run(scenario())
+    assert 0.25 <= waited < 0.5
@@ -0,0 +1,167 @@
+import asyncio
+import random
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from resilience import (CircuitBreaker, CircuitOpenError, _breakers, backoff_delay, get_breaker, is_transient,
+                        resilient_call, retry_after_seconds, status_code_of)
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code=None, headers=None, on_response=False):
+        super().__init__(f"HTTP {status_code}")
+        response = SimpleNamespace(headers=headers or {})
+        if on_response:
+            response.status_code = status_code
+        else:
+            self.status_code = status_code
+        self.response = response
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    random.seed(3)
+    for attempt in range(1, 12):
+        ceiling = min(4.0, 0.5 * 2 ** (attempt - 1))
+        delays = [backoff_delay(attempt, base=0.5, cap=4.0) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+def test_status_code_from_exception_or_response():
+    assert status_code_of(HTTPError(503)) == 503
+    assert status_code_of(HTTPError(429, on_response=True)) == 429
+    assert status_code_of(ValueError("kein HTTP")) is None
+
+
+def test_retry_after_seconds_and_http_date():
+    assert retry_after_seconds(HTTPError(429, {"Retry-After": "7"})) == 7.0
+    assert retry_after_seconds(HTTPError(429, {"retry-after": "-3"})) == 0.0
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= retry_after_seconds(HTTPError(503, {"Retry-After": when})) <= 30
+    assert retry_after_seconds(HTTPError(429, {"Retry-After": "bald"})) is None
+    assert retry_after_seconds(HTTPError(429)) is None
+
+
+def test_is_transient():
+    assert is_transient(asyncio.TimeoutError())
+    assert is_transient(ConnectionResetError())
+    assert is_transient(HTTPError(429))
+    assert is_transient(HTTPError(502, on_response=True))
+    assert not is_transient(HTTPError(400))
+    assert not is_transient(ValueError())
+
+
+def test_breaker_transitions():
+    breaker = CircuitBreaker("transitions", failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert 0 < breaker.retry_in() <= 0.05
+
+    breaker._opened_at -= 1
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # nur ein Testaufruf gleichzeitig
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    breaker._opened_at -= 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+@pytest.fixture
+def breaker():
+    breaker = _breakers["test"] = CircuitBreaker("test", failure_threshold=1, reset_seconds=0)
+    yield breaker
+    _breakers.pop("test", None)
+
+
+def open_half(breaker):
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_probe_releases_the_breaker(breaker):
+    open_half(breaker)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        probe = asyncio.create_task(resilient_call(hang, backend="test", timeout=60))
+        await started.wait()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+
+        return await resilient_call(ok, backend="test", timeout=1)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert get_breaker("test").state == CircuitBreaker.CLOSED
+
+
+def test_caller_timeout_on_probe_releases_the_breaker(breaker):
+    open_half(breaker)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(resilient_call(hang, backend="test", timeout=60), 0.05)
+        assert breaker.is_available()
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_rejects_without_calling():
+    breaker = _breakers["test-open"] = CircuitBreaker("test-open", failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    calls = []
+
+    async def func():
+        calls.append(1)
+
+    try:
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(resilient_call(func, backend="test-open", timeout=1))
+    finally:
+        _breakers.pop("test-open", None)
+    assert calls == []
+
+
+def test_transient_errors_are_retried_and_client_errors_are_not():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HTTPError(429, {"Retry-After": "0"})
+        return "ok"
+
+    async def bad_request():
+        attempts.append(1)
+        raise HTTPError(400)
+
+    try:
+        assert asyncio.run(resilient_call(flaky, backend="test-retry", timeout=1, max_attempts=3)) == "ok"
+        assert len(attempts) == 3
+        attempts.clear()
+        with pytest.raises(HTTPError):
+            asyncio.run(resilient_call(bad_request, backend="test-retry", timeout=1, max_attempts=3))
+        assert len(attempts) == 1
+        assert get_breaker("test-retry").state == CircuitBreaker.CLOSED
+    finally:
+        _breakers.pop("test-retry", None)
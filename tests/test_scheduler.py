@@ -0,0 +1,76 @@
+import asyncio
+
+from scheduler import ChatScheduler
+
+
+def test_same_chat_runs_in_order_and_chats_run_in_parallel():
+    async def scenario():
+        scheduler = ChatScheduler(max_in_flight=4)
+        log, running, peak = [], set(), [0]
+
+        async def note(chat, number):
+            async with scheduler.slot(chat):
+                running.add((chat, number))
+                peak[0] = max(peak[0], len(running))
+                await asyncio.sleep(0.01)
+                log.append((chat, number))
+                running.discard((chat, number))
+
+        await asyncio.gather(*(note(chat, number) for number in range(3) for chat in (1, 2)))
+        return log, peak[0]
+
+    log, peak = asyncio.run(scenario())
+    assert [number for chat, number in log if chat == 1] == [0, 1, 2]
+    assert [number for chat, number in log if chat == 2] == [0, 1, 2]
+    assert peak == 2
+
+
+def test_global_cap_queues_in_fifo_order():
+    async def scenario():
+        scheduler = ChatScheduler(max_in_flight=1)
+        started, positions = [], []
+
+        async def queued(position):
+            positions.append(position)
+
+        async def note(chat):
+            async with scheduler.slot(chat, on_queued=queued):
+                started.append(chat)
+                assert scheduler.in_flight == 1
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(note(chat) for chat in range(4)))
+        return scheduler, started, positions
+
+    scheduler, started, positions = asyncio.run(scenario())
+    assert started == [0, 1, 2, 3]
+    assert positions == [1, 2, 3]
+    assert scheduler.in_flight == 0 and scheduler.queue_depth == 0
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        scheduler = ChatScheduler(max_in_flight=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        async def waiter(chat):
+            async with scheduler.slot(chat):
+                return chat
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(waiter(2))
+        later = asyncio.create_task(waiter(3))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        await first
+        assert await later == 3
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.in_flight == 0
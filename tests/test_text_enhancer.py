@@ -0,0 +1,55 @@
+import random
+
+from text_enhancer import split_into_chunks, split_sentences
+
+
+def test_split_sentences_keeps_punctuation():
+    assert split_sentences("  Heute war schön! Wir waren im Zoo. Und dann?  ") == [
+        "Heute war schön!", "Wir waren im Zoo.", "Und dann?"]
+
+
+def test_split_sentences_without_punctuation_is_one_sentence():
+    assert split_sentences("und dann sind wir noch zum see gefahren") == ["und dann sind wir noch zum see gefahren"]
+
+
+def chunk_texts(text, max_chars):
+    return [" ".join(chunk) for chunk in split_into_chunks(text, max_chars)]
+
+
+def test_unpunctuated_text_stays_within_limit():
+    rng = random.Random(7)
+    text = " ".join("".join(rng.choice("abcdefgh") for _ in range(rng.randint(1, 12))) for _ in range(2000))
+    chunks = chunk_texts(text, 500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_exact_length_sentence_followed_by_oversized_sentence():
+    exact = "a" * 98 + "."
+    oversized = " ".join(["wort"] * 200)
+    text = f"{exact} {oversized}"
+    chunks = chunk_texts(text, 99)
+    assert chunks[0] == exact
+    assert all(len(chunk) <= 99 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_random_texts_never_exceed_limit():
+    rng = random.Random(1)
+    for _ in range(300):
+        max_chars = rng.choice([20, 50, 100, 500])
+        text = ""
+        for _ in range(rng.randint(1, 400)):
+            word = "".join(rng.choice("abcdef") for _ in range(rng.randint(1, 12)))
+            text += word + rng.choice([" "] * 10 + [". ", "\n\n"])
+        assert all(len(chunk) <= max_chars for chunk in chunk_texts(text, max_chars))
+
+
+def test_paragraph_end_closes_chunk():
+    text = "Erster Satz. Zweiter Satz.\n\nDritter Satz."
+    assert split_into_chunks(text, 30) == [["Erster Satz.", "Zweiter Satz."], ["Dritter Satz."]]
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("Kurz. Und gut.", 500) == [["Kurz.", "Und gut."]]
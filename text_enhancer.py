@@ -0,0 +1,216 @@
+# text_enhancer.py - Stilistische Aufbereitung der Transkripte mit Groq (Llama)
+
+import os
+import re
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from cache import TwoTierCache, sha256_text
+from resilience import resilient_call
+
+logger = logging.getLogger(__name__)
+
+ENHANCE_MODEL = os.getenv('ENHANCE_MODEL', 'llama-3.1-8b-instant')
+# Bei jeder Änderung am Aufbereitungs-Prompt erhöhen: alte Cache-Einträge greifen dann nicht mehr
+# und reenhance.py bereitet die bestehenden Einträge neu auf
+ENHANCE_PROMPT_VERSION = "1"
+GROQ_ENHANCE_TIMEOUT = float(os.getenv('GROQ_ENHANCE_TIMEOUT', '60'))
+# Längere Transkripte werden in Abschnitte zerlegt und parallel aufbereitet (Ausgabe-Token-Limit, Latenz)
+ENHANCE_LONG_TEXT_CHARS = int(os.getenv('ENHANCE_LONG_TEXT_CHARS', '4000'))
+ENHANCE_CHUNK_CHARS = int(os.getenv('ENHANCE_CHUNK_CHARS', '2500'))
+# Anzahl Sätze des vorherigen Abschnitts, die einem Abschnitt als Kontext mitgegeben werden
+ENHANCE_CHUNK_OVERLAP_SENTENCES = int(os.getenv('ENHANCE_CHUNK_OVERLAP_SENTENCES', '2'))
+# Sätze je Seite einer Nahtstelle, die im abschließenden Glättungsschritt überarbeitet werden
+ENHANCE_SEAM_SENTENCES = 2
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+ENHANCE_PROMPT = """**Aufgabe:**
+            Du bist ein Assistant der einen diktierten Tagebucheintrag an Ellie (die Tochter) stilistisch überarbeitet. Deine Aufgabe ist es, den Text flüssiger und angenehmer lesbar zu machen ohne den Inhalt oder die Kernaussage zu verändern.
+            Der Grundton des Textes soll immer optimistisch und liebevoll sein.
+            Befolge diese Regeln strikt:
+            1.  **SPRACHE:** Deine Antwort MUSS ausschließlich auf Deutsch sein. Antworte unter keinen Umständen auf Englisch.
+            2.  **INHALT:** Du erhältst einen Rohtext, der wie ein spontanes Gespräch, Transkript oder Mitschnitt wirkt.
+Schreibe daraus einen flüssigen Fließtext in in einem flüssigen, erzählerischen Stil.
+
+Anforderungen:
+	1.	Behalte den Inhalt und die Kernaussagen vollständig bei. Erfinde keine Story dazu!
+    2.  Halte dich exakt an dkie Zeitabfolge des Originals. Erfinde keine Zeitsprünge dazu.
+    3.  Glätte Formulierungen, entferne unnötige Wiederholungen, korrigiere zeitliche Abfolgen und fasse abgehackte Sätze sinnvoll zusammen.
+	4.	Strukturiere Dialoge sauber mit korrekten deutschen Anführungszeichen („…“) und füge Sprecherhinweise ein, wo passend.
+	5.	Schreibe aus der Perspektive des Autors der direkt an den Empfänger spricht (Du-Form)
+	6.	Halte Erzählperspektive, Rechtschreibung und Grammatik durchgehend korrekt.
+            3.  **FORMAT:** Gib NUR den reinen, verbesserten Text des Tagebucheintrags zurück. Verwende keine Anführungszeichen am Anfang oder Ende des gesamten Textes. KEINE Einleitungen, Keine Grusformel, KEINE Kommentare, Schweife nicht aus!
+
+            **Original-Transkript:**"{text}" """
+
+
+CHUNK_NOTE = """Hinweis: Der Tagebucheintrag ist lang und wird abschnittsweise überarbeitet. Dies ist Abschnitt {index} von {total}.
+Überarbeite NUR das Original-Transkript am Ende. Füge keine Einleitung, Überleitung oder Zusammenfassung hinzu.
+{context}
+"""
+
+CHUNK_CONTEXT = """Zum Verständnis (NICHT überarbeiten und NICHT ausgeben) – so endete der vorherige Abschnitt: "{previous}"
+"""
+
+SEAM_PROMPT = """Die folgenden zwei Textstücke stammen aus einem Tagebucheintrag an Ellie und folgen direkt aufeinander.
+Sie wurden getrennt überarbeitet. Glätte den Übergang: entferne Wiederholungen an der Nahtstelle und passe
+Anschlüsse an, damit der Text flüssig weiterläuft. Ändere keinen Inhalt, behalte die Reihenfolge bei, erfinde nichts.
+Gib NUR den geglätteten Text (Ende des ersten und Anfang des zweiten Stücks) zurück, ohne Kommentare.
+
+Erstes Stück (Ende):
+{before}
+
+Zweites Stück (Anfang):
+{after}"""
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in SENTENCE_END_RE.split(text.strip()) if sentence]
+
+
+def split_into_chunks(text: str, max_chars: int = ENHANCE_CHUNK_CHARS) -> List[List[str]]:
+    """
+    Zerlegt einen Text an Absatz- und Satzgrenzen in Abschnitte von höchstens `max_chars` Zeichen.
+    Jeder Abschnitt ist eine Liste von Sätzen; ein Absatzende beendet bevorzugt einen Abschnitt.
+    """
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    length = 0
+    for paragraph in PARAGRAPH_RE.split(text.strip()):
+        sentences = split_sentences(paragraph)
+        if current and length + len(paragraph) > max_chars:
+            chunks.append(current)
+            current, length = [], 0
+        for sentence in sentences:
+            # Überlange "Sätze" (Whisper setzt manchmal kaum Punkte) an Wortgrenzen teilen
+            while len(sentence) > max_chars:
+                # Ist der laufende Abschnitt schon voll, wäre die Grenze <= 0 (rfind zählte dann vom Ende)
+                room = max_chars - length
+                cut = sentence.rfind(" ", 0, room) if room > 0 else -1
+                if cut <= 0:
+                    if current:
+                        chunks.append(current)
+                        current, length = [], 0
+                        continue
+                    cut = max_chars
+                current.append(sentence[:cut].strip())
+                chunks.append(current)
+                current, length = [], 0
+                sentence = sentence[cut:].strip()
+            if current and length + len(sentence) + 1 > max_chars:
+                chunks.append(current)
+                current, length = [], 0
+            current.append(sentence)
+            length += len(sentence) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def prompt_version() -> str:
+    """Kennung für Prompt und Modell, wie sie in der Spalte "Prompt-Version" steht."""
+    return f"{ENHANCE_PROMPT_VERSION}/{ENHANCE_MODEL}"
+
+
+class TextEnhancer:
+    """Bereitet ein Transkript mit einem Groq-Aufruf auf; Ergebnisse werden nach Text, Prompt-Version und Modell gecacht."""
+
+    def __init__(self, groq_client=None, semaphore: Optional[asyncio.Semaphore] = None,
+                 cache: Optional[TwoTierCache] = None):
+        self.groq_client = groq_client
+        self.semaphore = semaphore or asyncio.Semaphore(4)
+        self.cache = cache
+
+    async def enhance(self, text: str) -> str:
+        """Gibt den aufbereiteten Text zurück (bei leerer Antwort das Original). Fehler werden weitergereicht."""
+        cache_key = f"{sha256_text(text)}:{ENHANCE_PROMPT_VERSION}:{ENHANCE_MODEL}"
+        cached = await self.cache.aget(cache_key) if self.cache else None
+        if cached:
+            logger.info("Aufbereiteter Text aus dem Cache übernommen.")
+            return cached
+
+        if len(text) > ENHANCE_LONG_TEXT_CHARS:
+            enhanced_text = await self._enhance_long(text)
+        else:
+            # Schneller Weg für normale Sprachnachrichten: ein einziger Aufruf
+            enhanced_text = await self._complete(ENHANCE_PROMPT.format(text=text))
+        logger.info("✅ Text erfolgreich mit Groq/Llama3 verbessert.")
+        if not enhanced_text:
+            return text
+        if self.cache:
+            await self.cache.aset(cache_key, enhanced_text)
+        return enhanced_text
+
+    async def _enhance_long(self, text: str) -> str:
+        """
+        Langer Text: Abschnitte an Satz-/Absatzgrenzen, jeweils mit dem Ende des vorherigen Abschnitts
+        als Kontext, parallel aufbereitet und in Originalreihenfolge zusammengesetzt. Danach werden die
+        Nahtstellen in einem eigenen, kurzen Aufruf je Übergang geglättet.
+        """
+        chunks = split_into_chunks(text)
+        if len(chunks) == 1:
+            return await self._complete(ENHANCE_PROMPT.format(text=" ".join(chunks[0])))
+        logger.info(f"Langer Text ({len(text)} Zeichen): Aufbereitung in {len(chunks)} Abschnitten.")
+
+        prompts = []
+        for index, sentences in enumerate(chunks):
+            context = ""
+            if index and ENHANCE_CHUNK_OVERLAP_SENTENCES:
+                previous = " ".join(chunks[index - 1][-ENHANCE_CHUNK_OVERLAP_SENTENCES:])
+                context = CHUNK_CONTEXT.format(previous=previous)
+            note = CHUNK_NOTE.format(index=index + 1, total=len(chunks), context=context)
+            prompts.append(note + ENHANCE_PROMPT.format(text=" ".join(sentences)))
+        parts = await asyncio.gather(*(self._complete(prompt) for prompt in prompts))
+        # Leere Antworten: Original-Abschnitt übernehmen, damit nichts verloren geht
+        parts = [part or " ".join(original) for part, original in zip(parts, chunks)]
+        return await self._smooth_seams(parts)
+
+    async def _smooth_seams(self, parts: List[str]) -> str:
+        """Überarbeitet je Übergang die letzten/ersten Sätze; bei Fehlern bleibt die Naht unverändert."""
+        # Je Teil die Zeichenposition, an der der Kopf endet bzw. der Schwanz beginnt. Kopf und
+        # Schwanz überschneiden sich nie; Absätze innerhalb eines Teils bleiben erhalten.
+        cuts: List[Tuple[int, int]] = []
+        for index, part in enumerate(parts):
+            boundaries = [0] + [m.end() for m in SENTENCE_END_RE.finditer(part)] + [len(part)]
+            count = len(boundaries) - 1
+            head = 0 if index == 0 else min(ENHANCE_SEAM_SENTENCES, count // 2)
+            tail = 0 if index == len(parts) - 1 else min(ENHANCE_SEAM_SENTENCES, count - head)
+            cuts.append((boundaries[head], boundaries[count - tail]))
+
+        async def seam(index: int) -> str:
+            before = parts[index][cuts[index][1]:].strip()
+            after = parts[index + 1][:cuts[index + 1][0]].strip()
+            unchanged = f"{before} {after}".strip()
+            try:
+                smoothed = await self._complete(SEAM_PROMPT.format(before=before, after=after), temperature=0.2)
+            except Exception as e:
+                logger.warning(f"Glätten der Nahtstelle {index + 1} fehlgeschlagen, bleibt unverändert: {e}")
+                return unchanged
+            # Schutz vor Ausreißern: deutlich kürzere/längere Antworten verwerfen
+            if not smoothed or not 0.6 * len(unchanged) <= len(smoothed) <= 1.5 * len(unchanged):
+                return unchanged
+            return smoothed
+
+        seams = await asyncio.gather(*(seam(index) for index in range(len(parts) - 1)))
+        pieces = []
+        for index, part in enumerate(parts):
+            middle = part[cuts[index][0]:cuts[index][1]].strip()
+            if middle:
+                pieces.append(middle)
+            if index < len(seams):
+                pieces.append(seams[index])
+        return " ".join(pieces)
+
+    async def _complete(self, prompt: str, temperature: float = 0.3) -> str:
+        async def call():
+            async with self.semaphore:
+                return await self.groq_client.chat.completions.create(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=ENHANCE_MODEL,
+                    temperature=temperature
+                )
+        chat_completion = await resilient_call(call, backend="groq", timeout=GROQ_ENHANCE_TIMEOUT)
+        return chat_completion.choices[0].message.content.strip()
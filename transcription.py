@@ -0,0 +1,316 @@
+# transcription.py - Austauschbare Transkriptions-Backends (Groq, lokales Whisper, Attrappe) und Auswahl pro Abschnitt
+
+import os
+import abc
+import time
+import struct
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from metrics import metrics
+from resilience import CircuitOpenError, get_breaker, resilient_call
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+# Kommagetrennt; die Reihenfolge entscheidet bei gleicher erwarteter Dauer (z.B. "groq,local" oder "stub")
+TRANSCRIPTION_BACKENDS = os.getenv('TRANSCRIPTION_BACKENDS', 'groq')
+TRANSCRIPTION_LANGUAGE = os.getenv('TRANSCRIPTION_LANGUAGE', 'de')
+GROQ_TRANSCRIBE_TIMEOUT = float(os.getenv('GROQ_TRANSCRIBE_TIMEOUT', '120'))
+TRANSCRIPTION_MODEL = "whisper-large-v3"
+
+# Lokale Engine (optional: pip install faster-whisper); das Modell wird einmal geladen und bleibt im Speicher
+LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'small')
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv('LOCAL_WHISPER_COMPUTE_TYPE', 'int8')
+LOCAL_WHISPER_THREADS = int(os.getenv('LOCAL_WHISPER_THREADS', str(os.cpu_count() or 1)))
+# Längere Abschnitte gehen nicht an die lokale Engine, sie wäre dafür auf der CPU zu langsam
+LOCAL_WHISPER_MAX_SECONDS = float(os.getenv('LOCAL_WHISPER_MAX_SECONDS', '300'))
+
+STUB_TRANSCRIPT = os.getenv('STUB_TRANSCRIPT', '')
+STUB_LATENCY_SECONDS = float(os.getenv('STUB_LATENCY_SECONDS', '0'))
+
+# Grobe Schätzung für Dateien, deren Länge sich nicht aus dem Container lesen lässt (Opus ~24-32 kbit/s)
+FALLBACK_BYTES_PER_SECOND = 4000
+
+
+@dataclass
+class BackendCapabilities:
+    """Was ein Backend kann und wie schnell es erfahrungsgemäß ist (Startwerte, werden im Betrieb nachgeführt)."""
+    local: bool
+    max_concurrency: int
+    overhead_seconds: float          # feste Kosten pro Aufruf (Upload, Netz, Modellaufruf)
+    seconds_per_audio_second: float  # Rechenzeit pro Sekunde Audio (Real-Time-Faktor)
+    max_audio_seconds: Optional[float] = None
+    languages: tuple = ("de",)
+
+
+class TranscriptionBackend(abc.ABC):
+    """
+    Schnittstelle eines Transkriptions-Backends.
+
+    `transcribe()` gibt den Text zurück, None bei einem Fehler (ohne Wiederholung durch den Router)
+    oder wirft CircuitOpenError, wenn der Dienst gerade gesperrt ist. Die beobachtete Dauer wird
+    als gleitender Mittelwert gemessen und fließt in `estimate()` ein.
+    """
+
+    name = "backend"
+
+    def __init__(self, capabilities: BackendCapabilities):
+        self.capabilities = capabilities
+        self.in_flight = 0
+        self.realtime_factor = capabilities.seconds_per_audio_second
+
+    def is_healthy(self) -> bool:
+        return True
+
+    def supports(self, audio_seconds: float) -> bool:
+        limit = self.capabilities.max_audio_seconds
+        return (limit is None or audio_seconds <= limit) and TRANSCRIPTION_LANGUAGE in self.capabilities.languages
+
+    def estimate(self, audio_seconds: float) -> float:
+        """Erwartete Sekunden bis zum Ergebnis, inklusive Wartezeit hinter bereits laufenden Aufrufen."""
+        own = self.capabilities.overhead_seconds + audio_seconds * self.realtime_factor
+        rounds_waiting = self.in_flight // max(self.capabilities.max_concurrency, 1)
+        return own * (rounds_waiting + 1)
+
+    async def warm_up(self):
+        """Wird beim Start aufgerufen (z.B. um ein Modell zu laden)."""
+
+    async def transcribe(self, audio_path: str, audio_seconds: float) -> Optional[str]:
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            text = await self._transcribe(audio_path)
+        finally:
+            self.in_flight -= 1
+        if text and audio_seconds > 0:
+            observed = max(time.perf_counter() - started - self.capabilities.overhead_seconds, 0.0) / audio_seconds
+            self.realtime_factor = 0.8 * self.realtime_factor + 0.2 * observed
+        return text
+
+    @abc.abstractmethod
+    async def _transcribe(self, audio_path: str) -> Optional[str]:
+        """Eigentlicher Aufruf des Backends; Messung und Zählung übernimmt `transcribe()`."""
+
+
+class GroqBackend(TranscriptionBackend):
+    """Whisper large-v3 über die Groq-API. Der Client wird nachträglich gesetzt (Schnellstart)."""
+
+    name = "groq"
+
+    def __init__(self, semaphore: asyncio.Semaphore, max_concurrency: int):
+        super().__init__(BackendCapabilities(local=False, max_concurrency=max_concurrency, overhead_seconds=0.8,
+                                             seconds_per_audio_second=0.02, languages=("de", "en")))
+        self.semaphore = semaphore
+        self.client = None
+
+    def is_healthy(self) -> bool:
+        return self.client is not None and get_breaker("groq").is_available()
+
+    async def _transcribe(self, audio_path: str) -> Optional[str]:
+        if not self.client:
+            logger.warning("Transkription übersprungen, da der Groq-Client nicht initialisiert wurde.")
+            return None
+
+        try:
+            logger.info("Sende Audiodatei zur Transkription an Groq (Whisper)...")
+
+            # Die Groq-API erwartet ein Tupel: (Dateiname, Datei). Der Dateiname verrät den Dateityp.
+            # Die Datei wird als Handle übergeben, damit keine zusätzliche Kopie im Speicher entsteht.
+            # Pro Versuch neu öffnen, da resilient_call bei Fehlern wiederholt.
+            async def call():
+                async with self.semaphore:
+                    with open(audio_path, "rb") as audio_file:
+                        return await self.client.audio.transcriptions.create(
+                            file=(os.path.basename(audio_path), audio_file),
+                            model=TRANSCRIPTION_MODEL,
+                            response_format="json", # Stellt sicher, dass wir eine saubere Antwort bekommen
+                            language=TRANSCRIPTION_LANGUAGE # Wichtig: Wir geben die Sprache an, um die Genauigkeit zu maximieren
+                        )
+            transcription = await resilient_call(call, backend="groq", timeout=GROQ_TRANSCRIBE_TIMEOUT)
+
+            logger.info("✅ Transkription von Groq erfolgreich erhalten.")
+            return transcription.text.strip()
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Fehler bei der Transkription mjt Groq: {e}", exc_info=True)
+            metrics.record_error("transcribe")
+            return None
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Whisper auf der CPU mit faster-whisper (CTranslate2, int8-quantisiert). Das Modell wird
+    einmal geladen und bleibt im Prozess; Aufrufe laufen nacheinander in einem eigenen Thread,
+    der die CPU-Kerne über LOCAL_WHISPER_THREADS nutzt.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        super().__init__(BackendCapabilities(local=True, max_concurrency=1, overhead_seconds=0.3,
+                                             seconds_per_audio_second=0.5, max_audio_seconds=LOCAL_WHISPER_MAX_SECONDS,
+                                             languages=("de", "en")))
+        self._model = None
+        self._load_failed = False
+        self._load_lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-whisper")
+
+    def is_healthy(self) -> bool:
+        return not self._load_failed
+
+    async def warm_up(self):
+        await self._ensure_model()
+
+    async def _ensure_model(self):
+        async with self._load_lock:
+            if self._model is None and not self._load_failed:
+                loop = asyncio.get_running_loop()
+                try:
+                    started = time.perf_counter()
+                    self._model = await loop.run_in_executor(self._executor, self._load_model)
+                    logger.info(f"✅ Lokales Whisper-Modell '{LOCAL_WHISPER_MODEL}' ({LOCAL_WHISPER_COMPUTE_TYPE}) "
+                                f"in {time.perf_counter() - started:.1f}s geladen.")
+                except Exception as e:
+                    self._load_failed = True
+                    logger.error(f"FEHLER beim Laden des lokalen Whisper-Modells: {e}. Backend 'local' ist deaktiviert.")
+        return self._model
+
+    @staticmethod
+    def _load_model():
+        from faster_whisper import WhisperModel
+        return WhisperModel(LOCAL_WHISPER_MODEL, device="cpu", compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                            cpu_threads=LOCAL_WHISPER_THREADS)
+
+    async def _transcribe(self, audio_path: str) -> Optional[str]:
+        model = await self._ensure_model()
+        if model is None:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._run_model, model, audio_path)
+        except Exception as e:
+            logger.error(f"Fehler bei der lokalen Transkription: {e}", exc_info=True)
+            metrics.record_error("transcribe")
+            return None
+
+    @staticmethod
+    def _run_model(model, audio_path: str) -> str:
+        segments, _ = model.transcribe(audio_path, language=TRANSCRIPTION_LANGUAGE, beam_size=1, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class StubBackend(TranscriptionBackend):
+    """Attrappe ohne Netz und Modell, für Tests und Offline-Betrieb: liefert einen festen Text."""
+
+    name = "stub"
+
+    def __init__(self, text: str = STUB_TRANSCRIPT, latency_seconds: float = STUB_LATENCY_SECONDS):
+        super().__init__(BackendCapabilities(local=True, max_concurrency=64, overhead_seconds=latency_seconds,
+                                             seconds_per_audio_second=0.0, languages=(TRANSCRIPTION_LANGUAGE,)))
+        self.text = text
+        self.latency_seconds = latency_seconds
+
+    async def _transcribe(self, audio_path: str) -> Optional[str]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self.text or f"Test-Transkript für {os.path.basename(audio_path)}."
+
+
+def audio_duration_seconds(path: str) -> float:
+    """
+    Länge einer Audiodatei ohne Dekodieren: bei Ogg/Opus aus der Granule-Position der letzten
+    Seite (48 kHz), sonst grob aus der Dateigröße geschätzt.
+    """
+    size = os.path.getsize(path)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64)
+            if head[:4] == b"OggS" and b"OpusHead" in head:
+                f.seek(max(0, size - 65536))
+                tail = f.read()
+                last_page = tail.rfind(b"OggS")
+                if last_page >= 0 and len(tail) >= last_page + 14:
+                    granule = struct.unpack_from("<q", tail, last_page + 6)[0]
+                    if granule > 0:
+                        return granule / 48000
+    except OSError:
+        pass
+    return size / FALLBACK_BYTES_PER_SECOND
+
+
+class TranscriptionRouter:
+    """
+    Wählt pro Audio-Abschnitt das Backend mit der kürzesten erwarteten Dauer unter den
+    gesunden Backends, die die Länge unterstützen. Die erwartete Dauer berücksichtigt die
+    Länge des Abschnitts, den gemessenen Real-Time-Faktor und wie viele Aufrufe dort schon
+    laufen (Warteschlangentiefe). Liefert ein Backend nichts oder ist es gesperrt, wird das
+    nächste versucht; sind alle gesperrt, geht die letzte CircuitOpenError an den Aufrufer.
+    """
+
+    def __init__(self, backends: List[TranscriptionBackend]):
+        self.backends = backends
+        metrics.add_collector(self._collect_metrics)
+
+    def get(self, name: str) -> Optional[TranscriptionBackend]:
+        return next((backend for backend in self.backends if backend.name == name), None)
+
+    async def warm_up(self):
+        await asyncio.gather(*(backend.warm_up() for backend in self.backends))
+
+    def candidates(self, audio_seconds: float) -> List[TranscriptionBackend]:
+        usable = [b for b in self.backends if b.is_healthy() and b.supports(audio_seconds)]
+        if not usable:
+            # Lieber ein ungeeignetes/angeschlagenes Backend versuchen als gar keins
+            usable = list(self.backends)
+        # sorted ist stabil: bei gleicher Schätzung gewinnt die konfigurierte Reihenfolge
+        return sorted(usable, key=lambda b: b.estimate(audio_seconds))
+
+    async def transcribe(self, audio_path: str) -> Optional[str]:
+        audio_seconds = await asyncio.to_thread(audio_duration_seconds, audio_path)
+        circuit_error: Optional[CircuitOpenError] = None
+        for backend in self.candidates(audio_seconds):
+            try:
+                text = await backend.transcribe(audio_path, audio_seconds)
+            except CircuitOpenError as e:
+                circuit_error = e
+                continue
+            metrics.counter("bot_transcriptions_total", "Transkribierte Abschnitte je Backend").inc(
+                labels={"backend": backend.name, "result": "ok" if text else "empty"})
+            if text:
+                return text
+            logger.warning(f"Backend '{backend.name}' lieferte kein Transkript, versuche das nächste.")
+        if circuit_error:
+            raise circuit_error
+        return None
+
+    def _collect_metrics(self):
+        healthy = metrics.gauge("bot_transcription_backend_healthy", "1, wenn das Backend Aufrufe annimmt")
+        in_flight = metrics.gauge("bot_transcription_backend_in_flight", "Laufende Transkriptionen je Backend")
+        rtf = metrics.gauge("bot_transcription_backend_rtf", "Gemessene Rechenzeit pro Sekunde Audio je Backend")
+        for backend in self.backends:
+            labels = {"backend": backend.name}
+            healthy.set(1 if backend.is_healthy() else 0, labels)
+            in_flight.set(backend.in_flight, labels)
+            rtf.set(round(backend.realtime_factor, 4), labels)
+
+
+def create_router(groq_semaphore: asyncio.Semaphore, groq_max_concurrency: int,
+                  names: str = TRANSCRIPTION_BACKENDS) -> TranscriptionRouter:
+    factories = {
+        "groq": lambda: GroqBackend(groq_semaphore, groq_max_concurrency),
+        "local": LocalWhisperBackend,
+        "stub": StubBackend,
+    }
+    backends = []
+    for name in (n.strip() for n in names.split(",")):
+        if name not in factories:
+            raise ValueError(f"Unbekanntes Transkriptions-Backend '{name}' (erlaubt: {', '.join(factories)})")
+        backends.append(factories[name]())
+    logger.info(f"Transkription über: {', '.join(b.name for b in backends)}")
+    return TranscriptionRouter(backends)
@@ -0,0 +1,227 @@
+# transport.py - Gemeinsame HTTP-Verbindungen (Keep-Alive-Pools, HTTP/2) für Telegram, Groq und Google Sheets
+
+import os
+import time
+import logging
+import threading
+import contextvars
+import importlib.util
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '120'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+# 'auto': HTTP/2, sobald das Paket h2 installiert ist (Telegram und Groq unterstützen es)
+HTTP2_MODE = os.getenv('HTTP2', 'auto').lower()
+# So lange vor Ablauf wird das OAuth-Token im Hintergrund erneuert
+OAUTH_REFRESH_MARGIN_SECONDS = float(os.getenv('OAUTH_REFRESH_MARGIN_SECONDS', '300'))
+# Optional: anderer Bot-API-Server (z.B. lokaler telegram-bot-api oder die Attrappe aus benchmark.py)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+TELEGRAM_FILE_BASE_URL = os.getenv('TELEGRAM_FILE_BASE_URL')
+
+_tls_started: contextvars.ContextVar = contextvars.ContextVar("tls_started", default=None)
+
+
+def http2_enabled() -> bool:
+    if HTTP2_MODE == 'auto':
+        return importlib.util.find_spec("h2") is not None
+    return HTTP2_MODE == 'true'
+
+
+class ConnectionStats:
+    """
+    Zählt pro Dienst Anfragen, neu aufgebaute Verbindungen und TLS-Handshakes. Liegt die
+    Wiederverwendungsquote nahe 1, sitzt kein Handshake mehr auf dem Weg einer Sprachnachricht.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, float]] = {}
+        self._requests_pools: Dict[str, List] = {}
+        metrics.add_collector(self._collect)
+
+    def record(self, backend: str, event: str, amount: float = 1):
+        with self._lock:
+            counts = self._counts.setdefault(backend, {"requests": 0, "connections": 0, "tls_handshakes": 0,
+                                                       "tls_seconds": 0.0})
+            counts[event] += amount
+
+    def tracer(self, backend: str):
+        """trace-Extension für httpx/httpcore: meldet Verbindungsaufbau und TLS-Handshake."""
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                self.record(backend, "connections")
+            elif event_name == "connection.start_tls.started":
+                # Start und Ende eines Handshakes laufen im selben Task nacheinander
+                _tls_started.set(time.perf_counter())
+            elif event_name == "connection.start_tls.complete":
+                self.record(backend, "tls_handshakes")
+                begun = _tls_started.get()
+                if begun is not None:
+                    self.record(backend, "tls_seconds", time.perf_counter() - begun)
+                    _tls_started.set(None)
+        return trace
+
+    def httpx_event_hooks(self, backend: str) -> dict:
+        trace = self.tracer(backend)
+
+        async def on_request(request):
+            self.record(backend, "requests")
+            request.extensions["trace"] = trace
+        return {"request": [on_request]}
+
+    def watch_requests_adapter(self, backend: str, adapter):
+        """requests/urllib3 (gspread): die Pools zählen Verbindungen und Anfragen selbst."""
+        with self._lock:
+            self._requests_pools.setdefault(backend, []).append(adapter)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {backend: dict(counts) for backend, counts in self._counts.items()}
+            adapters = {backend: list(items) for backend, items in self._requests_pools.items()}
+        for backend, items in adapters.items():
+            counts = result.setdefault(backend, {"requests": 0, "connections": 0, "tls_handshakes": 0,
+                                                 "tls_seconds": 0.0})
+            for adapter in items:
+                pools = adapter.poolmanager.pools
+                for pool in [pools[key] for key in pools.keys()]:
+                    counts["requests"] += pool.num_requests
+                    counts["connections"] += pool.num_connections
+                    # Bei HTTPS ist jede neue Verbindung ein TLS-Handshake
+                    if getattr(pool, "scheme", "") == "https":
+                        counts["tls_handshakes"] += pool.num_connections
+        return result
+
+    def _collect(self):
+        requests_total = metrics.gauge("bot_http_requests_total", "HTTP-Anfragen je Dienst")
+        connections = metrics.gauge("bot_http_connections_total", "Neu aufgebaute Verbindungen je Dienst")
+        handshakes = metrics.gauge("bot_http_tls_handshakes_total", "TLS-Handshakes je Dienst")
+        handshake_seconds = metrics.gauge("bot_http_tls_handshake_seconds_total", "Zeit in TLS-Handshakes je Dienst")
+        reuse = metrics.gauge("bot_http_connection_reuse_ratio", "Anteil der Anfragen über eine bestehende Verbindung")
+        for backend, counts in self.snapshot().items():
+            labels = {"backend": backend}
+            requests_total.set(counts["requests"], labels)
+            connections.set(counts["connections"], labels)
+            handshakes.set(counts["tls_handshakes"], labels)
+            handshake_seconds.set(round(counts["tls_seconds"], 3), labels)
+            if counts["requests"]:
+                reuse.set(round(max(0.0, 1 - counts["connections"] / counts["requests"]), 4), labels)
+
+
+connection_stats = ConnectionStats()
+
+
+def httpx_limits_kwargs(backend: str, pool_size: int = HTTP_POOL_SIZE) -> dict:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                               keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+        "http2": http2_enabled(),
+        "event_hooks": connection_stats.httpx_event_hooks(backend),
+    }
+
+
+def groq_http_client():
+    """httpx-Client für das Groq-SDK. Zeitlimits pro Versuch setzt resilient_call, hier nur als Obergrenze."""
+    import httpx
+
+    return httpx.AsyncClient(timeout=httpx.Timeout(600.0, connect=HTTP_CONNECT_TIMEOUT),
+                             **httpx_limits_kwargs("groq"))
+
+
+def telegram_request(pool_size: int = HTTP_POOL_SIZE, backend: str = "telegram"):
+    """HTTPXRequest für python-telegram-bot mit eigenem Keep-Alive-Pool und Verbindungsstatistik."""
+    from telegram.request import HTTPXRequest
+
+    kwargs = httpx_limits_kwargs(backend, pool_size)
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        http_version="2" if kwargs.pop("http2") else "1.1",
+        # Limits und Hooks reicht HTTPXRequest an httpx.AsyncClient weiter
+        httpx_kwargs=kwargs,
+    )
+
+
+def sheets_session(credentials, pool_size: int = HTTP_POOL_SIZE):
+    """
+    AuthorizedSession für gspread mit einem größeren urllib3-Pool. requests kann kein HTTP/2;
+    Keep-Alive hält die Verbindung zu sheets.googleapis.com aber zwischen den Batches offen.
+    """
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    session = AuthorizedSession(credentials)
+    # Wiederholungen übernimmt resilient_call, nicht urllib3
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    connection_stats.watch_requests_adapter("sheets", adapter)
+    return session
+
+
+class CredentialRefresher:
+    """
+    Erneuert ein OAuth-Zugriffstoken (google-auth) im Hintergrund, OAUTH_REFRESH_MARGIN_SECONDS
+    vor Ablauf. Dadurch wartet keine Anfrage mehr auf den Token-Abruf, der sonst inline bei
+    der ersten Anfrage nach Ablauf passieren würde.
+    """
+
+    def __init__(self, credentials, margin_seconds: float = OAUTH_REFRESH_MARGIN_SECONDS):
+        self.credentials = credentials
+        self.margin_seconds = margin_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        metrics.add_collector(self._collect)
+
+    def refresh(self) -> bool:
+        from google.auth.transport.requests import Request
+
+        try:
+            self.credentials.refresh(Request())
+            metrics.counter("bot_oauth_refresh_total", "Erneuerungen des OAuth-Tokens").inc(labels={"result": "ok"})
+            return True
+        except Exception as e:
+            metrics.counter("bot_oauth_refresh_total", "Erneuerungen des OAuth-Tokens").inc(labels={"result": "error"})
+            logger.warning(f"OAuth-Token konnte nicht erneuert werden: {e}")
+            return False
+
+    def seconds_left(self) -> Optional[float]:
+        expiry = getattr(self.credentials, "expiry", None)
+        if expiry is None:
+            return None
+        # google-auth speichert expiry als naive UTC-Zeit
+        return (expiry - datetime.utcnow()).total_seconds()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="oauth-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            left = self.seconds_left()
+            if left is None or left <= self.margin_seconds:
+                if self.refresh():
+                    failures = 0
+                    continue
+                failures += 1
+                wait = min(5 * 2 ** failures, 300)
+            else:
+                wait = left - self.margin_seconds
+            self._stop.wait(wait)
+
+    def _collect(self):
+        left = self.seconds_left()
+        if left is not None:
+            metrics.gauge("bot_oauth_token_seconds_left", "Restlaufzeit des OAuth-Tokens").set(round(left))
@@ -0,0 +1,233 @@
+# voice_processor.py - Verarbeitung einer Sprachnachricht: Download → Transkription → Aufbereitung → Speichern
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+import pytz
+
+from archive import ARCHIVE_ENABLED, VoiceArchive
+from audio_pipeline import AudioPipeline, PipelineStats
+from cache import TwoTierCache
+from metrics import metrics
+from pipeline_journal import JournalEntry, PipelineJournal
+from text_enhancer import TextEnhancer, prompt_version
+from transcription import create_router
+
+logger = logging.getLogger(__name__)
+
+# Maximale Anzahl gleichzeitiger Groq-Anfragen (Whisper + Llama zusammen) pro Prozess
+GROQ_MAX_CONCURRENCY = int(os.getenv('GROQ_MAX_CONCURRENCY', '4'))
+GROQ_WARMUP_TIMEOUT = float(os.getenv('GROQ_WARMUP_TIMEOUT', '10'))
+
+
+def create_groq_client(api_key: str):
+    from groq import AsyncGroq
+    from transport import groq_http_client
+    # Asynchroner Client: Groq-Aufrufe blockieren die Event-Loop nicht.
+    # Wiederholungen übernimmt resilient_call (mit Circuit Breaker), nicht das SDK.
+    # Verbindungen kommen aus dem gemeinsamen Keep-Alive-Pool (transport.py).
+    return AsyncGroq(api_key=api_key, max_retries=0, http_client=groq_http_client())
+
+
+async def connect_groq():
+    """Erzeugt den Groq-Client im Thread (der Import des SDK braucht spürbar Zeit); None ohne API-Key oder bei Fehlern."""
+    try:
+        groq_api_key = os.getenv('GROQ_API_KEY')
+        if not groq_api_key:
+            logger.warning("GROQ_API_KEY nicht gefunden. Text-Verfeinerung wird deaktiviert.")
+            return None
+        client = await asyncio.to_thread(create_groq_client, groq_api_key)
+        logger.info(f"✅ Groq Client erfolgreich initialisiert (max. {GROQ_MAX_CONCURRENCY} parallele Anfragen).")
+        return client
+    except Exception as e:
+        logger.error(f"FEHLER bei der Initialisierung von Groq: {e}. Text-Verfeinerung ist deaktiviert.")
+        return None
+
+
+async def warm_up_groq(client):
+    """Baut die Verbindung (DNS, TLS) vorab auf, damit die erste Transkription sie schon vorfindet."""
+    try:
+        await asyncio.wait_for(client.models.list(), GROQ_WARMUP_TIMEOUT)
+    except Exception as e:
+        logger.info(f"Vorwärmen der Groq-Verbindung übersprungen: {e}")
+
+
+class VoiceProcessor:
+    """
+    Die eigentliche Verarbeitung einer Sprachnachricht, unabhängig davon, wer sie annimmt:
+    der Bot selbst (Verarbeitung im selben Prozess) oder ein Worker-Prozess (worker.py).
+
+    `telegram_bot` ist ein telegram.Bot für Download und Status-Nachrichten, `on_saved`
+    wird nach jedem lokal gespeicherten Eintrag aufgerufen (z.B. um Google Sheets anzustoßen).
+    `journal` (PipelineJournal) macht die Verarbeitung nach einem Neustart fortsetzbar.
+    """
+
+    def __init__(self, telegram_bot, memory_store, search_index, on_saved: Optional[Callable[[], None]] = None,
+                 journal: Optional[PipelineJournal] = None):
+        self.telegram_bot = telegram_bot
+        self.memory_store = memory_store
+        self.search_index = search_index
+        self.on_saved = on_saved
+        # Mit Journal wird jede abgeschlossene Stufe festgehalten (siehe run, journal_entry)
+        self.journal = journal
+        # Der Groq-Client wird nachträglich gesetzt (set_groq_client), bis dahin warten Aufrufe
+        self.groq_client = None
+        self.groq_semaphore = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+        self.groq_ready = asyncio.Event()
+        # Welches Backend (Groq, lokales Whisper, Attrappe) einen Abschnitt transkribiert, entscheidet der Router
+        self.transcription = create_router(self.groq_semaphore, GROQ_MAX_CONCURRENCY)
+        self.archive = VoiceArchive() if ARCHIVE_ENABLED else None
+        self.audio_pipeline = AudioPipeline(self.transcribe_audio, archive=self.archive)
+        self.transcript_cache = TwoTierCache("transcripts")
+        self.enhance_cache = TwoTierCache("enhancements")
+        self.enhancer = TextEnhancer(None, self.groq_semaphore, self.enhance_cache)
+
+    def set_groq_client(self, client):
+        self.groq_client = client
+        self.enhancer.groq_client = client
+        groq_backend = self.transcription.get("groq")
+        if groq_backend:
+            groq_backend.client = client
+        self.groq_ready.set()
+
+    async def warm_up_backends(self):
+        """Lädt z.B. das lokale Whisper-Modell, damit die erste Sprachnachricht nicht darauf wartet."""
+        await self.transcription.warm_up()
+
+    async def wait_for_groq(self):
+        """Nachrichten, die vor dem Ende des Vorwärmens eintreffen, warten hier, statt abgewiesen zu werden."""
+        if not self.groq_ready.is_set():
+            with metrics.stage("startup_wait"):
+                await self.groq_ready.wait()
+
+    async def run(self, file_id: str, file_unique_id: str, author_name: str, status,
+                  journal_entry: Optional[JournalEntry] = None):
+        """
+        Download → Transkription → Aufbereitung → Speichern. Wirft CircuitOpenError, wenn kein Transkriptions-Backend erreichbar ist.
+
+        Mit `journal_entry` wird nach jeder Stufe ein Checkpoint geschrieben; ein fortgesetzter
+        Eintrag überspringt die Stufen, deren Ergebnis schon im Journal steht.
+        """
+        entry = journal_entry if self.journal is not None else None
+
+        async def checkpoint(stage: str, **fields):
+            if entry is not None:
+                await asyncio.to_thread(self.journal.advance, entry.id, stage, **fields)
+
+        # Weitergeleitete oder erneut gesendete Sprachnachrichten: kein Download, kein API-Aufruf
+        file_key = f"file:{file_unique_id}"
+        stats = PipelineStats()
+        if entry is not None and entry.reached("transcribed"):
+            transcript = entry.transcript
+            logger.info(f"Transkript aus dem Journal übernommen (Eintrag {entry.id}).")
+        else:
+            transcript = await self.transcript_cache.aget(file_key)
+            if transcript:
+                logger.info("Transkript aus dem Cache übernommen (file_unique_id).")
+            else:
+                voice_file = None
+                source_path = entry.audio_path if entry is not None and entry.reached("downloaded") else None
+                if source_path and not os.path.exists(source_path):
+                    source_path = None
+                if source_path is None:
+                    status.update("📥 Lade herunter...")
+                    voice_file = await self.telegram_bot.get_file(file_id)
+                    if entry is not None:
+                        # Die Datei im Journal ablegen, damit ein Neustart sie nicht erneut lädt
+                        source_path = self.journal.audio_path(entry.id)
+                        await self.audio_pipeline.download(voice_file, source_path, stats)
+                        await checkpoint("downloaded", audio_path=source_path)
+
+                status.update("🎯 Transkribiere..." if self.groq_ready.is_set()
+                              else "⏳ Der Bot startet gerade, deine Nachricht ist vorgemerkt...")
+                # Download auf die Festplatte, ggf. Normalisierung/Aufteilung und Transkription
+                transcript = await self.audio_pipeline.process(voice_file, stats, cache=self.transcript_cache,
+                                                               source_path=source_path)
+                if transcript:
+                    await self.transcript_cache.aset(file_key, transcript)
+            if transcript:
+                await checkpoint("transcribed", transcript=transcript)
+        if not transcript:
+            status.finish("❌ Konnte nichts verstehen.")
+            return
+
+        metrics.observe_payload("transcript", len(transcript.encode('utf-8')))
+        if entry is not None and entry.reached("enhanced"):
+            enhanced_text, enhanced_with = entry.enhanced_text, entry.prompt_version
+        else:
+            status.update("✨ Bereite Text auf...")
+            with metrics.stage("enhance"):
+                enhanced_text, enhanced_with = await self.enhance_text(transcript)
+            await checkpoint("enhanced", enhanced_text=enhanced_text, prompt_version=enhanced_with)
+
+        status.update("💾 Speichere...")
+        # Erst lokal speichern (führendes System), Google Sheets wird im Hintergrund abgeglichen.
+        # Die Eintrag-ID aus dem Journal macht einen wiederholten Versuch idempotent.
+        with metrics.stage("save"):
+            memory = await self.memory_store.save_memory(transcript, enhanced_text, author_name, file_id,
+                                                         prompt_version=enhanced_with,
+                                                         entry_id=entry.entry_id if entry is not None else None)
+        if memory:
+            await checkpoint("saved")
+            if self.on_saved:
+                self.on_saved()
+            try:
+                await self.search_index.aadd(memory.entry_id, memory.author, memory.created_at,
+                                             memory.original_text, memory.enhanced_text)
+            except Exception as e:
+                logger.error(f"FEHLER beim Aktualisieren des Suchindex: {e}", exc_info=True)
+            if self.archive is not None:
+                try:
+                    if not await self.archive.alink(memory.entry_id, file_unique_id, stats.audio_sha256):
+                        logger.warning(f"Keine archivierte Audiodatei für Eintrag {memory.entry_id}.")
+                except Exception as e:
+                    logger.error(f"FEHLER beim Verknüpfen der archivierten Sprachnachricht: {e}", exc_info=True)
+            # +++ HIER IST DIE GEWÜNSCHTE ANTWORT-FORMATIERUNG +++
+            berlin_tz = pytz.timezone("Europe/Berlin")
+            now_berlin = datetime.now(berlin_tz)
+
+            response_message = f"""✅ **Erinnerung von {author_name} erfolgreich gespeichert!**
+
+📝 **Original-Transkript:**
+_{transcript}_
+
+✨ **Aufbereitete Version:**
+{enhanced_text}
+
+📅 **Gespeichert am:** {now_berlin.strftime("%d.%m.%Y um %H:%M Uhr")}"""
+
+            status.finish(response_message, parse_mode='Markdown')
+        else:
+            # Die Fehlermeldung bleibt informativ
+            response_message = f"""⚠️ **Transkription erfolgreich, aber Speichern fehlgeschlagen**
+
+📝 **Original-Transkript:**
+_{transcript}_
+
+✨ **Aufbereitete Version:**
+{enhanced_text}
+
+❌ **Hinweis:** Die Erinnerung konnte nicht lokal gespeichert werden. Prüfe die Logs in Render."""
+            status.finish(response_message, parse_mode='Markdown')
+
+    async def transcribe_audio(self, audio_path: str) -> Optional[str]:
+        """Transkribiert eine Audiodatei (bzw. einen Abschnitt) mit dem vom Router gewählten Backend."""
+        if self.transcription.get("groq"):
+            await self.wait_for_groq()
+        return await self.transcription.transcribe(audio_path)
+
+    async def enhance_text(self, text: str) -> Tuple[str, Optional[str]]:
+        """Gibt (Text, Prompt-Version) zurück; schlägt die Aufbereitung fehl, das Original ohne Version."""
+        await self.wait_for_groq()
+        if not self.groq_client:
+            logger.warning("Text-Verbesserung übersprungen, da Groq-Client nicht initialisiert.")
+            return text, None
+        try:
+            return await self.enhancer.enhance(text), prompt_version()
+        except Exception as e:
+            logger.error(f"FEHLER bei der Text-Verbesserung mit Groq: {e}", exc_info=True)
+            metrics.record_error("enhance")
+            return text, None
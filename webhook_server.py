@@ -0,0 +1,140 @@
+# webhook_server.py - Webhook-Betrieb: ein einziger ASGI-Server (uvicorn) für Telegram, Health-Check und Metriken
+
+import os
+import json
+import hmac
+import logging
+
+from telegram import Update
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or os.getenv('RENDER_EXTERNAL_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_MAX_BODY_BYTES = 1024 * 1024
+
+
+class WebhookApp:
+    """
+    Minimale ASGI-Anwendung ohne zusätzliches Framework:
+
+    - POST WEBHOOK_PATH  -> Telegram-Update entgegennehmen und in die update_queue legen
+    - GET  /             -> Health-Check für Render
+    - GET  /metrics      -> Messwerte im Prometheus-Format
+    - alle übrigen Pfade -> `fallback` (die Flask-App aus main.py mit der Benutzer-API), sonst 404
+
+    HEAD ist überall erlaubt, wo GET es ist, und bekommt dieselben Header ohne Body.
+    """
+
+    def __init__(self, application, secret_token: str = None, fallback=None):
+        self.application = application
+        self.secret_token = secret_token
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        method, path = scope['method'], scope['path']
+        with_body = method != 'HEAD'
+
+        if path == WEBHOOK_PATH and method == 'POST':
+            await self._handle_update(scope, receive, send)
+        elif path == '/' and method in ('GET', 'HEAD'):
+            await self._respond(send, 200, b"Bot is running healthily!", with_body=with_body)
+        elif path == '/metrics' and method in ('GET', 'HEAD'):
+            await self._respond(send, 200, metrics.render().encode('utf-8'), b"text/plain; version=0.0.4",
+                                with_body=with_body)
+        elif path in ('/', '/metrics', WEBHOOK_PATH):
+            allow = b"POST" if path == WEBHOOK_PATH else b"GET, HEAD"
+            await self._respond(send, 405, b"Method Not Allowed", headers=[(b'allow', allow)], with_body=with_body)
+        elif self.fallback is not None:
+            await self.fallback(scope, receive, send)
+        else:
+            await self._respond(send, 404, b"Not Found", with_body=with_body)
+
+    async def _handle_update(self, scope, receive, send):
+        if self.secret_token:
+            headers = dict(scope['headers'])
+            received = headers.get(b'x-telegram-bot-api-secret-token', b'').decode('latin-1')
+            if not hmac.compare_digest(received, self.secret_token):
+                await self._respond(send, 403, b"Forbidden")
+                return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await self._respond(send, 413, b"Payload Too Large")
+            return
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Ungültiges Update über den Webhook empfangen: {e}")
+            await self._respond(send, 400, b"Bad Request")
+            return
+
+        # Sofort bestätigen; die Application verarbeitet Updates nebenläufig aus der Queue
+        await self.application.update_queue.put(update)
+        await self._respond(send, 200, b"OK")
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > WEBHOOK_MAX_BODY_BYTES:
+                return None
+            if not message.get('more_body'):
+                return body
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/plain; charset=utf-8",
+                       headers=(), with_body: bool = True):
+        # Bei HEAD nur die Header (inklusive der Länge, die GET liefern würde), kein Body
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()),
+                                *headers]})
+        await send({'type': 'http.response.body', 'body': body if with_body else b""})
+
+
+async def run_webhook(bot, wsgi_app=None):
+    """
+    Startet die Application ohne Polling und bedient Telegram, Health-Check und Metriken über uvicorn.
+    Eine WSGI-App (Flask, `wsgi_app`) beantwortet alle übrigen Pfade; sie läuft in Threads (a2wsgi).
+    """
+    import uvicorn
+
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL (oder RENDER_EXTERNAL_URL) muss im Webhook-Modus gesetzt sein!")
+
+    application = bot.application
+    port = int(os.environ.get('PORT', 5000))
+    fallback = None
+    if wsgi_app is not None:
+        from a2wsgi import WSGIMiddleware
+        fallback = WSGIMiddleware(wsgi_app)
+    server = uvicorn.Server(uvicorn.Config(
+        WebhookApp(application, WEBHOOK_SECRET, fallback), host='0.0.0.0', port=port,
+        log_level='info', lifespan='off'))
+
+    await application.initialize()
+    # post_init wird nur von run_polling/run_webhook selbst aufgerufen, hier also manuell
+    if application.post_init:
+        await application.post_init(application)
+    await application.bot.set_webhook(
+        url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    await application.start()
+    logger.info(f"Webhook-Modus aktiv: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH} (Port {port}).")
+    try:
+        await server.serve()
+    finally:
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
@@ -0,0 +1,236 @@
+# worker.py - Worker-Prozesse, die Sprachnachrichten aus der Job-Warteschlange verarbeiten
+#
+#   python worker.py [--processes N]
+#
+# Voraussetzung: Der Bot läuft mit VOICE_PROCESSING=queue und teilt sich mit den Workern
+# das Arbeitsverzeichnis (jobs.db, app.db, search.db, Caches). Jeder Prozess holt Jobs ab,
+# führt Download → Transkription → Aufbereitung → Speichern aus und bearbeitet die
+# Status-Nachricht im Chat direkt über die Bot-API. Google Sheets gleicht weiterhin der Bot ab.
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import logging
+import threading
+import multiprocessing
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from job_queue import VoiceJob, VoiceJobQueue, JOB_MAX_ATTEMPTS, JOB_VISIBILITY_SECONDS
+from metrics import metrics
+from pipeline_journal import VOICE_DRAIN_SECONDS
+from resilience import CircuitOpenError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Konfiguration über Umgebungsvariablen
+VOICE_WORKERS = int(os.getenv('VOICE_WORKERS', str(os.cpu_count() or 1)))
+# Gleichzeitig bearbeitete Jobs pro Prozess (Download und Groq-Aufrufe warten überwiegend auf das Netz)
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', '1.0'))
+WORKER_RETRY_BASE_SECONDS = float(os.getenv('WORKER_RETRY_BASE_SECONDS', '10'))
+# Abgestürzte Worker-Prozesse werden neu gestartet, höchstens einmal pro Intervall
+WORKER_RESTART_SECONDS = float(os.getenv('WORKER_RESTART_SECONDS', '5'))
+
+
+class VoiceWorker:
+    """Ein Worker-Prozess: WORKER_CONCURRENCY Schleifen, die jeweils einen Job abholen und verarbeiten."""
+
+    def __init__(self, name: str):
+        from telegram import Bot
+        from memory_store import MemoryStore
+        from pipeline_journal import PipelineJournal
+        from progress import ProgressHub
+        from search_index import SearchIndex
+        from transport import TELEGRAM_API_BASE_URL, TELEGRAM_FILE_BASE_URL, telegram_request
+        from voice_processor import VoiceProcessor
+
+        token = os.getenv('TELEGRAM_BOT_TOKEN')
+        if not token:
+            raise ValueError("TELEGRAM_BOT_TOKEN nicht gefunden!")
+        bot_kwargs = {}
+        if TELEGRAM_API_BASE_URL:
+            bot_kwargs['base_url'] = TELEGRAM_API_BASE_URL
+        if TELEGRAM_FILE_BASE_URL:
+            bot_kwargs['base_file_url'] = TELEGRAM_FILE_BASE_URL
+
+        self.name = name
+        self.bot = Bot(token, request=telegram_request(), **bot_kwargs)
+        self.queue = VoiceJobQueue()
+        self.progress = ProgressHub()
+        self.journal = PipelineJournal()
+        # Mit Journal setzt ein erneuter Versuch desselben Jobs an der letzten abgeschlossenen Stufe fort
+        self.processor = VoiceProcessor(self.bot, MemoryStore(), SearchIndex(), journal=self.journal)
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Keine neuen Jobs mehr abholen; laufende bekommen VOICE_DRAIN_SECONDS (SIGTERM/SIGINT)."""
+        self._stopping.set()
+
+    async def run(self):
+        from voice_processor import connect_groq, warm_up_groq
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        async with self.bot:
+            client = await connect_groq()
+            self.processor.set_groq_client(client)
+            if client:
+                asyncio.create_task(warm_up_groq(client))
+            await self.processor.warm_up_backends()
+            logger.info(f"👷 Worker {self.name} bereit ({WORKER_CONCURRENCY} Jobs gleichzeitig).")
+            loops = asyncio.gather(*(self._loop(f"{self.name}/{slot}") for slot in range(WORKER_CONCURRENCY)))
+            await asyncio.wait([loops, asyncio.create_task(self._stopping.wait())], return_when=asyncio.FIRST_COMPLETED)
+            try:
+                await asyncio.wait_for(asyncio.shield(loops), VOICE_DRAIN_SECONDS)
+            except asyncio.TimeoutError:
+                # Abgebrochene Jobs gehen sofort zurück in die Warteschlange, ihr Stand liegt im Journal
+                logger.warning(f"Worker {self.name}: laufende Jobs nach {VOICE_DRAIN_SECONDS:.0f}s abgebrochen.")
+                loops.cancel()
+                await asyncio.gather(loops, return_exceptions=True)
+            await self.progress.drain()
+        logger.info(f"Worker {self.name} beendet.")
+
+    async def _loop(self, slot: str):
+        # Jede Schleife hat einen eigenen Namen: eine abgelaufene Frist darf nicht von einer
+        # anderen Schleife desselben Prozesses als "eigener" Job bestätigt werden
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.queue.claim, slot)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job, slot)
+
+    async def _process(self, job: VoiceJob, slot: str):
+        from progress import EditableMessage
+
+        status = self.progress.reporter(EditableMessage(self.bot, job.chat_id, job.status_message_id))
+        entry = await asyncio.to_thread(self.journal.begin, f"job:{job.id}", "job", job.chat_id,
+                                        job.status_message_id, job.file_id, job.file_unique_id, job.author)
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            logger.error(f"Job {job.id} nach {JOB_MAX_ATTEMPTS} Versuchen aufgegeben.")
+            await asyncio.to_thread(self.queue.fail, job.id, slot, "Maximale Anzahl Versuche erreicht")
+            await asyncio.to_thread(self.journal.finish, entry.id)
+            status.finish("❌ Deine Sprachnachricht konnte leider nicht verarbeitet werden.")
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job, slot))
+        try:
+            with metrics.stage("voice_message"):
+                await self.processor.run(job.file_id, job.file_unique_id, job.author, status, journal_entry=entry)
+            await asyncio.to_thread(self.queue.complete, job.id, slot)
+            await asyncio.to_thread(self.journal.finish, entry.id)
+        except asyncio.CancelledError:
+            # Beenden nach Ablauf der Frist: sofort freigeben statt auf das Ende der Sichtbarkeitsfrist zu warten
+            # (abgeschirmt, damit die Freigabe trotz des Abbruchs im Thread zu Ende läuft)
+            await asyncio.shield(asyncio.to_thread(self.queue.retry, job.id, slot, 0, "Worker beendet", False))
+            raise
+        except CircuitOpenError as e:
+            # Groq ist gestört: Job zurückstellen, ohne einen Versuch zu verbrauchen
+            logger.warning(f"Job {job.id} zurückgestellt: {e}")
+            await asyncio.to_thread(self.queue.retry, job.id, slot, max(e.retry_in, WORKER_RETRY_BASE_SECONDS),
+                                    str(e), False)
+            status.finish("⏸️ Die Transkription ist gerade nicht erreichbar. Deine Sprachnachricht ist "
+                          "gesichert und wird automatisch verarbeitet, sobald der Dienst wieder läuft.")
+        except Exception as e:
+            delay = WORKER_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            logger.error(f"FEHLER bei Job {job.id} (Versuch {job.attempts}), neuer Versuch in {delay:.0f}s: {e}",
+                         exc_info=True)
+            metrics.record_error("voice_job")
+            await asyncio.to_thread(self.queue.retry, job.id, slot, delay, repr(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: VoiceJob, slot: str):
+        """Verlängert die Sichtbarkeitsfrist, solange der Job läuft; nur ein abgestürzter Worker verliert ihn."""
+        while True:
+            await asyncio.sleep(JOB_VISIBILITY_SECONDS / 3)
+            if not await asyncio.to_thread(self.queue.extend, job.id, slot):
+                logger.warning(f"Job {job.id} gehört nicht mehr {slot} (Frist abgelaufen).")
+                return
+
+
+def run_worker(index: int):
+    """Einstiegspunkt eines Worker-Prozesses."""
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    worker = VoiceWorker(f"{socket.gethostname()}:{os.getpid()}")
+    asyncio.run(worker.run())
+
+
+class WorkerPool:
+    """
+    Startet N Worker-Prozesse (spawn, damit kein Zustand des Bot-Prozesses geerbt wird)
+    und startet abgestürzte Prozesse neu. spawn importiert das Hauptmodul des Elternprozesses
+    (main.py) im Kind erneut; dort darf auf Modulebene daher nichts Schweres passieren. Ein Job, den ein abgestürzter Prozess gerade
+    bearbeitet hat, wird nach Ablauf seiner Sichtbarkeitsfrist von einem anderen übernommen.
+    """
+
+    def __init__(self, processes: int = VOICE_WORKERS):
+        self.processes = processes
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[Optional[multiprocessing.Process]] = [None] * processes
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    def start(self):
+        for index in range(self.processes):
+            self._spawn(index)
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-pool", daemon=True)
+        self._supervisor.start()
+        logger.info(f"👷 {self.processes} Worker-Prozess(e) gestartet.")
+
+    def _spawn(self, index: int):
+        process = self._context.Process(target=run_worker, args=(index,), name=f"voice-worker-{index}")
+        process.start()
+        self._workers[index] = process
+
+    def _supervise(self):
+        while not self._stopping.wait(WORKER_RESTART_SECONDS):
+            for index, process in enumerate(self._workers):
+                if process is not None and not process.is_alive() and not self._stopping.is_set():
+                    logger.error(f"Worker-Prozess {process.name} unerwartet beendet (Exit-Code {process.exitcode}), "
+                                 "starte neu.")
+                    self._spawn(index)
+
+    def stop(self, timeout: float = 30.0):
+        """Beendet alle Worker; laufende Jobs werden noch abgeschlossen, sofern sie in `timeout` fertig werden."""
+        self._stopping.set()
+        for process in self._workers:
+            if process is not None and process.is_alive():
+                process.terminate()  # SIGTERM: Worker holt keine neuen Jobs mehr ab
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Verarbeitet Sprachnachrichten aus der Job-Warteschlange.")
+    parser.add_argument("--processes", type=int, default=VOICE_WORKERS, help="Anzahl Worker-Prozesse")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(0)
+        sys.exit(0)
+    pool = WorkerPool(args.processes)
+    pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n🛑 Worker werden gestoppt...")
+        pool.stop()